@@ -0,0 +1,422 @@
+"""Lokalne API HTTP/JSON nad portfelem i bazą notowań - bez interfejsu Flet.
+
+Serwer działa na asyncio (tylko biblioteka standardowa, HTTP/1.1 z keep-alive); zapytania do bazy idą do
+puli wątków i korzystają z puli połączeń db. Odpowiedzi mają ETag wyliczany z wersji danych (data_versions),
+więc powtórzone zapytanie z If-None-Match dostaje 304 bez liczenia czegokolwiek, a gotowe treści odpowiedzi
+trzyma wspólny cache. Listy są stronicowane parametrami limit i offset.
+
+    POST /api/login                         {"username": ..., "password": ...} -> {"token": ...}
+    POST /api/logout
+    GET  /api/positions                     pozycje zalogowanego użytkownika
+    GET  /api/valuation?currency=EUR        wycena portfela (aktywa stronicowane)
+    GET  /api/history?days=365&currency=EUR dzienna wartość portfela
+    GET  /api/prices/<typ>/<klucz>          najnowsza cena aktywa
+    GET  /api/prices/<typ>/<klucz>/history?start=RRRR-MM-DD&end=RRRR-MM-DD
+    GET  /api/assets/<typ>?q=...            katalog aktywów
+
+Poza /api/login wymagany jest nagłówek "Authorization: Bearer <token>".
+
+Uruchomienie:  python api.py [--host 127.0.0.1] [--port 8560]
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import hashlib
+import json
+import logging
+import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import catalog
+import db
+import fx
+import ingest_queue
+import logging_setup
+import metrics
+import portfolio_history
+import positions
+import price_archive
+import sessions
+import users
+import valuation
+
+logger = logging.getLogger(__name__)
+
+API_HOST = "127.0.0.1"
+API_PORT = 8560
+API_WORKERS = 8
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_HISTORY_DAYS = 365
+MAX_BODY_BYTES = 64 * 1024
+RESPONSE_CACHE_SIZE = 1024
+ASSET_TYPES = ("currency", "gold", "stock")
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ResponseCache:
+    """Gotowe treści odpowiedzi (bajty JSON) według ETag, najdawniej używane wypadają pierwsze."""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._bodies = collections.OrderedDict()
+
+    def get(self, etag):
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is not None:
+                self._bodies.move_to_end(etag)
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._bodies[etag] = body
+            self._bodies.move_to_end(etag)
+            while len(self._bodies) > self.size:
+                self._bodies.popitem(last=False)
+
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.params = {}
+        self.user_id = None
+
+    def arg(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def int_arg(self, name, default, minimum=0, maximum=None):
+        value = self.arg(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Parametr '{name}' musi być liczbą całkowitą.")
+        if number < minimum or (maximum is not None and number > maximum):
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Parametr '{name}' poza zakresem {minimum}-{maximum}.")
+        return number
+
+    def date_arg(self, name, default):
+        value = self.arg(name)
+        if value is None:
+            return default
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Parametr '{name}' musi być datą RRRR-MM-DD.")
+
+    def currency_arg(self, conn):
+        """Waluta raportowa z parametru 'currency'; tylko PLN albo waluty z kursem NBP w bazie."""
+        currency = self.arg("currency", fx.BASE_CURRENCY).upper()
+        if not re.fullmatch(r"[A-Z]{3}", currency):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Parametr 'currency' musi być trzyliterowym kodem waluty.")
+        if fx.resolve_reporting_currency(fx.rate_cache.get_rates(conn), currency) != currency:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Brak kursu NBP dla waluty '{currency}'.")
+        return currency
+
+    def json_body(self):
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Treść zapytania nie jest poprawnym JSON.")
+        if not isinstance(data, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Treść zapytania musi być obiektem JSON.")
+        return data
+
+def paginate(request, items):
+    limit = request.int_arg("limit", DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    offset = request.int_arg("offset", 0)
+    page = items[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(items) else None
+    return {"items": page, "total": len(items), "limit": limit, "offset": offset, "next_offset": next_offset}
+
+def _asset_type(request):
+    asset_type = request.params["asset_type"]
+    if asset_type not in ASSET_TYPES:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"Nieznany typ aktywa '{asset_type}'.")
+    return asset_type
+
+def _quote_currency(conn, asset_type, asset_key):
+    if asset_type == "stock":
+        return fx.ticker_currency_cache.get_currencies(conn, [asset_key])[asset_key]
+    return fx.BASE_CURRENCY
+
+class ApiServer:
+    """Trasy API i ich obsługa; serve() uruchamia serwer asyncio na podanym adresie."""
+
+    def __init__(self, db_path=db.DATABASE_PATH, archive_root=None, workers=API_WORKERS):
+        self.db_path = db_path
+        if archive_root is None and price_archive.is_available():
+            archive_root = price_archive.ARCHIVE_DIR
+        self.archive_root = archive_root
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.response_cache = ResponseCache()
+        # (metoda, wzorzec ścieżki, nazwa, obsługa, znacznik wersji danych dla ETag albo None, wymaga logowania)
+        self.routes = [
+            ("POST", r"/api/login", "login", self.login, None, False),
+            ("POST", r"/api/logout", "logout", self.logout, None, True),
+            ("GET", r"/api/positions", "positions", self.get_positions, self._positions_stamp, True),
+            ("GET", r"/api/valuation", "valuation", self.get_valuation, self._portfolio_stamp, True),
+            ("GET", r"/api/history", "history", self.get_history, self._portfolio_stamp, True),
+            ("GET", r"/api/prices/(?P<asset_type>[^/]+)/(?P<asset_key>[^/]+)", "price",
+             self.get_price, self._prices_stamp, True),
+            ("GET", r"/api/prices/(?P<asset_type>[^/]+)/(?P<asset_key>[^/]+)/history", "price_history",
+             self.get_price_history, self._prices_stamp, True),
+            ("GET", r"/api/assets/(?P<asset_type>[^/]+)", "assets", self.get_assets, self._catalog_stamp, True),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), *rest) for method, pattern, *rest in self.routes]
+
+    # Znaczniki wersji danych - składnik ETag; dzień wchodzi do znaczników tam, gdzie wynik zależy od "dziś".
+
+    def _positions_stamp(self, conn, request):
+        return db.get_data_version(conn, positions.positions_version(request.user_id))
+
+    def _portfolio_stamp(self, conn, request):
+        return sessions.portfolio_cache.stamp(conn, request.user_id)
+
+    def _prices_stamp(self, conn, request):
+        return db.get_data_version(conn, db.PRICES_VERSION), datetime.date.today()
+
+    def _catalog_stamp(self, conn, request):
+        return db.get_data_version(conn, db.ASSET_CATALOG_VERSION)
+
+    # Obsługa tras - wywoływana w puli wątków z połączeniem z puli db.
+
+    def login(self, conn, request):
+        data = request.json_body()
+        username, password = data.get("username"), data.get("password")
+        if not isinstance(username, str) or not isinstance(password, str) or not username or not password:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Wymagane pola: username, password.")
+        user_id, message = users.authenticate(conn, username, password)
+        if user_id is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, message)
+        token = secrets.token_urlsafe(24)
+        sessions.session_store.open(token).user_id = user_id
+        return {"token": token, "user_id": user_id}
+
+    def logout(self, conn, request):
+        sessions.session_store.close(request.headers["authorization"].split(" ", 1)[1])
+        return {"ok": True}
+
+    def get_positions(self, conn, request):
+        rows = positions.get_positions(conn, request.user_id)
+        return paginate(request, [
+            {"asset_name": r[0], "asset_type": r[1], "quantity": r[2], "cost_basis": r[3]} for r in rows
+        ])
+
+    def get_valuation(self, conn, request):
+        currency = request.currency_arg(conn)
+        user_id = request.user_id
+        total, categories, assets_by_category, currency = sessions.portfolio_cache.get(
+            conn, user_id, ("value", currency), lambda c: valuation.value_portfolio(c, user_id, currency)
+        )
+        assets = [
+            {"asset_type": asset_type, **asset}
+            for asset_type, assets in assets_by_category.items() for asset in assets
+        ]
+        return {"currency": currency, "total": total, "categories": categories, "assets": paginate(request, assets)}
+
+    def get_history(self, conn, request):
+        currency = request.currency_arg(conn)
+        days = request.int_arg("days", DEFAULT_HISTORY_DAYS, minimum=1, maximum=20 * 366)
+        user_id = request.user_id
+        end = datetime.date.today()
+        start = end - datetime.timedelta(days=days - 1)
+        history = sessions.portfolio_cache.get(
+            conn, user_id, ("history", days, currency),
+            lambda c: portfolio_history.portfolio_value_history(
+                c, user_id, start, end, currency, self.archive_root
+            )["total"]
+        )
+        points = [{"date": day.date().isoformat(), "value": float(value)} for day, value in history.items()]
+        return {"currency": currency, "history": paginate(request, points)}
+
+    def get_price(self, conn, request):
+        asset_type = _asset_type(request)
+        asset_key = request.params["asset_key"]
+        price = valuation.market_price(conn, asset_type, asset_key)
+        if price is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Brak ceny dla '{asset_key}'.")
+        return {
+            "asset_type": asset_type,
+            "asset_key": asset_key,
+            "price": price,
+            "currency": _quote_currency(conn, asset_type, asset_key),
+        }
+
+    def get_price_history(self, conn, request):
+        asset_type = _asset_type(request)
+        asset_key = request.params["asset_key"]
+        end = request.date_arg("end", datetime.date.today())
+        start = request.date_arg("start", end - datetime.timedelta(days=DEFAULT_HISTORY_DAYS - 1))
+        if start > end:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Parametr 'start' jest późniejszy niż 'end'.")
+        prices = portfolio_history.load_price_history(
+            conn, asset_type, [asset_key], start, end, self.archive_root
+        )[asset_key].dropna()
+        points = [{"date": day.date().isoformat(), "price": float(price)} for day, price in prices.items()]
+        return {
+            "asset_type": asset_type,
+            "asset_key": asset_key,
+            "currency": _quote_currency(conn, asset_type, asset_key),
+            "prices": paginate(request, points),
+        }
+
+    def get_assets(self, conn, request):
+        asset_type = _asset_type(request)
+        query = request.arg("q")
+        if query:
+            keys = catalog.asset_catalog.search(conn, asset_type, query, MAX_PAGE_SIZE)
+        else:
+            keys = catalog.asset_catalog.get_assets(conn, asset_type)
+        return paginate(request, keys)
+
+    # HTTP
+
+    def _match(self, method, path):
+        allowed = False
+        for route_method, pattern, *rest in self.routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            if route_method == method:
+                return match.groupdict(), rest
+            allowed = True
+        if allowed:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "Niedozwolona metoda.")
+        raise ApiError(HTTPStatus.NOT_FOUND, "Nie znaleziono.")
+
+    def _authenticate(self, request):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        session = sessions.session_store.get(token) if scheme.lower() == "bearer" and token else None
+        if session is None or session.user_id is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Wymagane logowanie (nagłówek Authorization: Bearer <token>).")
+        request.user_id = session.user_id
+
+    def respond(self, request):
+        """Obsługuje zapytanie w wątku puli; zwraca (status, nagłówki, treść)."""
+        try:
+            params, (name, handler, stamp, requires_login) = self._match(request.method, request.path)
+            request.params = {k: unquote(v) for k, v in params.items()}
+            if requires_login:
+                self._authenticate(request)
+            with metrics.stage("api.request", route=name), db.connection(self.db_path) as conn:
+                if stamp is None:
+                    return self._json_response(name, HTTPStatus.OK, handler(conn, request))
+                # ETag: trasa, użytkownik, parametry i wersja danych - zmienia się dokładnie wtedy, gdy wynik.
+                tag_source = repr((name, request.user_id, request.path, sorted(request.query.items()),
+                                   stamp(conn, request)))
+                etag = '"' + hashlib.sha1(tag_source.encode("utf-8")).hexdigest() + '"'
+                headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+                if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+                    metrics.inc("api_requests_total", route=name, status=304)
+                    return HTTPStatus.NOT_MODIFIED, headers, b""
+                body = self.response_cache.get(etag)
+                if body is None:
+                    body = json.dumps(handler(conn, request), ensure_ascii=False).encode("utf-8")
+                    self.response_cache.put(etag, body)
+                else:
+                    metrics.inc("cache_hits_total", cache="api_responses")
+                metrics.inc("api_requests_total", route=name, status=200)
+                return HTTPStatus.OK, headers, body
+        except ApiError as e:
+            return self._json_response("error", e.status, {"error": e.message})
+        except Exception as e:
+            logger.exception("Błąd obsługi %s %s: %s", request.method, request.path, e)
+            return self._json_response("error", HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Błąd serwera."})
+
+    def _json_response(self, name, status, data):
+        metrics.inc("api_requests_total", route=name, status=int(status))
+        return status, {}, json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, response_headers, body = self._json_response(
+                        "error", HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Zbyt duża treść zapytania."})
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    url = urlsplit(target)
+                    request = Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+                    status, response_headers, body = await loop.run_in_executor(self.executor, self.respond, request)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                head = [f"HTTP/1.1 {int(status)} {status.phrase}"]
+                if status != HTTPStatus.NOT_MODIFIED:
+                    head.append("Content-Type: application/json; charset=utf-8")
+                head.append(f"Content-Length: {len(body)}")
+                head.extend(f"{k}: {v}" for k, v in response_headers.items())
+                head.append("Connection: keep-alive" if keep_alive else "Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=API_HOST, port=API_PORT, started=None):
+        """Obsługuje zapytania do anulowania zadania; `started` (asyncio.Event) sygnalizuje gotowość."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info("API dostępne pod http://%s:%s/api", host, self.port)
+        if started is not None:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalne API HTTP/JSON nad portfelem i notowaniami.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Wątki obsługujące zapytania do bazy.")
+    parser.add_argument("--db", default=db.DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    logging_setup.configure()
+    metrics.start_server_from_env()
+    db.init_schema(args.db)
+    try:
+        asyncio.run(ApiServer(args.db, workers=args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Zatrzymano API.")
+    finally:
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+UI_WORKERS = 4
+
+# Wspólna pula wątków dla pracy bazodanowej zlecanej z obsługi zdarzeń Flet.
+ui_executor = ThreadPoolExecutor(max_workers=UI_WORKERS, thread_name_prefix="ui-db")
+
+class LatestTaskRunner:
+    """Uruchamia zadania w tle tak, by liczył się tylko wynik najnowszego zlecenia o danym kluczu.
+
+    Nowe zlecenie anuluje poprzednie, jeśli jeszcze nie wystartowało, a wynik zlecenia, które
+    zdążyło się wykonać, jest po cichu odrzucany - dzięki temu szybkie kliknięcia nie nadpisują
+    ekranu starszymi danymi.
+    """
+
+    def __init__(self, executor=ui_executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._futures = {}
+
+    def submit(self, key, work, on_done, on_error=None):
+        with self._lock:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            previous = self._futures.get(key)
+            if previous is not None:
+                previous.cancel()
+            future = self._executor.submit(work)
+            self._futures[key] = future
+
+        def finished(f):
+            if f.cancelled() or not self.is_current(key, generation):
+                return
+            error = f.exception()
+            if error is None:
+                on_done(f.result())
+            elif on_error is not None:
+                on_error(error)
+
+        future.add_done_callback(finished)
+        return future
+
+    def is_current(self, key, generation):
+        with self._lock:
+            return self._generations.get(key) == generation
+
+    def cancel_all(self):
+        with self._lock:
+            for key, future in self._futures.items():
+                future.cancel()
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._futures.clear()
@@ -0,0 +1,142 @@
+"""Benchmark parsera strony skupu Mennicy Apart i deduplikacji zapisów.
+
+Porównuje pierwotny parser (BeautifulSoup + html.parser na całej stronie) z parse_with_bs4
+(SoupStrainer tylko dla #accordionProductDetails) i parse_with_lxml, a potem liczy wiersze zapisane
+przez kilka kolejnych przebiegów: dopisywanie wszystkiego vs zapis tylko zmienionych cen.
+
+Domyślnie używa benchmarks/fixtures/apart_skup.html.
+Nagranie fixture (wymaga sieci):  python benchmarks/bench_apart_parser.py --record
+Bez pliku fixture generowana jest syntetyczna strona o tej samej strukturze.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scraping', 'gold'))
+
+import apart
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'apart_skup.html')
+TIMESTAMP = "2025-01-01T12:00:00"
+
+def record_fixture():
+    response = apart.http_client.HttpClient().get(apart.URL_APART_SKUP)
+    response.raise_for_status()
+    os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+    with open(FIXTURE_PATH, 'wb') as f:
+        f.write(response.content)
+    print(f"Zapisano {len(response.content)} bajtów do {FIXTURE_PATH}")
+
+def synthetic_page(n_categories=12, n_products=40, price_seed=1, filler_blocks=400):
+    rng = random.Random(price_seed)
+    filler = "".join(
+        f'<div class="promo-{i}"><a href="/p/{i}">Produkt promocyjny {i}</a><span>opis {i}</span></div>'
+        for i in range(filler_blocks)
+    )
+    panels = []
+    for c in range(n_categories):
+        rows = "".join(
+            f"<tr><td>Produkt {c}-{p} 1oz</td><td>{rng.randint(100, 20000):,}".replace(",", " ")
+            + f",{rng.randint(0, 99):02d} zł</td></tr>"
+            for p in range(n_products)
+        )
+        panels.append(
+            f'<div class="panel panel-default"><div class="panel-heading"><h4 class="panel-title">'
+            f'<a data-toggle="collapse">Kategoria {c}<i class="indicator glyphicon">+</i></a></h4></div>'
+            f'<div class="panel-collapse"><table class="table table-striped"><thead><tr><th>Nazwa</th>'
+            f'<th>Cena</th></tr></thead><tbody>{rows}</tbody></table></div></div>'
+        )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Skup</title>'
+        + "<script>var x = 1;</script>" * 50
+        + f'</head><body><nav>{filler}</nav><div id="accordionProductDetails">{"".join(panels)}</div>'
+        + f"<footer>{filler}</footer></body></html>"
+    ).encode("utf-8")
+
+def legacy_parse(content):
+    """Pierwotny parser: całe drzewo strony w html.parser i find/find_all po każdym panelu."""
+    soup = BeautifulSoup(content, 'html.parser')
+    scraped_data = []
+    accordion_container = soup.find('div', id='accordionProductDetails')
+    for panel in accordion_container.find_all('div', class_='panel panel-default'):
+        category_name = "Nieznana kategoria"
+        panel_heading = panel.find('div', class_='panel-heading')
+        if panel_heading:
+            title_tag = panel_heading.find('h4', class_='panel-title')
+            if title_tag and title_tag.find('a'):
+                category_name = title_tag.find('a').get_text(strip=True)
+                indicator_icon = title_tag.find('a').find('i', class_='indicator')
+                if indicator_icon:
+                    category_name = category_name.replace(indicator_icon.get_text(strip=True), "").strip()
+        data_table = panel.find('table', class_=re.compile(r'table\s'))
+        for row in data_table.find('tbody').find_all('tr'):
+            cols = row.find_all('td')
+            if len(cols) == 2:
+                price_value = apart.clean_price(cols[1].get_text(strip=True))
+                scraped_data.append((category_name, cols[0].get_text(strip=True), price_value, TIMESTAMP))
+    return scraped_data
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def compare_parsers(content, repeat):
+    legacy_time, legacy_rows = best_time(lambda: legacy_parse(content), repeat)
+    print(f"Strona: {len(content) / 1024:.0f} KiB, {len(legacy_rows)} produktów")
+    print(f"  html.parser (cała strona):  {legacy_time * 1000:8.1f} ms")
+    for name, parser in (("html.parser + SoupStrainer", apart.parse_with_bs4), ("lxml", apart.parse_with_lxml)):
+        elapsed, (rows, _) = best_time(lambda: parser(content, TIMESTAMP), repeat)
+        assert rows == legacy_rows, f"{name}: inny wynik parsowania"
+        print(f"  {name:<27} {elapsed * 1000:8.1f} ms  ({legacy_time / elapsed:.1f}x szybciej)")
+
+def change_some_prices(rows, fraction=0.05, seed=3):
+    rng = random.Random(seed)
+    return [(c, n, round(p * 1.01, 2) if rng.random() < fraction else p, t) for c, n, p, t in rows]
+
+def compare_rows_written(content):
+    rows = apart.parse_apart_page(content, TIMESTAMP)
+    runs = [rows, rows, change_some_prices(rows)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "apart.db")
+        apart.db.init_schema(db_path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for run_rows in runs:
+                apart.insert_apart_data_to_db(db_path, run_rows)
+        with apart.db.connection(db_path) as conn:
+            written = conn.execute(f"SELECT COUNT(*) FROM {apart.TABLE_NAME_APART}").fetchone()[0]
+        apart.db.close_all_pools()
+    print(f"Wiersze zapisane w {len(runs)} przebiegach (ta sama strona 2x, potem ~5% zmienionych cen):")
+    print(f"  dopisywanie wszystkiego:  {sum(len(r) for r in runs)}")
+    print(f"  tylko zmiany (skrót):     {written}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="Nagraj fixture z prawdziwej strony.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixture()
+    else:
+        if os.path.exists(FIXTURE_PATH):
+            with open(FIXTURE_PATH, 'rb') as f:
+                page = f.read()
+        else:
+            print(f"Brak {FIXTURE_PATH} - używam syntetycznej strony.")
+            page = synthetic_page()
+        compare_parsers(page, args.repeat)
+        compare_rows_written(page)
@@ -0,0 +1,127 @@
+"""Test obciążeniowy API HTTP (api.py) na syntetycznej bazie.
+
+Serwer działa w tym samym procesie (osobny wątek z własną pętlą asyncio), a N klientów na połączeniach
+keep-alive wysyła zapytania o wycenę, historię i cenę. Każda trasa mierzona jest raz bez nagłówka
+If-None-Match (odpowiedź z cache treści albo liczona) i raz z ETagiem z poprzedniej odpowiedzi (304).
+
+Uruchomienie:  python benchmarks/bench_api.py [--clients 32] [--requests 200] [--users 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '..')))
+sys.path.insert(0, BENCH_DIR)
+
+import api
+import bench_sessions
+import db
+import ingest_queue
+import users
+
+PASSWORD = "bench"
+TARGETS = {
+    "wycena": "/api/valuation?currency=EUR&limit=50",
+    "historia": "/api/history?days=365&currency=EUR&limit=400",
+    "cena": "/api/prices/stock/T0001",
+}
+
+async def http_request(reader, writer, method, path, headers=(), body=b""):
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}", *headers]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        response_headers[key.strip().lower()] = value.strip()
+    length = int(response_headers.get("content-length", 0))
+    return status, response_headers, await reader.readexactly(length) if length else b""
+
+async def login(port, username):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"username": username, "password": PASSWORD}).encode()
+    status, _, payload = await http_request(reader, writer, "POST", "/api/login", body=body)
+    writer.close()
+    assert status == 200, payload
+    return json.loads(payload)["token"]
+
+async def client(port, token, path, n_requests, conditional, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    auth = f"Authorization: Bearer {token}"
+    _, headers, _ = await http_request(reader, writer, "GET", path, [auth])
+    extra = [auth, f"If-None-Match: {headers['etag']}"] if conditional else [auth]
+    expected = 304 if conditional else 200
+    for _ in range(n_requests):
+        started = time.perf_counter()
+        status, _, _ = await http_request(reader, writer, "GET", path, extra)
+        latencies.append(time.perf_counter() - started)
+        assert status == expected, status
+    writer.close()
+
+async def load(port, tokens, path, n_clients, n_requests, conditional):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, tokens[i % len(tokens)], path, n_requests, conditional, latencies) for i in range(n_clients)
+    ))
+    return time.perf_counter() - started, sorted(latencies)
+
+def start_server(db_path):
+    server = api.ApiServer(db_path)
+    started = threading.Event()
+    loop = asyncio.new_event_loop()
+
+    async def serve():
+        ready = asyncio.Event()
+        task = asyncio.create_task(server.serve("127.0.0.1", 0, ready))
+        await ready.wait()
+        started.set()
+        await task
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(serve()), daemon=True)
+    thread.start()
+    started.wait()
+    return server
+
+def run(n_clients, n_requests, n_users, n_tickers):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        bench_sessions.build_database(db_path, n_tickers, n_users, years=2)
+        with db.transaction(db_path) as conn:
+            conn.execute("UPDATE users SET password = ?", (users.hash_password(PASSWORD),))
+            usernames = [row[0] for row in conn.execute("SELECT username FROM users ORDER BY id")]
+        server = start_server(db_path)
+
+        async def scenario():
+            tokens = [await login(server.port, username) for username in usernames]
+            print(f"{n_clients} klientów x {n_requests} zapytań, {len(tokens)} użytkowników, {n_tickers} tickerów")
+            for name, path in TARGETS.items():
+                for conditional in (False, True):
+                    elapsed, latencies = await load(server.port, tokens, path, n_clients, n_requests, conditional)
+                    label = f"{name} ({'If-None-Match' if conditional else 'pełna odpowiedź'})"
+                    print(f"  {label:<30} p50 {bench_sessions.percentile(latencies, 0.5) * 1000:6.2f} ms  "
+                          f"p99 {bench_sessions.percentile(latencies, 0.99) * 1000:6.2f} ms  "
+                          f"{len(latencies) / elapsed:8.0f} zapytań/s")
+
+        asyncio.run(scenario())
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--tickers", type=int, default=50)
+    args = parser.parse_args()
+    run(args.clients, args.requests, args.users, args.tickers)
@@ -0,0 +1,81 @@
+"""Sprawdzenie i benchmark scraping/http_client.py na lokalnym serwerze NBP stub (bez sieci).
+
+- połączenia: requests.get per zapytanie vs wspólna sesja keep-alive,
+- ponawianie: serwer zwraca 503 na pierwsze zapytania o każdą ścieżkę,
+- zapytania warunkowe: drugi backfill tego samego zakresu dostaje 304 i niczego nie parsuje.
+
+Uruchomienie:  python benchmarks/bench_http_client.py [--requests 200] [--latency 0.0]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scraping', 'currency'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import nbp
+from nbp_stub_server import start_stub_server
+from scraping import http_client
+
+# Lokalny stub nie potrzebuje limitu zapytań.
+http_client.HOST_RATE_LIMITS["127.0.0.1"] = (10000.0, 10000)
+
+def single_day_urls(base_url, n_requests):
+    day = datetime.date(2024, 1, 1)
+    return [f"{base_url}/tables/A/{day + datetime.timedelta(days=i % 365)}/?format=json" for i in range(n_requests)]
+
+def compare_connections(n_requests, latency):
+    for name, make_get in (
+        ("requests.get", lambda: requests.get),
+        ("HttpClient", lambda: http_client.HttpClient().get),
+    ):
+        server, base_url = start_stub_server(latency=latency)
+        get = make_get()
+        start = time.perf_counter()
+        for url in single_day_urls(base_url, n_requests):
+            get(url, timeout=10)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        print(f"  {name:<14} {elapsed:7.3f} s, połączeń TCP: {server.stats['connections']}")
+
+def check_retries():
+    server, base_url = start_stub_server(failures=2)
+    client = http_client.HttpClient(backoff_base=0.01)
+    response = client.get(f"{base_url}/tables/A/2024-01-02/2024-01-31/?format=json")
+    server.shutdown()
+    print(f"  status {response.status_code} po {server.stats['requests']} zapytaniach (2 x 503, potem 200)")
+
+def check_conditional_backfill():
+    server, base_url = start_stub_server()
+    start_date, end_date = datetime.date(2023, 1, 1), datetime.date(2024, 12, 31)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "http.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            nbp.db.init_schema(db_path)
+            first = nbp.backfill_nbp_rates(db_path, start_date, end_date, base_url=base_url)
+            second = nbp.backfill_nbp_rates(db_path, start_date, end_date, base_url=base_url)
+        nbp.db.close_all_pools()
+    server.shutdown()
+    print(f"  pierwszy backfill: {first} wierszy, drugi: {second} wierszy "
+          f"({server.stats.get('not_modified', 0)} odpowiedzi 304)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    print(f"{args.requests} zapytań o pojedyncze dni:")
+    compare_connections(args.requests, args.latency)
+    print("Ponawianie błędów 503:")
+    check_retries()
+    print("Zapytania warunkowe (ETag):")
+    check_conditional_backfill()
@@ -0,0 +1,90 @@
+"""Benchmark kolejki zapisu (ingest_queue) przy kilku równoległych producentach.
+
+Porównuje dotychczasowy zapis (każda paczka we własnej transakcji, z własnego połączenia) z przekazywaniem
+paczek do kolejki, która łączy je w duże transakcje na jednym wątku zapisującym.
+
+Uruchomienie:  python benchmarks/bench_ingest_queue.py [--producers 4] [--batches 200] [--rows 50]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import ingest_queue
+from scraping.stock import yfinance_scraper
+
+START_DATE = datetime.date(2000, 1, 3)
+
+def make_batches(producer, n_batches, n_rows):
+    """Paczki notowań jednego producenta: każda paczka to n_rows kolejnych dni jednego tickera."""
+    batches = []
+    for b in range(n_batches):
+        ticker = f"P{producer}T{b:04d}"
+        batches.append([
+            (ticker, (START_DATE + datetime.timedelta(days=d)).isoformat(), 1.0, 2.0, 0.5, 1.5, 1.5, 1000)
+            for d in range(n_rows)
+        ])
+    return batches
+
+def write_direct(db_path, batch):
+    with db.transaction(db_path) as conn:
+        yfinance_scraper.write_yfinance_rows(conn, batch)
+
+def write_queued(db_path, batch):
+    ingest_queue.get_queue(db_path).write(yfinance_scraper.write_yfinance_rows, batch)
+
+def run_producers(db_path, write, all_batches):
+    errors = []
+
+    def produce(batches):
+        for batch in batches:
+            try:
+                write(db_path, batch)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=produce, args=(batches,)) for batches in all_batches]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+def run(n_producers, n_batches, n_rows):
+    all_batches = [make_batches(p, n_batches, n_rows) for p in range(n_producers)]
+    total_rows = n_producers * n_batches * n_rows
+    print(f"{n_producers} producentów x {n_batches} paczek x {n_rows} wierszy = {total_rows} wierszy")
+
+    for name, write in (("osobne transakcje", write_direct), ("kolejka zapisu", write_queued)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "bench.db")
+            db.init_schema(db_path)
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed, errors = run_producers(db_path, write, all_batches)
+            with db.connection(db_path) as conn:
+                written = conn.execute("SELECT COUNT(*) FROM yfinance_stock_data").fetchone()[0]
+            print(f"  {name:<18} {elapsed:6.2f} s  {written / elapsed:9.0f} wierszy/s  "
+                  f"zapisano {written}, błędów 'database is locked': {len(errors)}")
+            if write is write_queued:
+                print(f"  {ingest_queue.get_queue(db_path).report()}")
+            ingest_queue.close_all_queues()
+            db.close_all_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+    run(args.producers, args.batches, args.rows)
@@ -0,0 +1,80 @@
+"""Benchmark pobierania historii kursów NBP na lokalnym serwerze stub (bez sieci).
+
+Porównuje starą ścieżkę (jeden dzień = jedno zapytanie + osobny zapis) z backfill_nbp_rates
+(okna 93-dniowe pobierane równolegle, jeden zapis zbiorczy).
+
+Uruchomienie:  python benchmarks/bench_nbp_backfill.py [--years 3] [--latency 0.02]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scraping', 'currency'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import nbp
+from nbp_stub_server import start_stub_server
+from scraping import http_client
+
+# Lokalny stub nie potrzebuje limitu zapytań.
+http_client.HOST_RATE_LIMITS["127.0.0.1"] = (10000.0, 10000)
+
+LEGACY_SLEEP = 0.2
+
+def legacy_backfill(db_path, start_date, end_date, base_url):
+    day = start_date
+    while day <= end_date:
+        rates = nbp.fetch_nbp_rates_for_date(day, base_url=base_url)
+        if rates:
+            nbp.insert_nbp_currency_data(db_path, rates)
+        day += datetime.timedelta(days=1)
+
+def count_rows(db_path):
+    with nbp.db.connection(db_path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {nbp.TABLE_NAME_NBP}").fetchone()[0]
+
+def timed(func):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    return time.perf_counter() - start
+
+def run(years, latency, workers):
+    end_date = datetime.date(2024, 12, 31)
+    start_date = end_date - datetime.timedelta(days=int(365 * years) - 1)
+    n_days = (end_date - start_date).days + 1
+    server, base_url = start_stub_server(latency=latency)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            legacy_db = os.path.join(tmp_dir, "legacy.db")
+            batched_db = os.path.join(tmp_dir, "batched.db")
+            for db_path in (legacy_db, batched_db):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    nbp.db.init_schema(db_path)
+
+            legacy_time = timed(lambda: legacy_backfill(legacy_db, start_date, end_date, base_url))
+            batched_time = timed(lambda: nbp.backfill_nbp_rates(batched_db, start_date, end_date, workers, base_url))
+
+            print(f"Zakres: {start_date} - {end_date} ({n_days} dni), opóźnienie serwera {latency * 1000:.0f} ms")
+            print(f"  stara ścieżka:  {legacy_time:8.3f} s  ({count_rows(legacy_db)} wierszy)"
+                  f" + {n_days * LEGACY_SLEEP:.0f} s time.sleep w poprzednim main()")
+            print(f"  backfill:       {batched_time:8.3f} s  ({count_rows(batched_db)} wierszy)")
+            print(f"  przyspieszenie: {legacy_time / batched_time:8.1f}x (bez uwzględnienia sleep)")
+            nbp.db.close_all_pools()
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="Opóźnienie odpowiedzi stuba w sekundach.")
+    parser.add_argument("--workers", type=int, default=nbp.BACKFILL_WORKERS)
+    args = parser.parse_args()
+    run(args.years, args.latency, args.workers)
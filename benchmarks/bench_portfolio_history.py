@@ -0,0 +1,87 @@
+"""Benchmark historii wartości portfela (portfolio_history.portfolio_value_history) na syntetycznej bazie.
+
+Uruchomienie:  python benchmarks/bench_portfolio_history.py [--tickers 200] [--years 3]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import portfolio_history
+import positions
+
+USER_ID = 1
+CURRENCIES = ["USD", "EUR", "GBP", "CHF", "JPY"]
+N_GOLD_PRODUCTS = 20
+
+def business_days(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += datetime.timedelta(days=1)
+
+def build_database(db_path, n_tickers, start, end, seed=42):
+    rng = random.Random(seed)
+    db.init_schema(db_path)
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    products = [f"G{i:03d}" for i in range(N_GOLD_PRODUCTS)]
+    days = [day.isoformat() for day in business_days(start, end)]
+
+    with db.transaction(db_path) as conn:
+        conn.execute("INSERT INTO users (id, username, password) VALUES (?, 'bench', 'x')", (USER_ID,))
+        conn.executemany(
+            "INSERT INTO yfinance_stock_data (ticker, data_notowania, close_price) VALUES (?, ?, ?)",
+            [(ticker, day, rng.uniform(10, 500)) for ticker in tickers for day in days]
+        )
+        conn.executemany(
+            "INSERT INTO kursy_walut_nbp (data_notowania, nazwa_waluty, kod_waluty, kurs_sredni) VALUES (?, ?, ?, ?)",
+            [(day, code, code, rng.uniform(0.02, 5)) for code in CURRENCIES for day in days]
+        )
+        conn.executemany(
+            "INSERT INTO ceny_skupu_apart (kategoria_produktu, nazwa_produktu, cena_skupu, timestamp_pobrania) VALUES ('Złoto', ?, ?, ?)",
+            [(product, rng.uniform(100, 10000), f"{day}T12:00:00") for product in products for day in days[::5]]
+        )
+        for ticker in tickers:
+            positions.record_buy(conn, USER_ID, "stock", ticker, rng.uniform(1, 100), None)
+        for product in products:
+            positions.record_buy(conn, USER_ID, "gold", product, rng.uniform(1, 10), None)
+        for code in CURRENCIES:
+            positions.record_buy(conn, USER_ID, "currency", code, rng.uniform(100, 1000), None)
+        # Transakcje rozłożone w czasie, żeby suma narastająca miała co liczyć.
+        conn.execute(
+            "UPDATE portfolio_transactions SET created_at = date(?, '+' || (id * 7 % 1500) || ' days')",
+            (start.isoformat(),)
+        )
+
+def run(n_tickers, years, repeat):
+    end = datetime.date(2025, 1, 1)
+    start = end - datetime.timedelta(days=365 * years)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        build_database(db_path, n_tickers, start, end)
+        with db.connection(db_path) as conn:
+            best = None
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                history = portfolio_history.portfolio_value_history(conn, USER_ID, start, end, "EUR")
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+        db.close_all_pools()
+    print(f"{n_tickers} tickerów + {N_GOLD_PRODUCTS} produktów złota + {len(CURRENCIES)} walut, "
+          f"{len(history)} dni: {best:.3f} s (najlepszy z {repeat})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.tickers, args.years, args.repeat)
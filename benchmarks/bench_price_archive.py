@@ -0,0 +1,111 @@
+"""Benchmark archiwum Parquet (price_archive) względem skanów zakresów w SQLite.
+
+Na syntetycznej bazie z bench_portfolio_history porównuje wczytanie historii cen i wartości portfela
+z samego SQLite i z archiwum (zawsze od pustego price_store) oraz pamięć zużytą przez pełny skan notowań OHLCV (tracemalloc nie widzi
+buforów Arrow, więc dla archiwum podawany jest rozmiar największej paczki).
+
+Uruchomienie:  python benchmarks/bench_price_archive.py [--tickers 200] [--years 3]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '..')))
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd
+
+import bench_portfolio_history
+import db
+import ingest_queue
+import portfolio_history
+import price_archive
+import price_store
+
+def cold(func):
+    """Każde wywołanie zaczyna od pustego price_store - mierzone jest wczytanie historii, nie odczyt z pamięci."""
+    def run():
+        price_store.store.invalidate()
+        return func()
+    return run
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+def scan_sqlite(conn):
+    """Pełny skan OHLCV jak dotąd: wszystkie wiersze jako krotki Pythona."""
+    rows = conn.execute(
+        "SELECT ticker, data_notowania, open_price, high_price, low_price, close_price, adj_close_price, volume "
+        "FROM yfinance_stock_data"
+    ).fetchall()
+    return len(rows)
+
+def scan_archive(keys, start, end, archive_dir):
+    rows = largest_batch = 0
+    for batch in price_archive.iter_batches("stock", keys, start, end, root=archive_dir):
+        rows += batch.num_rows
+        largest_batch = max(largest_batch, batch.nbytes)
+    return rows, largest_batch
+
+def run(n_tickers, years, repeat):
+    end = datetime.date(2025, 1, 1)
+    start = end - datetime.timedelta(days=365 * years)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        archive_dir = os.path.join(tmp_dir, "archive")
+        bench_portfolio_history.build_database(db_path, n_tickers, start, end)
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_time, written = best_time(lambda: price_archive.export(db_path, root=archive_dir), 1)
+        print(f"Eksport: {written} plików lat w {export_time:.2f} s")
+
+        with db.connection(db_path) as conn:
+            keys = [row[0] for row in conn.execute("SELECT DISTINCT ticker FROM yfinance_stock_data")]
+            sqlite_time, from_sqlite = best_time(
+                cold(lambda: portfolio_history.load_price_history(conn, "stock", keys, start, end)), repeat)
+            archive_time, from_archive = best_time(
+                cold(lambda: portfolio_history.load_price_history(conn, "stock", keys, start, end, archive_dir)), repeat)
+            pd.testing.assert_frame_equal(from_sqlite, from_archive, check_freq=False)
+            print(f"Historia cen {len(keys)} tickerów:  SQLite {sqlite_time:.3f} s,  archiwum {archive_time:.3f} s")
+
+            sqlite_time, from_sqlite = best_time(cold(lambda: portfolio_history.portfolio_value_history(
+                conn, bench_portfolio_history.USER_ID, start, end, "EUR")), repeat)
+            archive_time, from_archive = best_time(cold(lambda: portfolio_history.portfolio_value_history(
+                conn, bench_portfolio_history.USER_ID, start, end, "EUR", archive_dir)), repeat)
+            pd.testing.assert_frame_equal(from_sqlite, from_archive)
+            print(f"Wartość portfela:           SQLite {sqlite_time:.3f} s,  archiwum {archive_time:.3f} s")
+
+            sqlite_memory, n_sqlite = peak_memory(lambda: scan_sqlite(conn))
+            n_archive, largest_batch = scan_archive(keys, start, end, archive_dir)
+            print(f"Pełny skan OHLCV ({n_sqlite} / {n_archive} wierszy): SQLite {sqlite_memory / 2**20:.1f} MiB "
+                  f"krotek Pythona,  archiwum - największa paczka Arrow {largest_batch / 2**20:.1f} MiB")
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.tickers, args.years, args.repeat)
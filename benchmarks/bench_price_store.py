@@ -0,0 +1,90 @@
+"""Benchmark price_store: powtarzane wykresy historii portfela na syntetycznej bazie z bench_portfolio_history.
+
+Każdy zakres wykresu i waluta raportowa to inny klucz cache portfela, więc historia liczona jest od nowa.
+Porównywane jest liczenie z pustym price_store (każdy wykres wczytuje pełną historię cen z SQLite)
+i z wypełnionym. Dodatkowo: pamięć serii w store względem tych samych notowań jako krotek Pythona
+oraz zachowanie LRU przy budżecie mniejszym niż cała historia.
+
+Uruchomienie:  python benchmarks/bench_price_store.py [--tickers 200] [--years 3] [--budget-mb 1]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '..')))
+sys.path.insert(0, BENCH_DIR)
+
+import bench_portfolio_history
+import db
+import metrics
+import portfolio_history
+import price_store
+
+RANGES_DAYS = (30, 90, 365, 1095)
+CURRENCIES = ("PLN", "EUR", "USD")
+
+def render_charts(conn, end, cold):
+    """Wszystkie kombinacje zakresu i waluty; zwraca czasy kolejnych wykresów."""
+    times = []
+    for days in RANGES_DAYS:
+        for currency in CURRENCIES:
+            if cold:
+                price_store.store.invalidate()
+            started = time.perf_counter()
+            portfolio_history.portfolio_value_history(
+                conn, bench_portfolio_history.USER_ID, end - datetime.timedelta(days=days - 1), end, currency
+            )
+            times.append(time.perf_counter() - started)
+    return times
+
+def tuples_memory(conn):
+    tracemalloc.start()
+    try:
+        rows = conn.execute("SELECT ticker, data_notowania, close_price FROM yfinance_stock_data").fetchall()
+        return tracemalloc.get_traced_memory()[0], len(rows)
+    finally:
+        tracemalloc.stop()
+
+def run(n_tickers, years, budget_mb):
+    end = datetime.date(2025, 1, 1)
+    start = end - datetime.timedelta(days=365 * years)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        bench_portfolio_history.build_database(db_path, n_tickers, start, end)
+        with db.connection(db_path) as conn:
+            n_charts = len(RANGES_DAYS) * len(CURRENCIES)
+            print(f"{n_tickers} tickerów, lata historii: {years}, {n_charts} wykresów (zakresy {RANGES_DAYS} dni x {CURRENCIES})")
+            for name, cold in (("pusty price_store", True), ("price_store", False)):
+                price_store.store.invalidate()
+                times = render_charts(conn, end, cold)
+                print(f"  {name:<16} razem {sum(times):6.3f} s,  mediana wykresu {sorted(times)[len(times) // 2] * 1000:7.1f} ms")
+
+            keys = [row[0] for row in conn.execute("SELECT DISTINCT ticker FROM yfinance_stock_data")]
+            price_store.store.invalidate()
+            series = price_store.store.get_series(conn, "stock", keys)
+            points = sum(len(s) for s in series.values())
+            tuples_bytes, n_rows = tuples_memory(conn)
+            print(f"Pamięć {points} notowań akcji: price_store {price_store.store.nbytes / 2**20:6.1f} MiB,  "
+                  f"krotki Pythona {tuples_bytes / 2**20:6.1f} MiB ({n_rows} wierszy)")
+
+            limited = price_store.PriceStore(budget_bytes=int(budget_mb * 2**20))
+            metrics.registry.reset()
+            for offset in range(0, len(keys), 20):
+                limited.get_series(conn, "stock", keys[offset:offset + 20])
+            evictions = metrics.registry.counter_value("price_store_evictions_total")
+            print(f"Budżet {budget_mb} MiB: w pamięci {len(limited)} z {len(keys)} serii, "
+                  f"{limited.nbytes / 2**20:.2f} MiB, usuniętych {evictions}")
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--budget-mb", type=float, default=1.0)
+    args = parser.parse_args()
+    run(args.tickers, args.years, args.budget_mb)
@@ -0,0 +1,158 @@
+"""Test obciążeniowy trybu serwerowego: N równoległych sesji odświeżających portfel.
+
+Każda sesja loguje jednego z użytkowników syntetycznej bazy i w pętli odświeża ekran portfela - wycenę
+i historię z ostatniego roku, zlecane do wspólnej puli wątków UI jak w main.py. Co --add-every odświeżeń
+sesja dokupuje aktywo (unieważnia cache użytkownika), a osobny wątek co --price-interval s zapisuje
+notowanie przez kolejkę zapisu (nowa wersja cen). Porównywane jest liczenie wszystkiego od zera
+z cache wyników portfela; raportowane są p50/p99 opóźnienia odświeżenia.
+
+Uruchomienie:  python benchmarks/bench_sessions.py [--sessions 20] [--users 5] [--refreshes 10]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '..')))
+sys.path.insert(0, BENCH_DIR)
+
+import background
+import bench_portfolio_history
+import db
+import ingest_queue
+import main
+import metrics
+import migrations
+import sessions
+from scraping.stock import yfinance_scraper
+
+HISTORY_DAYS = 365
+REPORTING_CURRENCY = "EUR"
+
+class NoCache:
+    """Dotychczasowe zachowanie: każde odświeżenie liczy wszystko od zera."""
+
+    def get(self, conn, user_id, key, compute):
+        return compute(conn)
+
+    def invalidate_user(self, user_id):
+        pass
+
+def build_database(db_path, n_tickers, n_users, years):
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=365 * years)
+    bench_portfolio_history.build_database(db_path, n_tickers, start, end)
+    with db.transaction(db_path) as conn:
+        migrations.rebuild_latest_prices(conn)
+        # Pozostali użytkownicy dostają różne podzbiory pozycji pierwszego.
+        for user_id in range(2, n_users + 1):
+            conn.execute("INSERT INTO users (id, username, password) VALUES (?, ?, 'x')", (user_id, f"bench{user_id}"))
+            conn.execute(
+                """
+                INSERT INTO positions (user_id, asset_type, asset_name, quantity, cost_basis, updated_at)
+                SELECT ?, asset_type, asset_name, quantity, cost_basis, updated_at FROM positions
+                WHERE user_id = ? AND (id + ?) % 3 != 0
+                """,
+                (user_id, bench_portfolio_history.USER_ID, user_id)
+            )
+            conn.execute(
+                """
+                INSERT INTO portfolio_transactions (user_id, asset_type, asset_name, quantity, price, created_at)
+                SELECT ?, asset_type, asset_name, quantity, price, created_at FROM portfolio_transactions
+                WHERE user_id = ? AND asset_name IN (SELECT asset_name FROM positions WHERE user_id = ?)
+                """,
+                (user_id, bench_portfolio_history.USER_ID, user_id)
+            )
+    return start, end
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def run_session(index, user_id, refreshes, add_every, latencies, lock):
+    session = sessions.session_store.open(f"bench-{index}")
+    session.user_id = user_id
+    own = []
+    for refresh in range(refreshes):
+        started = time.perf_counter()
+        value = background.ui_executor.submit(main.get_portfolio_value_and_categories, user_id, REPORTING_CURRENCY)
+        history = background.ui_executor.submit(main.get_portfolio_history, user_id, HISTORY_DAYS, REPORTING_CURRENCY)
+        value.result()
+        history.result()
+        own.append(time.perf_counter() - started)
+        if add_every and refresh % add_every == add_every - 1:
+            main.add_asset_to_portfolio_db(user_id, "T0000", "stock", 1)
+    sessions.session_store.close(session.session_id)
+    with lock:
+        latencies.extend(own)
+
+def write_prices(db_path, interval, stop):
+    """Symuluje scraper: co `interval` s nowe notowanie, czyli nowa wersja cen."""
+    day = datetime.date.today().isoformat()
+    n = 0
+    while not stop.wait(interval):
+        n += 1
+        ingest_queue.get_queue(db_path).write(
+            yfinance_scraper.write_yfinance_rows, [("T0001", day, 1.0, 1.0, 1.0, 100.0 + n, 100.0 + n, 1000)]
+        )
+
+def run_load(db_path, n_sessions, n_users, refreshes, add_every, price_interval):
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    writer = threading.Thread(target=write_prices, args=(db_path, price_interval, stop))
+    threads = [
+        threading.Thread(target=run_session, args=(i, i % n_users + 1, refreshes, add_every, latencies, lock))
+        for i in range(n_sessions)
+    ]
+    started = time.perf_counter()
+    if price_interval:
+        writer.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if price_interval:
+        writer.join()
+    return elapsed, sorted(latencies)
+
+def run(n_sessions, n_users, refreshes, n_tickers, years, add_every, price_interval):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        build_database(db_path, n_tickers, n_users, years)
+        main.DATABASE_PATH = db_path
+        print(f"{n_sessions} sesji, {n_users} użytkowników, {refreshes} odświeżeń na sesję, "
+              f"{n_tickers} tickerów, historia {HISTORY_DAYS} dni")
+
+        for name, cache in (("bez cache", NoCache()), ("cache portfela", sessions.PortfolioCache())):
+            sessions.portfolio_cache = cache
+            metrics.registry.reset()
+            elapsed, latencies = run_load(db_path, n_sessions, n_users, refreshes, add_every, price_interval)
+            hits = metrics.registry.counter_value("cache_hits_total", cache="portfolio")
+            misses = metrics.registry.counter_value("cache_misses_total", cache="portfolio")
+            hit_ratio = f",  trafienia {hits / (hits + misses):.0%}" if hits + misses else ""
+            print(f"  {name:<15} p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+                  f"{len(latencies) / elapsed:6.1f} odświeżeń/s{hit_ratio}")
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--refreshes", type=int, default=10)
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--add-every", type=int, default=5, help="Co ile odświeżeń sesja dokupuje aktywo (0 - nigdy).")
+    parser.add_argument("--price-interval", type=float, default=1.0,
+                        help="Co ile sekund zapisywane jest nowe notowanie (0 - bez zapisów).")
+    args = parser.parse_args()
+    run(args.sessions, args.users, args.refreshes, args.tickers, args.years, args.add_every, args.price_interval)
@@ -0,0 +1,102 @@
+"""Benchmark zapisu strumieniowego źródeł (scraping.sources) na syntetycznym backfillu notowań.
+
+Porównuje szczyt pamięci (tracemalloc) przy parsowaniu do jednej listy, jak dotąd, i przy generatorze
+zapisywanym paczkami przez ChunkSink. Na koniec przerywa backfill w połowie i sprawdza, ile wierszy
+zostało w bazie.
+
+Uruchomienie:  python benchmarks/bench_streaming_ingest.py [--tickers 200] [--days 2500] [--batch-rows 5000]
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import ingest_queue
+from scraping import sources
+from scraping.stock import yfinance_scraper
+
+START_DATE = datetime.date(2000, 1, 3)
+
+class BackfillCrashed(Exception):
+    pass
+
+def generate_rows(n_tickers, n_days, crash_after=None):
+    """Notowania ticker po tickerze, jak fetch_stock_data_for_tickers; opcjonalnie wyjątek po crash_after tickerach."""
+    dates = [(START_DATE + datetime.timedelta(days=d)).isoformat() for d in range(n_days)]
+    for t in range(n_tickers):
+        if crash_after is not None and t == crash_after:
+            raise BackfillCrashed(f"przerwano po {t} tickerach")
+        ticker = f"S{t:04d}"
+        for i, day in enumerate(dates):
+            price = 100.0 + t + i * 0.01
+            yield (ticker, day, price, price, price, price, price, 1000)
+
+class SyntheticSource(sources.Source):
+    name = "bench"
+
+    def __init__(self, n_tickers, n_days, batch_rows, materialise=False, crash_after=None):
+        self.n_tickers = n_tickers
+        self.n_days = n_days
+        self.write_batch_rows = batch_rows
+        self.materialise = materialise
+        self.crash_after = crash_after
+
+    def fetch(self, db_path, client):
+        return generate_rows(self.n_tickers, self.n_days, self.crash_after)
+
+    def parse(self, rows):
+        return list(rows) if self.materialise else rows
+
+    def write(self, conn, rows):
+        return yfinance_scraper.write_yfinance_rows(conn, rows)
+
+def count_rows(db_path):
+    with db.connection(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM yfinance_stock_data").fetchone()[0]
+
+def run_once(source):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        db.init_schema(db_path)
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            source.run(db_path)
+            error = None
+        except BackfillCrashed as e:
+            error = e
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        written = count_rows(db_path)
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+    return elapsed, peak, written, error
+
+def run(n_tickers, n_days, batch_rows):
+    logging.disable(logging.INFO)
+    print(f"{n_tickers} tickerów x {n_days} dni = {n_tickers * n_days} wierszy, paczki po {batch_rows}")
+    for name, materialise in (("lista w pamięci", True), ("generator + ChunkSink", False)):
+        elapsed, peak, written, _ = run_once(SyntheticSource(n_tickers, n_days, batch_rows, materialise))
+        print(f"  {name:<22} {elapsed:6.2f} s  szczyt pamięci {peak / 2**20:7.1f} MB  zapisano {written}")
+
+    crash_after = n_tickers // 2
+    for name, materialise in (("lista w pamięci", True), ("generator + ChunkSink", False)):
+        _, _, written, error = run_once(SyntheticSource(n_tickers, n_days, batch_rows, materialise, crash_after))
+        print(f"  przerwany ({name}): {error}, w bazie {written} wierszy")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--batch-rows", type=int, default=sources.WRITE_BATCH_ROWS)
+    args = parser.parse_args()
+    run(args.tickers, args.days, args.batch_rows)
@@ -0,0 +1,125 @@
+"""Benchmark wyceny portfela: poprzednia ścieżka (zapytanie o cenę per pozycja) vs valuation.value_portfolio.
+
+Uruchomienie:  python benchmarks/bench_valuation.py [--sizes 10 1000 50000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import valuation
+
+USER_ID = 1
+N_TICKERS = 500
+N_GOLD_PRODUCTS = 100
+CURRENCIES = ["USD", "EUR", "GBP", "CHF", "JPY", "CAD", "AUD"]
+HISTORY_DAYS = 30
+
+def build_database(db_path, n_positions, seed=42):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL);
+        CREATE TABLE portfolios (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, asset_name TEXT NOT NULL,
+                                 asset_type TEXT NOT NULL, quantity REAL NOT NULL);
+        CREATE TABLE ceny_skupu_apart (id INTEGER PRIMARY KEY AUTOINCREMENT, kategoria_produktu TEXT,
+                                       nazwa_produktu TEXT NOT NULL, cena_skupu REAL NOT NULL, timestamp_pobrania TEXT NOT NULL);
+        CREATE TABLE yfinance_stock_data (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT NOT NULL, data_notowania DATE NOT NULL,
+                                          open_price REAL, high_price REAL, low_price REAL, close_price REAL,
+                                          adj_close_price REAL, volume INTEGER, UNIQUE(ticker, data_notowania));
+    """)
+    conn.execute("INSERT INTO users (id, username, password) VALUES (?, 'bench', 'x')", (USER_ID,))
+
+    tickers = [f"T{i:04d}" for i in range(N_TICKERS)]
+    products = [f"G{i:03d}" for i in range(N_GOLD_PRODUCTS)]
+    conn.executemany(
+        "INSERT INTO yfinance_stock_data (ticker, data_notowania, close_price) VALUES (?, ?, ?)",
+        [(t, f"2024-01-{d + 1:02d}", rng.uniform(10, 500)) for t in tickers for d in range(HISTORY_DAYS)]
+    )
+    conn.executemany(
+        "INSERT INTO ceny_skupu_apart (kategoria_produktu, nazwa_produktu, cena_skupu, timestamp_pobrania) VALUES ('Złoto', ?, ?, ?)",
+        [(p, rng.uniform(100, 10000), f"2024-01-{d + 1:02d}T12:00:00") for p in products for d in range(HISTORY_DAYS)]
+    )
+
+    positions = []
+    for _ in range(n_positions):
+        asset_type = rng.choice(["currency", "gold", "stock"])
+        if asset_type == "currency":
+            name = rng.choice(CURRENCIES)
+        elif asset_type == "gold":
+            name = rng.choice(products)
+        else:
+            name = rng.choice(tickers)
+        positions.append((USER_ID, name, asset_type, rng.uniform(1, 100)))
+    conn.executemany("INSERT INTO portfolios (user_id, asset_name, asset_type, quantity) VALUES (?, ?, ?, ?)", positions)
+    conn.commit()
+    conn.close()
+
+LEGACY_PRICE_SQL = {
+    "gold": "SELECT cena_skupu FROM ceny_skupu_apart WHERE nazwa_produktu = ? ORDER BY timestamp_pobrania DESC LIMIT 1",
+    "stock": "SELECT close_price FROM yfinance_stock_data WHERE ticker = ? ORDER BY data_notowania DESC LIMIT 1",
+}
+
+def legacy_get_asset_price(db_path, asset_name, asset_type):
+    if asset_type not in LEGACY_PRICE_SQL:
+        return valuation.DEFAULT_PRICES[asset_type]
+    conn = sqlite3.connect(db_path)
+    try:
+        result = conn.execute(LEGACY_PRICE_SQL[asset_type], (asset_name,)).fetchone()
+    finally:
+        conn.close()
+    return result[0] if result else valuation.DEFAULT_PRICES[asset_type]
+
+def legacy_value_portfolio(db_path, user_id):
+    """Odtworzenie pierwotnej implementacji: nowe połączenie i osobne zapytanie o cenę dla każdej pozycji."""
+    conn = sqlite3.connect(db_path)
+    assets = conn.execute("SELECT asset_name, asset_type, quantity FROM portfolios WHERE user_id = ?", (user_id,)).fetchall()
+    conn.close()
+    total = 0
+    for asset_name, asset_type, quantity in assets:
+        total += quantity * legacy_get_asset_price(db_path, asset_name, asset_type)
+    return total
+
+def batched_value_portfolio(db_path, user_id):
+    with db.connection(db_path) as conn:
+        return valuation.value_portfolio(conn, user_id)[0]
+
+def measure(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(sizes, repeat):
+    print(f"{'pozycje':>10} {'stara [s]':>12} {'nowa [s]':>12} {'przyspieszenie':>15}")
+    for n_positions in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "bench.db")
+            build_database(db_path, n_positions)
+            db.init_schema(db_path)
+
+            legacy_time, legacy_total = measure(lambda: legacy_value_portfolio(db_path, USER_ID), repeat)
+            batched_time, batched_total = measure(lambda: batched_value_portfolio(db_path, USER_ID), repeat)
+
+            if abs(legacy_total - batched_total) > 1e-6 * max(1.0, abs(legacy_total)):
+                print(f"UWAGA: różne wyniki wyceny ({legacy_total} != {batched_total})")
+            print(f"{n_positions:>10} {legacy_time:>12.4f} {batched_time:>12.4f} {legacy_time / batched_time:>14.1f}x")
+            db.close_all_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,96 @@
+"""Benchmark konwersji danych yfinance: iterrows per ticker vs kolumnowa konwersja wyniku yf.download.
+
+Domyślnie używa nagranego wyniku yf.download z benchmarks/fixtures/yfinance_download.pkl.
+Nagranie fixture (wymaga sieci):  python benchmarks/bench_yfinance_batch.py --record
+Bez pliku fixture generowana jest syntetyczna ramka o identycznej strukturze (MultiIndex ticker/kolumna).
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scraping', 'stock'))
+
+import yfinance_scraper
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'yfinance_download.pkl')
+LEGACY_SLEEP = 0.5
+
+def record_fixture(tickers, start, end):
+    import yfinance as yf
+    frame = yf.download(tickers, start=start, end=end, group_by='ticker', auto_adjust=False,
+                        actions=False, threads=True, progress=False)
+    os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+    frame.to_pickle(FIXTURE_PATH)
+    print(f"Zapisano {frame.shape} do {FIXTURE_PATH}")
+
+def synthetic_fixture(n_tickers, n_days, seed=7):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2020-01-01", periods=n_days, tz="America/New_York", name="Date")
+    tickers = [f"T{i:04d}" for i in range(n_tickers)]
+    fields = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+    data = rng.uniform(10, 500, size=(n_days, n_tickers * len(fields)))
+    frame = pd.DataFrame(data, index=index, columns=pd.MultiIndex.from_product([tickers, fields]))
+    frame.loc[:, (slice(None), 'Volume')] = frame.loc[:, (slice(None), 'Volume')].round() * 1000
+    return frame
+
+def legacy_rows(tickers, frame):
+    """Poprzednia konwersja: osobna ramka na ticker i hist.iterrows()."""
+    rows = []
+    for ticker_symbol in tickers:
+        hist = frame[ticker_symbol].dropna(how='all')
+        for date_index, row in hist.iterrows():
+            rows.append((
+                ticker_symbol,
+                date_index.strftime('%Y-%m-%d'),
+                row.get('Open'),
+                row.get('High'),
+                row.get('Low'),
+                row.get('Close'),
+                row.get('Adj Close'),
+                row.get('Volume')
+            ))
+    return rows
+
+def timed(func):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    return time.perf_counter() - start, result
+
+def run(frame, chunk_size):
+    tickers = list(dict.fromkeys(frame.columns.get_level_values(0)))
+    legacy_time, legacy = timed(lambda: legacy_rows(tickers, frame))
+    batched_time, batched = timed(lambda: yfinance_scraper.frame_to_batch_rows(tickers, frame))
+    assert len(legacy) == len(batched), (len(legacy), len(batched))
+
+    print(f"Ramka: {len(tickers)} tickerów x {len(frame)} dni = {len(batched)} wierszy")
+    print(f"  iterrows:          {legacy_time:8.3f} s")
+    print(f"  kolumnowo:         {batched_time:8.3f} s  ({legacy_time / batched_time:.1f}x szybciej)")
+    print(f"  zapytania HTTP:    {len(tickers)} (per ticker, + {len(tickers) * LEGACY_SLEEP:.0f} s sleep) "
+          f"-> {math.ceil(len(tickers) / chunk_size)} (paczki po {chunk_size})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="Nagraj fixture z prawdziwego yf.download.")
+    parser.add_argument("--start", default="2020-01-01")
+    parser.add_argument("--end", default="2025-01-01")
+    parser.add_argument("--tickers", type=int, default=400, help="Liczba tickerów w syntetycznej ramce.")
+    parser.add_argument("--days", type=int, default=1250, help="Liczba dni w syntetycznej ramce.")
+    parser.add_argument("--chunk-size", type=int, default=yfinance_scraper.DOWNLOAD_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixture(yfinance_scraper.POPULAR_TICKERS, args.start, args.end)
+    elif os.path.exists(FIXTURE_PATH):
+        run(pd.read_pickle(FIXTURE_PATH), args.chunk_size)
+    else:
+        print(f"Brak {FIXTURE_PATH} - używam syntetycznej ramki.")
+        run(synthetic_fixture(args.tickers, args.days), args.chunk_size)
@@ -0,0 +1,131 @@
+"""Lokalny serwer udający NBP API (tabela A) - do testów i benchmarków bez dostępu do sieci.
+
+Obsługiwane ścieżki (jak w http://api.nbp.pl/api/exchangerates):
+    /tables/A/{data}/
+    /tables/A/{start}/{end}/
+
+Odpowiedzi mają ETag (If-None-Match -> 304). Opcja `failures` sprawia, że pierwsze N zapytań
+o każdą ścieżkę kończy się 503 - do sprawdzania ponawiania w scraping/http_client.py.
+
+Uruchomienie samodzielne:  python benchmarks/nbp_stub_server.py --port 8765
+"""
+import argparse
+import datetime
+import json
+import re
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CURRENCIES = [
+    ("dolar amerykański", "USD"), ("euro", "EUR"), ("funt szterling", "GBP"), ("frank szwajcarski", "CHF"),
+    ("jen (Japonia)", "JPY"), ("dolar kanadyjski", "CAD"), ("dolar australijski", "AUD"), ("korona czeska", "CZK"),
+    ("korona norweska", "NOK"), ("korona szwedzka", "SEK"), ("forint (Węgry)", "HUF"), ("juan renminbi (Chiny)", "CNY"),
+]
+MAX_RANGE_DAYS = 93
+
+TABLE_PATH = re.compile(r"^/api/exchangerates/tables/A/(\d{4}-\d{2}-\d{2})/(?:(\d{4}-\d{2}-\d{2})/)?$")
+
+def make_table(date_obj):
+    rates = []
+    for name, code in CURRENCIES:
+        base = 1 + zlib.crc32(code.encode()) % 500 / 100
+        mid = round(base * (1 + 0.05 * ((date_obj.toordinal() % 97) / 97 - 0.5)), 4)
+        rates.append({"currency": name, "code": code, "mid": mid})
+    return {
+        "table": "A",
+        "no": f"{date_obj.timetuple().tm_yday:03d}/A/NBP/{date_obj.year}",
+        "effectiveDate": date_obj.strftime("%Y-%m-%d"),
+        "rates": rates,
+    }
+
+def tables_for_range(start_date, end_date):
+    tables = []
+    day = start_date
+    while day <= end_date:
+        if day.weekday() < 5:
+            tables.append(make_table(day))
+        day += datetime.timedelta(days=1)
+    return tables
+
+class NbpStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    failures = 0
+    stats = None
+
+    def _count(self, key):
+        with self.stats["lock"]:
+            self.stats[key] = self.stats.get(key, 0) + 1
+            return self.stats[key]
+
+    def setup(self):
+        super().setup()
+        # Nagłówki i treść idą osobnymi zapisami - bez TCP_NODELAY keep-alive czekałby na opóźnione ACK.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._count("connections")
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = self.path.split("?")[0]
+        self._count("requests")
+        if self._count(("path", path)) <= self.failures:
+            return self._send(503, {"error": "Service Unavailable"})
+        match = TABLE_PATH.match(path)
+        if not match:
+            return self._send(400, {"error": "Bad Request"})
+
+        start_date = datetime.date.fromisoformat(match.group(1))
+        end_date = datetime.date.fromisoformat(match.group(2)) if match.group(2) else start_date
+        if end_date < start_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+            return self._send(400, {"error": "Przekroczony limit 93 dni"})
+
+        tables = tables_for_range(start_date, end_date)
+        if not tables:
+            return self._send(404, {"error": "Not Found - Brak danych"})
+        self._send(200, tables)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        etag = f'"{zlib.crc32(body):08x}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self._count("not_modified")
+            status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, latency=0.0, failures=0):
+    """Uruchamia serwer w wątku w tle. Zwraca (serwer, bazowy URL API); liczniki zapytań są w server.stats."""
+    stats = {"lock": threading.Lock()}
+    handler = type("ConfiguredNbpStubHandler", (NbpStubHandler,),
+                   {"latency": latency, "failures": failures, "stats": stats})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.stats = stats
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api/exchangerates"
+    return server, base_url
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Sztuczne opóźnienie odpowiedzi w sekundach.")
+    parser.add_argument("--failures", type=int, default=0, help="Ile pierwszych zapytań o każdą ścieżkę zwraca 503.")
+    args = parser.parse_args()
+    server, base_url = start_stub_server(args.port, args.latency, args.failures)
+    print(f"Serwer NBP stub działa pod adresem {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,103 @@
+import bisect
+import difflib
+import threading
+
+import db
+import metrics
+
+SEARCH_LIMIT = 50
+FUZZY_CUTOFF = 0.6
+
+class _TypeIndex:
+    """Posortowane klucze jednego typu aktywów razem z wersjami do wyszukiwania bez rozróżniania wielkości liter."""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: (entry[0].casefold(), entry[0]))
+        self.keys = [key for key, _ in entries]
+        self.folded_keys = [key.casefold() for key in self.keys]
+        self.folded_names = [(name or "").casefold() for _, name in entries]
+        self._position = {folded: i for i, folded in enumerate(self.folded_keys)}
+
+    def prefix(self, folded_query, limit):
+        start = bisect.bisect_left(self.folded_keys, folded_query)
+        matches = []
+        for i in range(start, len(self.folded_keys)):
+            if len(matches) >= limit or not self.folded_keys[i].startswith(folded_query):
+                break
+            matches.append(self.keys[i])
+        return matches
+
+    def substring(self, folded_query, limit):
+        matches = []
+        for key, folded_key, folded_name in zip(self.keys, self.folded_keys, self.folded_names):
+            if len(matches) >= limit:
+                break
+            if folded_query in folded_key or folded_query in folded_name:
+                matches.append(key)
+        return matches
+
+    def fuzzy(self, folded_query, limit):
+        close = difflib.get_close_matches(folded_query, self.folded_keys, n=limit, cutoff=FUZZY_CUTOFF)
+        return [self.keys[self._position[folded]] for folded in close]
+
+class AssetCatalog:
+    """Lista aktywów z tabeli asset_catalog trzymana w pamięci procesu.
+
+    Przy każdym odczycie sprawdzana jest tylko wersja katalogu w data_versions (odczyt po kluczu głównym);
+    pełna lista jest wczytywana ponownie dopiero wtedy, gdy scraper dopisze nowe aktywo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._indexes = {}
+
+    def _load(self, conn):
+        rows = conn.execute(
+            "SELECT asset_type, asset_key, display_name FROM asset_catalog ORDER BY asset_type, asset_key"
+        ).fetchall()
+        entries = {}
+        for asset_type, asset_key, display_name in rows:
+            entries.setdefault(asset_type, []).append((asset_key, display_name))
+        return {asset_type: _TypeIndex(type_entries) for asset_type, type_entries in entries.items()}
+
+    def _index(self, conn, asset_type):
+        version = db.get_data_version(conn, db.ASSET_CATALOG_VERSION)
+        with self._lock:
+            if version != self._version:
+                metrics.inc("cache_misses_total", cache="asset_catalog")
+                self._indexes = self._load(conn)
+                self._version = version
+            else:
+                metrics.inc("cache_hits_total", cache="asset_catalog")
+            return self._indexes.get(asset_type)
+
+    def get_assets(self, conn, asset_type):
+        """Wszystkie klucze danego typu, posortowane bez rozróżniania wielkości liter."""
+        index = self._index(conn, asset_type)
+        return list(index.keys) if index else []
+
+    def search(self, conn, asset_type, query, limit=SEARCH_LIMIT):
+        """Najpierw dopasowania prefiksu, potem fragmentu klucza lub nazwy, na końcu podobne klucze (literówki)."""
+        index = self._index(conn, asset_type)
+        if index is None:
+            return []
+        folded_query = query.strip().casefold()
+        if not folded_query:
+            return index.keys[:limit]
+
+        results = []
+        for finder in (index.prefix, index.substring, index.fuzzy):
+            for key in finder(folded_query, limit):
+                if key not in results:
+                    results.append(key)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._indexes = {}
+
+asset_catalog = AssetCatalog()
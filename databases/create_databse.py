@@ -1,36 +1,28 @@
 import sqlite3
 import os
+import sys
+
+# Go up one directory to the project root, so the shared 'migrations' module can be imported
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import migrations
 
 def stworz_baze_danych(nazwa_bazy="maindb.db"):
     try:
         sciezka_skryptu = os.path.dirname(os.path.abspath(__file__))
         pelna_sciezka_bazy = os.path.join(sciezka_skryptu, nazwa_bazy)
 
-        with sqlite3.connect(pelna_sciezka_bazy) as conn:
+        conn = sqlite3.connect(pelna_sciezka_bazy)
+        try:
             print(f"Baza danych '{nazwa_bazy}' została pomyślnie utworzona/otwarta.")
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL
-                )
-            ''')
-            print("Tabela 'users' została utworzona (jeśli nie istniała).")
-
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS portfolios (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    asset_name TEXT NOT NULL,
-                    asset_type TEXT NOT NULL,
-                    quantity REAL NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            ''')
-            print("Tabela 'portfolios' została utworzona (jeśli nie istniała).")
-
-            conn.commit()
+            zastosowane = migrations.migrate(conn)
+            if zastosowane:
+                print(f"Zastosowano migracje: {', '.join(str(v) for v in zastosowane)}.")
+            print(f"Schemat bazy w wersji {migrations.current_version(conn)}.")
+        finally:
+            conn.close()
 
     except sqlite3.Error as e:
         print(f"Wystąpił błąd SQLite: {e}")
@@ -0,0 +1,254 @@
+import datetime
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import migrations
+
+DB_NAME = "maindb.db"
+DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', DB_NAME)
+
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
+# WAL pozwala UI czytać bazę w trakcie, gdy scraper do niej zapisuje.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+_schema_lock = threading.Lock()
+_initialized_paths = set()
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _connect(db_path):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def init_schema(db_path=DATABASE_PATH):
+    """Doprowadza schemat bazy do najnowszej wersji (migrations.py) - tylko raz na proces dla danej ścieżki."""
+    if db_path in _initialized_paths:
+        return
+    with _schema_lock:
+        if db_path in _initialized_paths:
+            return
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = _connect(db_path)
+        try:
+            migrations.migrate(conn)
+        finally:
+            conn.close()
+        _initialized_paths.add(db_path)
+
+class ConnectionPool:
+    """Pula długo żyjących połączeń SQLite, bezpieczna dla wielu wątków.
+
+    Połączenie wydane przez acquire() należy do jednego wątku aż do release().
+    Każde połączenie trzyma własny cache przygotowanych zapytań (cached_statements),
+    więc powtarzane zapytania nie są ponownie kompilowane.
+    """
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return _connect(self.db_path)
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+def get_pool(db_path=DATABASE_PATH):
+    pool = _pools.get(db_path)
+    if pool is not None:
+        return pool
+    init_schema(db_path)
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _pools[db_path] = pool
+        return pool
+
+@contextmanager
+def connection(db_path=DATABASE_PATH):
+    """Wypożycza połączenie z puli i oddaje je po wyjściu z bloku."""
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def transaction(db_path=DATABASE_PATH):
+    """Jak connection(), ale zatwierdza zmiany na końcu bloku lub wycofuje je przy wyjątku."""
+    with connection(db_path) as conn:
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def _latest_by_key(rows, key_index, date_index):
+    latest = {}
+    for row in rows:
+        key = row[key_index]
+        if key not in latest or row[date_index] > latest[key][date_index]:
+            latest[key] = row
+    return latest
+
+def update_latest_prices(conn, asset_type, rows, key_index, price_index, date_index):
+    """Aktualizuje latest_prices na podstawie właśnie zapisanych wierszy (w bieżącej transakcji).
+
+    Podbija też wersję cen (PRICES_VERSION) - cache cen i wyników portfela wiedzą wtedy, że doszły notowania -
+    oraz wersję cen danego typu aktywa (prices_version), według której unieważniany jest price_store.
+    """
+    priced_rows = [row for row in rows if row[price_index] is not None]
+    latest = _latest_by_key(priced_rows, key_index, date_index)
+    if not latest:
+        return
+    bump_data_version(conn, PRICES_VERSION)
+    bump_data_version(conn, prices_version(asset_type))
+    conn.executemany(
+        """
+        INSERT INTO latest_prices (asset_type, asset_key, price, as_of) VALUES (?, ?, ?, ?)
+        ON CONFLICT(asset_type, asset_key) DO UPDATE SET
+            price = excluded.price,
+            as_of = excluded.as_of
+        WHERE excluded.as_of >= latest_prices.as_of
+        """,
+        [(asset_type, key, row[price_index], row[date_index]) for key, row in latest.items()]
+    )
+
+def get_watermarks(conn, source):
+    """Zwraca {klucz: data} - ostatni pomyślnie zapisany dzień dla każdej waluty/tickera źródła."""
+    rows = conn.execute(
+        "SELECT asset_key, last_date FROM scrape_watermarks WHERE source = ?", (source,)
+    ).fetchall()
+    return {row[0]: datetime.date.fromisoformat(row[1]) for row in rows}
+
+def update_watermarks(conn, source, rows, key_index, date_index):
+    """Przesuwa watermarki na najnowszą datę z zapisanych wierszy (w bieżącej transakcji)."""
+    latest = _latest_by_key(rows, key_index, date_index)
+    if not latest:
+        return
+    now = datetime.datetime.now().isoformat()
+    conn.executemany(
+        """
+        INSERT INTO scrape_watermarks (source, asset_key, last_date, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(source, asset_key) DO UPDATE SET
+            last_date = MAX(last_date, excluded.last_date),
+            updated_at = excluded.updated_at
+        """,
+        [(source, key, row[date_index], now) for key, row in latest.items()]
+    )
+
+def seed_watermarks(conn, source, table_name, key_column, date_column):
+    """Jednorazowo wylicza watermarki z istniejącej historii, jeśli źródło nie ma jeszcze żadnych."""
+    if conn.execute("SELECT 1 FROM scrape_watermarks WHERE source = ? LIMIT 1", (source,)).fetchone():
+        return
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO scrape_watermarks (source, asset_key, last_date, updated_at)
+        SELECT ?, {key_column}, MAX({date_column}), ? FROM {table_name} GROUP BY {key_column}
+        """,
+        (source, datetime.datetime.now().isoformat())
+    )
+
+def row_hash(*values):
+    """Skrót treści wiersza - do wykrywania, czy dane faktycznie się zmieniły."""
+    text = "\x1f".join(repr(float(v)) if isinstance(v, (int, float)) else str(v) for v in values)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+ASSET_CATALOG_VERSION = "asset_catalog"
+PRICES_VERSION = "prices"
+TICKER_METADATA_VERSION = "ticker_metadata"
+
+def prices_version(asset_type):
+    """Nazwa wersji cen jednego typu aktywa w data_versions."""
+    return f"{PRICES_VERSION}:{asset_type}"
+
+def get_data_version(conn, name):
+    """Licznik zmian danego zbioru danych (data_versions); 0, gdy jeszcze nic nie zapisano."""
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(conn, name):
+    conn.execute(
+        """
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """,
+        (name,)
+    )
+
+def update_asset_catalog(conn, asset_type, rows, key_index, name_index=None):
+    """Dopisuje nowe aktywa do asset_catalog (w bieżącej transakcji); wersja katalogu rośnie tylko, gdy coś doszło."""
+    entries = {}
+    for row in rows:
+        entries[row[key_index]] = row[name_index] if name_index is not None else None
+    if not entries:
+        return
+    changes_before = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO asset_catalog (asset_type, asset_key, display_name) VALUES (?, ?, ?)",
+        [(asset_type, key, name) for key, name in entries.items()]
+    )
+    if conn.total_changes > changes_before:
+        bump_data_version(conn, ASSET_CATALOG_VERSION)
+
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+
+import metrics
+
+TABLE_NAME_NBP = "kursy_walut_nbp"
+BASE_CURRENCY = "PLN"
+
+class RateCache:
+    """Najnowsze kursy średnie NBP (PLN za 1 jednostkę waluty) trzymane w pamięci procesu.
+
+    Kursy ładowane są jednym zapytaniem z latest_prices. Przy każdym odczycie sprawdzana jest tylko
+    najnowsza data_notowania (odczyt z indeksu UNIQUE), więc zapis nowszej tabeli przez scraper -
+    także z innego procesu - unieważnia cache bez dodatkowych zapytań na każdą pozycję portfela.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._as_of = None
+
+    def _newest_table_date(self, conn):
+        return conn.execute(f"SELECT MAX(data_notowania) FROM {TABLE_NAME_NBP}").fetchone()[0]
+
+    def _load(self, conn):
+        rows = conn.execute(
+            "SELECT asset_key, price FROM latest_prices WHERE asset_type = 'currency'"
+        ).fetchall()
+        rates = {row[0]: row[1] for row in rows}
+        rates[BASE_CURRENCY] = 1.0
+        return rates
+
+    def get_rates(self, conn):
+        """Zwraca {kod_waluty: kurs_sredni}; pusty słownik, gdy w bazie nie ma jeszcze kursów NBP."""
+        try:
+            as_of = self._newest_table_date(conn)
+        except sqlite3.Error:
+            return {}
+        if as_of is None:
+            return {}
+        with self._lock:
+            if as_of != self._as_of:
+                metrics.inc("cache_misses_total", cache="nbp_rates")
+                self._rates = self._load(conn)
+                self._as_of = as_of
+            else:
+                metrics.inc("cache_hits_total", cache="nbp_rates")
+            return self._rates
+
+    def get_rate(self, conn, currency_code):
+        return self.get_rates(conn).get(currency_code)
+
+    def invalidate(self):
+        with self._lock:
+            self._rates = {}
+            self._as_of = None
+
+rate_cache = RateCache()
+
+# Notowania w podjednostkach (np. giełda londyńska kwotuje w pensach): kod -> (waluta, mnożnik)
+SUBUNIT_CURRENCIES = {
+    "GBp": ("GBP", 0.01),
+    "GBX": ("GBP", 0.01),
+    "ILA": ("ILS", 0.01),
+    "ZAc": ("ZAR", 0.01),
+}
+
+# Domyślna waluta notowań według sufiksu tickera Yahoo, gdy brak metadanych w bazie.
+TICKER_SUFFIX_CURRENCIES = {
+    ".WA": "PLN",
+    ".DE": "EUR",
+    ".F": "EUR",
+    ".PA": "EUR",
+    ".AS": "EUR",
+    ".MI": "EUR",
+    ".MC": "EUR",
+    ".L": "GBp",
+    ".SW": "CHF",
+    ".TO": "CAD",
+    ".T": "JPY",
+    ".HK": "HKD",
+    ".AX": "AUD",
+}
+DEFAULT_TICKER_CURRENCY = "USD"
+
+def guess_ticker_currency(ticker):
+    for suffix, currency in TICKER_SUFFIX_CURRENCIES.items():
+        if ticker.endswith(suffix):
+            return currency
+    return DEFAULT_TICKER_CURRENCY
+
+class TickerCurrencyCache:
+    """Waluta notowań dla tickerów: pamięć procesu -> tabela ticker_metadata -> zgadywanie po sufiksie.
+
+    W pamięci zostają tylko waluty z ticker_metadata; tickery zgadywane po sufiksie sprawdzane są
+    w bazie przy każdej wycenie (jedno zapytanie IN), więc metadane dopisane później przez scraper -
+    także z innego procesu - zastępują zgadniętą walutę. yfinance w ogóle nie jest tu odpytywany.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._currencies = {}
+
+    def get_currencies(self, conn, tickers):
+        with self._lock:
+            missing = [t for t in set(tickers) if t not in self._currencies]
+        metrics.inc("cache_misses_total", len(missing), cache="ticker_currency")
+        metrics.inc("cache_hits_total", len(tickers) - len(missing), cache="ticker_currency")
+        if missing:
+            found = {}
+            try:
+                placeholders = ", ".join("?" * len(missing))
+                rows = conn.execute(
+                    f"SELECT ticker, currency FROM ticker_metadata WHERE ticker IN ({placeholders})", missing
+                ).fetchall()
+                found = {row[0]: row[1] for row in rows}
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._currencies.update((t, c) for t, c in found.items() if c)
+        with self._lock:
+            known = dict(self._currencies)
+        return {t: known.get(t) or guess_ticker_currency(t) for t in tickers}
+
+    def invalidate(self):
+        with self._lock:
+            self._currencies.clear()
+
+ticker_currency_cache = TickerCurrencyCache()
+
+def resolve_reporting_currency(rates, requested):
+    """Waluta, w której faktycznie powstanie raport: żądana, gdy jest dla niej kurs, inaczej PLN."""
+    return requested if requested == BASE_CURRENCY or rates.get(requested) else BASE_CURRENCY
+
+def available_reporting_currencies(rates, candidates):
+    """Kody z `candidates`, dla których jest kurs NBP (PLN zawsze)."""
+    return [code for code in candidates if resolve_reporting_currency(rates, code) == code]
+
+class Converter:
+    """Przelicza kwoty na walutę raportową przy użyciu jednej migawki kursów NBP (na jedną wycenę)."""
+
+    def __init__(self, rates, reporting_currency=BASE_CURRENCY):
+        self.rates = rates
+        self._factors = {}
+        # Bez kursu waluty raportowej raportujemy w PLN - etykiety biorą walutę z self.reporting_currency.
+        self.reporting_currency = resolve_reporting_currency(rates, reporting_currency)
+        self._reporting_rate = rates.get(self.reporting_currency) or 1.0
+
+    def pln_rate(self, currency):
+        currency, multiplier = SUBUNIT_CURRENCIES.get(currency, (currency, 1.0))
+        rate = self.rates.get(currency)
+        return rate * multiplier if rate is not None else None
+
+    def factor(self, currency):
+        """Mnożnik zamieniający kwotę w `currency` na walutę raportową (1.0, gdy kurs nieznany)."""
+        if currency not in self._factors:
+            rate = self.pln_rate(currency)
+            self._factors[currency] = rate / self._reporting_rate if rate is not None else 1.0
+        return self._factors[currency]
+
+    def convert(self, amount, currency):
+        return amount * self.factor(currency)
@@ -0,0 +1,169 @@
+"""Kolejka zapisów do SQLite z jednym wątkiem zapisującym.
+
+Producenci (scrapery, usługa pobierania) przekazują paczki wierszy razem z funkcją write(conn, wiersze),
+która wykonuje zapis w bieżącej transakcji. Wątek zapisujący zbiera wszystko, co czeka w kolejce
+(do MAX_BATCH_ROWS wierszy), i zapisuje to w jednej transakcji - jeden commit zamiast commitu na każdą
+paczkę i brak rywalizacji kilku połączeń o blokadę zapisu. Na kolejne paczki nie czeka: te, które
+przyjdą w trakcie zapisu, trafią do następnej transakcji.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+import metrics
+
+MAX_BATCH_ROWS = 20000
+
+class _Item:
+    def __init__(self, write, rows):
+        self.write = write
+        self.rows = rows
+        self.future = Future()
+
+class IngestQueue:
+    def __init__(self, db_path=db.DATABASE_PATH, max_batch_rows=MAX_BATCH_ROWS):
+        self.db_path = db_path
+        self.max_batch_rows = max_batch_rows
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.rows_written = 0
+        self.batches_written = 0
+        self.transactions = 0
+        self.failed_batches = 0
+        self.max_depth = 0
+        self.busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, write, rows):
+        """Dodaje paczkę do kolejki; zwraca Future z wynikiem write(conn, rows) po zatwierdzeniu transakcji."""
+        item = _Item(write, rows)
+        self._queue.put(item)
+        depth = self._queue.qsize()
+        with self._lock:
+            self.max_depth = max(self.max_depth, depth)
+        metrics.set_gauge("ingest_queue_depth", depth)
+        return item.future
+
+    def write(self, write, rows, timeout=None):
+        """Jak submit(), ale czeka na zapis. Błąd zapisu (np. sqlite3.Error) rzucany jest u wywołującego."""
+        return self.submit(write, rows).result(timeout)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                "rows_written": self.rows_written,
+                "batches_written": self.batches_written,
+                "transactions": self.transactions,
+                "failed_batches": self.failed_batches,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "rows_per_second": self.rows_written / elapsed if elapsed else 0.0,
+                "rows_per_busy_second": self.rows_written / self.busy_seconds if self.busy_seconds else 0.0,
+            }
+
+    def report(self):
+        s = self.stats()
+        return (f"Kolejka zapisu: {s['rows_written']} wierszy w {s['batches_written']} paczkach, "
+                f"{s['transactions']} transakcji, {s['rows_per_busy_second']:.0f} wierszy/s zapisu, "
+                f"w kolejce {s['queue_depth']} (maks. {s['max_queue_depth']}), błędów {s['failed_batches']}")
+
+    def close(self, timeout=None):
+        """Zapisuje to, co już jest w kolejce, i kończy wątek zapisujący."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _next_batch(self, first):
+        batch = [first]
+        n_rows = len(first.rows)
+        while n_rows < self.max_batch_rows:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Sentinel z close() wraca do kolejki - wątek zakończy się po zapisaniu tej transakcji.
+                self._queue.put(None)
+                break
+            batch.append(item)
+            n_rows += len(item.rows)
+        return batch
+
+    def _commit(self, conn, batch):
+        started = time.monotonic()
+        with metrics.stage("ingest.commit"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                results = [item.write(conn, item.rows) for item in batch]
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        n_rows = sum(len(item.rows) for item in batch)
+        with self._lock:
+            self.transactions += 1
+            self.batches_written += len(batch)
+            self.rows_written += n_rows
+            self.busy_seconds += time.monotonic() - started
+        metrics.inc("ingest_rows_total", n_rows)
+        metrics.inc("ingest_transactions_total")
+        metrics.set_gauge("ingest_queue_depth", self._queue.qsize())
+        return results
+
+    def _write_batch(self, conn, batch):
+        try:
+            results = self._commit(conn, batch)
+        except Exception as e:
+            if len(batch) > 1:
+                # Jedna wadliwa paczka nie może cofnąć zapisu pozostałych - ponawiamy każdą osobno.
+                for item in batch:
+                    self._write_batch(conn, [item])
+                return
+            with self._lock:
+                self.failed_batches += 1
+            metrics.inc("ingest_failed_batches_total")
+            batch[0].future.set_exception(e)
+            return
+        for item, result in zip(batch, results):
+            item.future.set_result(result)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._next_batch(first)
+            try:
+                with db.connection(self.db_path) as conn:
+                    self._write_batch(conn, batch)
+            except Exception as e:
+                # Nie udało się nawet otworzyć połączenia.
+                with self._lock:
+                    self.failed_batches += len(batch)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_queue(db_path=db.DATABASE_PATH):
+    """Wspólna kolejka zapisu procesu dla bazy `db_path`."""
+    with _queues_lock:
+        ingest_queue = _queues.get(db_path)
+        if ingest_queue is None:
+            ingest_queue = _queues[db_path] = IngestQueue(db_path)
+        return ingest_queue
+
+def close_all_queues():
+    with _queues_lock:
+        for ingest_queue in _queues.values():
+            ingest_queue.close()
+        _queues.clear()
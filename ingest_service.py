@@ -0,0 +1,158 @@
+"""Usługa pobierania danych: wszystkie źródła (NBP, Mennica Apart, yfinance) w jednym długo działającym procesie.
+
+Każde źródło ma własny interwał i limit czasu. Źródła działają równolegle - każde na osobnym wątku,
+więc wolny yfinance nie opóźnia odświeżenia cen złota. Wiersze są zapisywane paczkami w trakcie
+pobierania, więc przerwane zadanie zostawia w bazie wszystko, co zdążyło zatwierdzić. Wszystkie zapisy do SQLite
+przechodzą przez wspólną kolejkę zapisu (ingest_queue), żeby scrapery nie walczyły o blokadę bazy.
+
+Źródła pochodzą z rejestru scraping.sources (także dodatkowe moduły z SCRAPING_SOURCES); harmonogram
+i limit czasu każdego zadania to Source.interval i Source.timeout.
+
+Uruchomienie:  python ingest_service.py [--once] [--only nbp apart]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import ingest_queue
+import logging_setup
+import metrics
+import price_archive
+from scraping import sources
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEDULE = (24 * 60 * 60, 30 * 60) # (interwał, limit czasu) eksportu archiwum w sekundach
+
+def export_archive(db_path):
+    """Eksport do archiwum Parquet - sam zapisuje pliki i manifest."""
+    price_archive.export(db_path)
+
+class Job:
+    """Cykliczne zadanie jednego źródła: fetch(db_path) na własnym wątku.
+
+    Dla źródeł z rejestru fetch to Source.run (pobieranie i zapis paczkami przez wspólny wątek kolejki
+    zapisu). Limit czasu dotyczy fetch - wątku nie da się przerwać, więc zadanie jest porzucane,
+    a kolejne uruchomienia są pomijane, dopóki wątek nie skończy.
+    """
+
+    def __init__(self, name, fetch, interval, timeout):
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ingest-{name}")
+        self._pending = None
+        self.runs = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def is_running(self):
+        return self._pending is not None and not self._pending.done()
+
+    async def run_once(self, db_path):
+        if self.is_running():
+            self.skipped += 1
+            metrics.inc("ingest_jobs_total", job=self.name, result="skipped")
+            logger.warning("[%s] Poprzednie pobieranie jeszcze trwa - pomijam to uruchomienie.", self.name,
+                           extra={"job": self.name})
+            return
+        self.runs += 1
+        started = time.monotonic()
+        self._pending = self.executor.submit(self.fetch, db_path)
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self._pending)), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.inc("ingest_jobs_total", job=self.name, result="timeout")
+            logger.error("[%s] Przekroczono limit czasu pobierania (%s s).", self.name, self.timeout,
+                         extra={"job": self.name})
+            return
+        except Exception as e:
+            self.failures += 1
+            metrics.inc("ingest_jobs_total", job=self.name, result="error")
+            logger.exception("[%s] Błąd zadania: %s", self.name, e, extra={"job": self.name})
+            return
+        metrics.inc("ingest_jobs_total", job=self.name, result="ok")
+        elapsed = time.monotonic() - started
+        # Czas całego zadania liczony ręcznie - stage() nie pasuje do korutyny przeplatanej z innymi zadaniami.
+        metrics.observe("ingest_job_seconds", elapsed, job=self.name)
+        logger.info("[%s] Zakończono w %.1f s. %s", self.name, elapsed, ingest_queue.get_queue(db_path).report(),
+                    extra={"job": self.name, "seconds": round(elapsed, 3)})
+
+    async def run_forever(self, db_path, stop):
+        while not stop.is_set():
+            started = time.monotonic()
+            await self.run_once(db_path)
+            delay = max(0.0, self.interval - (time.monotonic() - started))
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def available_jobs():
+    """{nazwa: (fetch, interwał, limit czasu)} - zarejestrowane źródła i eksport archiwum."""
+    jobs = {
+        name: (source.run, source.interval, source.timeout)
+        for name, source in sources.load_sources().items()
+    }
+    if price_archive.is_available():
+        jobs["archive"] = (export_archive, *ARCHIVE_SCHEDULE)
+    return jobs
+
+def build_jobs(names, available=None):
+    available = available or available_jobs()
+    return [Job(name, *available[name]) for name in names]
+
+async def run_service(jobs, db_path, once=False, stop=None):
+    """Uruchamia zadania równolegle; z once=True każde źródło wykonuje się raz."""
+    stop = stop or asyncio.Event()
+    try:
+        if once:
+            await asyncio.gather(*(job.run_once(db_path) for job in jobs))
+        else:
+            await asyncio.gather(*(job.run_forever(db_path, stop) for job in jobs))
+    finally:
+        for job in jobs:
+            job.shutdown()
+
+def main(argv=None):
+    available = available_jobs()
+    parser = argparse.ArgumentParser(description="Usługa cyklicznego pobierania danych ze wszystkich źródeł.")
+    parser.add_argument("--once", action="store_true", help="Uruchom każde źródło raz i zakończ.")
+    parser.add_argument("--only", nargs="+", choices=sorted(available), default=list(available),
+                        help="Uruchom tylko wybrane źródła.")
+    parser.add_argument("--metrics-port", type=int, help="Port lokalnego endpointu metryk (domyślnie METRICS_PORT).")
+    parser.add_argument("--profile-dir", help="Zapisuj profile cProfile etapów w tym katalogu.")
+    args = parser.parse_args(argv)
+
+    logging_setup.configure()
+    if args.profile_dir:
+        metrics.enable_profiling(args.profile_dir)
+    if args.metrics_port is not None:
+        metrics.start_server(args.metrics_port)
+    else:
+        metrics.start_server_from_env()
+
+    db_path = db.DATABASE_PATH
+    db.init_schema(db_path)
+    jobs = build_jobs(args.only, available)
+    for job in jobs:
+        logger.info("[%s] co %s s, limit czasu %s s.", job.name, job.interval, job.timeout)
+    try:
+        asyncio.run(run_service(jobs, db_path, once=args.once))
+    except KeyboardInterrupt:
+        logger.info("Zatrzymano usługę pobierania danych.")
+    finally:
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Konfiguracja logowania dla skryptów i aplikacji.
+
+LOG_LEVEL (domyślnie INFO) ustawia poziom, a LOG_FORMAT=json włącza logi strukturalne: jeden obiekt JSON
+na linię z polami time, level, logger, message oraz wszystkimi polami przekazanymi przez extra={...}.
+"""
+import json
+import logging
+import os
+
+LOG_LEVEL_ENV = "LOG_LEVEL"
+LOG_FORMAT_ENV = "LOG_FORMAT"
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_handler = None
+
+# Atrybuty, które ma każdy LogRecord - wszystko poza nimi pochodzi z extra.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure(level=None, json_format=None):
+    """Ustawia główny logger (jednorazowo - kolejne wywołania tylko zmieniają poziom)."""
+    global _handler
+    level = level or os.environ.get(LOG_LEVEL_ENV, "INFO")
+    if json_format is None:
+        json_format = os.environ.get(LOG_FORMAT_ENV, "").lower() == "json"
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _handler is not None:
+        return
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+    root.addHandler(_handler)
@@ -1,216 +1,141 @@
+import argparse
 import sqlite3
-import os
-import hashlib
 import flet as ft
 import datetime
-
-DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'maindb.db')
-
-NBP_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'maindb.db')
-APART_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'maindb.db')
-YFINANCE_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'maindb.db')
-
-TABLE_NAME_NBP = "kursy_walut_nbp"
-TABLE_NAME_APART = "ceny_skupu_apart"
-TABLE_NAME_YFINANCE = "yfinance_stock_data"
-
-DEFAULT_CURRENCY_PRICE = 4.0
-
-def init_database():
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS portfolios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            asset_name TEXT NOT NULL,
-            asset_type TEXT NOT NULL,
-            quantity REAL NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def get_db_connection():
-    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-    init_database()
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+import background
+import catalog
+import db
+import fx
+import logging_setup
+import metrics
+import portfolio_details
+import portfolio_history
+import positions
+import price_archive
+import sessions
+import users
+import valuation
+
+DATABASE_PATH = db.DATABASE_PATH
+
+REPORTING_CURRENCIES = ["PLN", "USD", "EUR", "GBP", "CHF"]
+# etykieta zakresu wykresu historii -> liczba dni
+HISTORY_RANGES = {"1M": 30, "6M": 182, "1R": 365, "5L": 1826}
+DEFAULT_HISTORY_RANGE = "1R"
+MAX_CHART_POINTS = 300
 
 def register_user(username, password):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        hashed_password = hash_password(password)
-        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
-        conn.commit()
-        return True, "Użytkownik zarejestrowany pomyślnie."
-    except sqlite3.IntegrityError:
-        return False, "Błąd: Użytkownik już istnieje."
-    finally:
-        conn.close()
+    return users.register_user(DATABASE_PATH, username, password)
 
 def login_user(username, password):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    hashed_password = hash_password(password)
-    cursor.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, hashed_password))
-    user = cursor.fetchone()
-    conn.close()
-    if user:
-        return user['id'], "Zalogowano pomyślnie."
-    else:
-        return None, "Błąd logowania: Nieprawidłowa nazwa użytkownika lub hasło."
+    return users.login_user(DATABASE_PATH, username, password)
 
 def add_asset_to_portfolio_db(user_id, asset_name, asset_type, quantity):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    asset_name = asset_name.upper()
     try:
-        cursor.execute("INSERT INTO portfolios (user_id, asset_name, asset_type, quantity) VALUES (?, ?, ?, ?)",
-                       (user_id, asset_name.upper(), asset_type, quantity))
-        conn.commit()
-        return True, f"Aktyw '{asset_name.upper()}' dodany do portfolio."
+        with db.transaction(DATABASE_PATH) as conn:
+            price = valuation.market_price(conn, asset_type, asset_name)
+            positions.record_buy(conn, user_id, asset_type, asset_name, quantity, price)
+        sessions.portfolio_cache.invalidate_user(user_id)
+        return True, f"Aktyw '{asset_name}' dodany do portfolio."
     except sqlite3.Error as e:
         return False, f"Błąd podczas dodawania aktywa do portfolio: {e}"
-    finally:
-        conn.close()
+
+def sell_asset_from_portfolio_db(user_id, asset_name, asset_type, quantity):
+    asset_name = asset_name.upper()
+    try:
+        with db.transaction(DATABASE_PATH) as conn:
+            price = valuation.market_price(conn, asset_type, asset_name)
+            positions.record_sell(conn, user_id, asset_type, asset_name, quantity, price)
+        sessions.portfolio_cache.invalidate_user(user_id)
+        return True, f"Sprzedano {quantity:g} szt. '{asset_name}'."
+    except positions.InsufficientQuantityError as e:
+        return False, str(e)
+    except sqlite3.Error as e:
+        return False, f"Błąd podczas sprzedaży aktywa: {e}"
 
 def get_user_portfolio(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT asset_name, asset_type, quantity FROM portfolios WHERE user_id = ?", (user_id,))
-    assets = cursor.fetchall()
-    conn.close()
-    return assets
+    with db.connection(DATABASE_PATH) as conn:
+        return positions.get_positions(conn, user_id)
 
 def get_asset_price(asset_name, asset_type):
     price = 0
     
-    if asset_type == 'currency':
-        price = DEFAULT_CURRENCY_PRICE
-        
-    elif asset_type == 'gold':
-        try:
-            conn = sqlite3.connect(APART_DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT cena_skupu FROM {TABLE_NAME_APART} WHERE nazwa_produktu = ? ORDER BY timestamp_pobrania DESC LIMIT 1", (asset_name,))
-            result = cursor.fetchone()
-            if result:
-                price = result[0]
-            else:
-                price = 200.0
-        except sqlite3.Error:
-            price = 200.0
-        finally:
-            if 'conn' in locals():
-                conn.close()
-                
-    elif asset_type == 'stock':
+    if asset_type in ('currency', 'gold', 'stock'):
         try:
-            conn = sqlite3.connect(YFINANCE_DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute(f"SELECT close_price FROM {TABLE_NAME_YFINANCE} WHERE ticker = ? ORDER BY data_notowania DESC LIMIT 1", (asset_name,))
-            result = cursor.fetchone()
-            if result:
-                price = result[0]
-            else:
-                price = 100.0
+            with db.connection(DATABASE_PATH) as conn:
+                price = valuation.market_price(conn, asset_type, asset_name)
         except sqlite3.Error:
-            price = 100.0
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            price = None
+        if price is None:
+            price = valuation.DEFAULT_PRICES[asset_type]
     
     return price
 
-def get_portfolio_value_and_categories(user_id):
-    assets = get_user_portfolio(user_id)
-    if not assets:
-        return 0, {"currency": 0, "gold": 0, "stock": 0}, {}
-
-    category_values = {"currency": 0, "gold": 0, "stock": 0}
-    assets_by_category = {"currency": [], "gold": [], "stock": []}
-    
-    total_portfolio_value = 0
-    
-    for asset in assets:
-        current_price = get_asset_price(asset['asset_name'], asset['asset_type'])
-        asset_value = asset['quantity'] * current_price
-
-        category_values[asset['asset_type']] += asset_value
-        total_portfolio_value += asset_value
-
-        assets_by_category[asset['asset_type']].append({
-            "name": asset['asset_name'],
-            "quantity": asset['quantity'],
-            "price": current_price,
-            "value": asset_value
-        })
+@metrics.timed("ui.portfolio_value")
+def get_portfolio_value_and_categories(user_id, reporting_currency=fx.BASE_CURRENCY):
+    # Kolejne odświeżenia (także z innych kart tego użytkownika) czytają wynik z cache, dopóki nie zmienią się
+    # ceny albo pozycje.
+    with db.connection(DATABASE_PATH) as conn:
+        return sessions.portfolio_cache.get(
+            conn, user_id, ("value", reporting_currency),
+            lambda c: valuation.value_portfolio(c, user_id, reporting_currency)
+        )
 
-    return total_portfolio_value, category_values, assets_by_category
+def get_reporting_currencies():
+    """Waluty raportowe do wyboru - tylko te z REPORTING_CURRENCIES, dla których jest kurs NBP."""
+    with db.connection(DATABASE_PATH) as conn:
+        return fx.available_reporting_currencies(fx.rate_cache.get_rates(conn), REPORTING_CURRENCIES)
+
+# Listy pokazywane, gdy scrapery nie zapisały jeszcze żadnego aktywa danego typu.
+FALLBACK_ASSETS = {
+    "currency": ["USD", "EUR", "GBP", "CHF", "JPY", "CAD", "AUD"],
+    "gold": ["1oz Gold Coin", "10g Gold Bar", "1g Gold Bar"],
+    "stock": ["AAPL", "GOOGL", "MSFT", "TSLA", "AMZN", "META", "NVDA"],
+}
+
+@metrics.timed("ui.portfolio_history")
+def get_portfolio_history(user_id, days, reporting_currency=fx.BASE_CURRENCY):
+    """Dzienna wartość portfela z ostatnich `days` dni (pandas.Series indeksowana datą)."""
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=days - 1)
+    # Archiwum Parquet (python price_archive.py) przyspiesza długie zakresy; bez niego wszystko czyta SQLite.
+    archive_root = price_archive.ARCHIVE_DIR if price_archive.is_available() else None
+    with db.connection(DATABASE_PATH) as conn:
+        return sessions.portfolio_cache.get(
+            conn, user_id, ("history", days, reporting_currency),
+            lambda c: portfolio_history.portfolio_value_history(
+                c, user_id, start, end, reporting_currency, archive_root
+            )["total"]
+        )
 
-def get_available_currencies():
+def _get_catalog_assets(asset_type):
     try:
-        conn = sqlite3.connect(NBP_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT DISTINCT kod_waluty FROM {TABLE_NAME_NBP} ORDER BY kod_waluty")
-        currencies = [row[0] for row in cursor.fetchall()]
-        if currencies:
-            return currencies
+        with db.connection(DATABASE_PATH) as conn:
+            assets = catalog.asset_catalog.get_assets(conn, asset_type)
     except sqlite3.Error:
-        pass
-    finally:
-        if 'conn' in locals():
-            conn.close()
-    
-    return ["USD", "EUR", "GBP", "CHF", "JPY", "CAD", "AUD"]
+        assets = []
+    return assets or list(FALLBACK_ASSETS[asset_type])
+
+def get_available_currencies():
+    return _get_catalog_assets("currency")
 
 def get_available_gold_products():
-    try:
-        conn = sqlite3.connect(APART_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT DISTINCT nazwa_produktu FROM {TABLE_NAME_APART} ORDER BY nazwa_produktu")
-        products = [row[0] for row in cursor.fetchall()]
-        if products:
-            return products
-    except sqlite3.Error:
-        pass
-    finally:
-        if 'conn' in locals():
-            conn.close()
-    
-    return ["1oz Gold Coin", "10g Gold Bar", "1g Gold Bar"]
+    return _get_catalog_assets("gold")
 
 def get_available_stock_tickers():
+    return _get_catalog_assets("stock")
+
+def search_assets(asset_type, query, limit=catalog.SEARCH_LIMIT):
+    """Podpowiedzi do listy "Wybierz Aktywo" - co najwyżej `limit` kluczy pasujących do wpisanego tekstu."""
     try:
-        conn = sqlite3.connect(YFINANCE_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT DISTINCT ticker FROM {TABLE_NAME_YFINANCE} ORDER BY ticker")
-        tickers = [row[0] for row in cursor.fetchall()]
-        if tickers:
-            return tickers
+        with db.connection(DATABASE_PATH) as conn:
+            if catalog.asset_catalog.get_assets(conn, asset_type):
+                return catalog.asset_catalog.search(conn, asset_type, query, limit)
     except sqlite3.Error:
         pass
-    finally:
-        if 'conn' in locals():
-            conn.close()
-    
-    return ["AAPL", "GOOGL", "MSFT", "TSLA", "AMZN", "META", "NVDA"]
+    folded_query = query.strip().casefold()
+    return [asset for asset in FALLBACK_ASSETS[asset_type] if folded_query in asset.casefold()][:limit]
 
 def main(page: ft.Page):
     page.title = "INVESTMENT - Aplikacja do zarządzania portfolio"
@@ -220,7 +145,9 @@ def main(page: ft.Page):
     page.window.height = 700
     page.theme_mode = ft.ThemeMode.LIGHT
 
-    current_user_id = None
+    # Zalogowany użytkownik należy do sesji tej strony - w trybie serwerowym proces obsługuje wiele stron naraz.
+    session = sessions.session_store.open(page.session_id)
+    page.on_close = lambda e: sessions.session_store.close(page.session_id)
 
     def show_message(message, color=ft.Colors.GREEN_500):
         snack_bar = ft.SnackBar(
@@ -236,14 +163,13 @@ def main(page: ft.Page):
         password_field = ft.TextField(label="Hasło", password=True, can_reveal_password=True, width=300)
         
         def on_login_click(e):
-            nonlocal current_user_id
             if not username_field.value or not password_field.value:
                 show_message("Wypełnij wszystkie pola!", ft.Colors.RED_500)
                 return
                 
             user_id, message = login_user(username_field.value, password_field.value)
             if user_id:
-                current_user_id = user_id
+                session.user_id = user_id
                 show_message(message)
                 page.clean()
                 page.add(portfolio_view())
@@ -294,42 +220,75 @@ def main(page: ft.Page):
                 ft.dropdown.Option("gold", text="Złoto"),
                 ft.dropdown.Option("stock", text="Akcje"),
             ],
-            width=300
+            width=200
+        )
+        asset_search_field = ft.TextField(
+            label="Szukaj aktywa",
+            width=200,
+            prefix_icon=ft.Icons.SEARCH
         )
         asset_selection_dropdown = ft.Dropdown(
             label="Wybierz Aktywo",
-            width=300,
+            width=250,
             options=[]
         )
         quantity_field = ft.TextField(
             label="Ilość", 
-            width=300, 
+            width=150, 
             input_filter=ft.InputFilter(allow=True, regex_string=r"[0-9\.]", replacement_string="")
         )
         
+        # Zapytania do bazy idą do puli wątków, a handlery Flet od razu wracają.
+        tasks = background.LatestTaskRunner()
+
         def update_asset_selection_dropdown(e):
             selected_type = asset_type_dropdown.value
+            query = asset_search_field.value or ""
             asset_selection_dropdown.options.clear()
-            if selected_type == "currency":
-                available_assets = get_available_currencies()
-            elif selected_type == "gold":
-                available_assets = get_available_gold_products()
-            elif selected_type == "stock":
-                available_assets = get_available_stock_tickers()
-            else:
-                available_assets = []
-            
-            for asset in available_assets:
-                asset_selection_dropdown.options.append(ft.dropdown.Option(asset))
-            
             asset_selection_dropdown.value = None
+            if selected_type not in FALLBACK_ASSETS:
+                page.update()
+                return
+
+            asset_selection_dropdown.disabled = True
+            asset_selection_dropdown.hint_text = "Ładowanie..."
             page.update()
 
+            def apply(available_assets):
+                asset_selection_dropdown.options = [ft.dropdown.Option(asset) for asset in available_assets]
+                asset_selection_dropdown.disabled = False
+                asset_selection_dropdown.hint_text = None
+                page.update()
+
+            def failed(error):
+                asset_selection_dropdown.disabled = False
+                asset_selection_dropdown.hint_text = None
+                show_message(f"Błąd podczas wczytywania listy aktywów: {error}", ft.Colors.RED_500)
+
+            # Do listy trafia tylko pierwsze SEARCH_LIMIT dopasowań, nie cały katalog tickerów.
+            tasks.submit("assets", lambda: search_assets(selected_type, query), apply, failed)
+
         asset_type_dropdown.on_change = update_asset_selection_dropdown
+        asset_search_field.on_change = update_asset_selection_dropdown
 
         total_value_text = ft.Text("", size=20, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE_800)
+        loading_indicator = ft.ProgressRing(width=20, height=20, stroke_width=2, visible=False)
+        reporting_currency_dropdown = ft.Dropdown(
+            label="Waluta raportowa",
+            options=[ft.dropdown.Option(fx.BASE_CURRENCY)],
+            value=fx.BASE_CURRENCY,
+            width=160
+        )
         pie_chart_container = ft.Container()
-        portfolio_details_container = ft.Column([],scroll=ft.ScrollMode.ALWAYS)
+        history_range_dropdown = ft.Dropdown(
+            label="Zakres",
+            options=[ft.dropdown.Option(label) for label in HISTORY_RANGES],
+            value=DEFAULT_HISTORY_RANGE,
+            width=110
+        )
+        history_chart_container = ft.Container(height=250)
+        details_renderer = portfolio_details.PortfolioDetailsRenderer(on_page_change=page.update)
+        shown_category_values = None
         
         def create_pie_chart(category_values):
             sections = []
@@ -364,83 +323,97 @@ def main(page: ft.Page):
                 height=250,
             )
 
-        def create_portfolio_details(assets_by_category):
-            details = []
-            category_names = {"currency": "💰 Waluty", "gold": "🥇 Złoto", "stock": "📈 Akcje"}
-            
-            for category, assets in assets_by_category.items():
-                if assets:
-                    details.append(
-                        ft.Container(
-                            content=ft.Text(
-                                category_names[category], 
-                                size=18, 
-                                weight=ft.FontWeight.BOLD,
-                                color=ft.Colors.BLUE_700
-                            ),
-                            padding=ft.padding.only(top=20, bottom=10)
-                        )
-                    )
-                    
-                    for asset in assets:
-                        details.append(
-                            ft.Container(
-                                content=ft.Row([
-                                    ft.Text(
-                                        f"• {asset['name']}", 
-                                        size=14, 
-                                        weight=ft.FontWeight.W_500,
-                                        expand=2
-                                    ),
-                                    ft.Text(
-                                        f"{asset['quantity']:.2f} szt.", 
-                                        size=14,
-                                        expand=1
-                                    ),
-                                    ft.Text(
-                                        f"{asset['price']:.2f} PLN", 
-                                        size=14,
-                                        expand=1
-                                    ),
-                                    ft.Text(
-                                        f"{asset['value']:.2f} PLN", 
-                                        size=14, 
-                                        weight=ft.FontWeight.BOLD,
-                                        color=ft.Colors.GREEN_700,
-                                        expand=1
-                                    ),
-                                ]),
-                                bgcolor=ft.Colors.GREY_100,
-                                border_radius=5,
-                                padding=10,
-                                margin=ft.margin.only(bottom=5)
-                            )
-                        )
-            
-            if not details:
-                details.append(
-                    ft.Container(
-                        content=ft.Text("Twoje portfolio jest puste. Dodaj pierwsze aktywa!", 
-                                       size=16, color=ft.Colors.GREY_600),
-                        alignment=ft.alignment.center,
-                        padding=20
-                    )
+        def create_history_chart(history, currency):
+            if history.empty or not history.any():
+                return ft.Container(
+                    content=ft.Text("Brak historii wartości portfolio", size=16, color=ft.Colors.GREY_600),
+                    alignment=ft.alignment.center,
+                    height=250
                 )
-            
-            return details
+
+            # Wykres nie potrzebuje więcej punktów, niż zmieści się na ekranie; ostatni dzień zawsze zostaje.
+            step = max(1, -(-len(history) // MAX_CHART_POINTS))
+            sample_positions = list(range(0, len(history), step))
+            if sample_positions[-1] != len(history) - 1:
+                sample_positions.append(len(history) - 1)
+            sampled = history.iloc[sample_positions]
+
+            points = [
+                ft.LineChartDataPoint(i, round(value, 2), tooltip=f"{day:%Y-%m-%d}\n{value:.2f} {currency}")
+                for i, (day, value) in enumerate(sampled.items())
+            ]
+            label_every = max(1, len(points) // 5)
+            bottom_labels = [
+                ft.ChartAxisLabel(value=i, label=ft.Text(f"{day:%Y-%m-%d}", size=10))
+                for i, day in enumerate(sampled.index) if i % label_every == 0
+            ]
+            return ft.LineChart(
+                data_series=[
+                    ft.LineChartData(
+                        data_points=points,
+                        stroke_width=2,
+                        color=ft.Colors.BLUE_500,
+                        below_line_bgcolor=ft.Colors.with_opacity(0.1, ft.Colors.BLUE_500),
+                    )
+                ],
+                left_axis=ft.ChartAxis(labels_size=60),
+                bottom_axis=ft.ChartAxis(labels=bottom_labels, labels_size=30),
+                horizontal_grid_lines=ft.ChartGridLines(color=ft.Colors.GREY_300, width=1),
+                min_y=0,
+                min_x=0,
+                max_x=len(points) - 1,
+                height=250,
+                expand=True,
+            )
+
+        def update_history_chart():
+            currency = reporting_currency_dropdown.value or fx.BASE_CURRENCY
+            days = HISTORY_RANGES[history_range_dropdown.value or DEFAULT_HISTORY_RANGE]
+            user_id = session.user_id
+
+            def apply(history):
+                history_chart_container.content = create_history_chart(history, currency)
+                page.update()
+
+            def failed(error):
+                show_message(f"Błąd podczas liczenia historii portfolio: {error}", ft.Colors.RED_500)
+
+            tasks.submit("history", lambda: get_portfolio_history(user_id, days, currency), apply, failed)
 
         def update_portfolio_display():
-            total_value, category_values, assets_by_category = get_portfolio_value_and_categories(current_user_id)
-            
-            total_value_text.value = f"💼 Całkowita wartość portfolio: {total_value:.2f} PLN"
-            pie_chart_container.content = create_pie_chart(category_values)
-            
-            portfolio_details_container.controls.clear()
-            portfolio_details_container.controls.extend(create_portfolio_details(assets_by_category))
-            
+            currency = reporting_currency_dropdown.value or fx.BASE_CURRENCY
+            user_id = session.user_id
+            loading_indicator.visible = True
+            if not total_value_text.value:
+                total_value_text.value = "Ładowanie..."
             page.update()
 
-        def on_add_asset_click(e):
+            def apply(result):
+                nonlocal shown_category_values
+                # Waluta z wyniku - wycena bez kursu żądanej waluty wraca w PLN.
+                total_value, category_values, assets_by_category, currency = result
+                total_value_text.value = f"💼 Całkowita wartość portfolio: {total_value:.2f} {currency}"
+                # Wykres zależy tylko od udziałów kategorii - bez zmian nie budujemy go od nowa.
+                rounded_values = {category: round(value, 2) for category, value in category_values.items()}
+                if rounded_values != shown_category_values:
+                    pie_chart_container.content = create_pie_chart(category_values)
+                    shown_category_values = rounded_values
+
+                details_renderer.render(assets_by_category, currency)
+
+                loading_indicator.visible = False
+                page.update()
+
+            def failed(error):
+                loading_indicator.visible = False
+                show_message(f"Błąd podczas wyceny portfolio: {error}", ft.Colors.RED_500)
+
+            # Nowsza wycena (np. po zmianie waluty) anuluje starszą, która jeszcze nie skończyła.
+            tasks.submit("valuation", lambda: get_portfolio_value_and_categories(user_id, currency), apply, failed)
+            update_history_chart()
+
+        def submit_position_change(change):
+            """Waliduje formularz i wykonuje w tle zakup lub sprzedaż (`change` - funkcja zapisująca do bazy)."""
             asset_name = asset_selection_dropdown.value
             quantity_str = quantity_field.value
             asset_type = asset_type_dropdown.value
@@ -458,17 +431,54 @@ def main(page: ft.Page):
                 show_message("Nieprawidłowa ilość. Podaj liczbę.", ft.Colors.RED_500)
                 return
 
-            success, message = add_asset_to_portfolio_db(current_user_id, asset_name, asset_type, quantity)
-            if success:
-                show_message(message)
-                asset_selection_dropdown.value = None
-                quantity_field.value = ""
-                asset_type_dropdown.value = None
-                asset_selection_dropdown.options.clear()
-                update_portfolio_display()
-            else:
-                show_message(message, ft.Colors.RED_500)
+            def changed(future):
+                error = future.exception()
+                if error is not None:
+                    # Błędy SQLite wracają jako (False, komunikat); inne wyjątki pokazujemy tak samo.
+                    show_message(f"Błąd podczas zapisu zmiany w portfolio: {error}", ft.Colors.RED_500)
+                    return
+                success, message = future.result()
+                if success:
+                    show_message(message)
+                    asset_selection_dropdown.value = None
+                    quantity_field.value = ""
+                    asset_type_dropdown.value = None
+                    asset_search_field.value = ""
+                    asset_selection_dropdown.options.clear()
+                    update_portfolio_display()
+                else:
+                    show_message(message, ft.Colors.RED_500)
+
+            user_id = session.user_id
+            background.ui_executor.submit(
+                change, user_id, asset_name, asset_type, quantity
+            ).add_done_callback(changed)
+
+        def on_add_asset_click(e):
+            submit_position_change(add_asset_to_portfolio_db)
+
+        def on_sell_asset_click(e):
+            submit_position_change(sell_asset_from_portfolio_db)
+
+        def on_logout_click(e):
+            tasks.cancel_all()
+            session.user_id = None
+            page.clean()
+            page.add(login_view())
+            page.update()
+
+        def update_reporting_currencies():
+            def apply(currencies):
+                reporting_currency_dropdown.options = [ft.dropdown.Option(currency) for currency in currencies]
+                page.update()
+
+            # Do wyboru trafiają tylko waluty z kursem NBP - bez niego wycena i tak byłaby w PLN.
+            tasks.submit("reporting_currencies", get_reporting_currencies, apply)
 
+        reporting_currency_dropdown.on_change = lambda e: update_portfolio_display()
+        history_range_dropdown.on_change = lambda e: update_history_chart()
+
+        update_reporting_currencies()
         update_portfolio_display()
 
         return ft.Column(
@@ -479,7 +489,7 @@ def main(page: ft.Page):
                         ft.IconButton(
                             icon=ft.Icons.LOGOUT,
                             tooltip="Wyloguj",
-                            on_click=lambda e: (page.clean(), page.add(login_view()), page.update())
+                            on_click=on_logout_click
                         )
                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
                     padding=ft.padding.only(bottom=20)
@@ -490,17 +500,28 @@ def main(page: ft.Page):
                         ft.Text("➕ Dodaj nowe aktywo", size=18, weight=ft.FontWeight.BOLD),
                         ft.Row([
                             asset_type_dropdown,
+                            asset_search_field,
                             asset_selection_dropdown,
                             quantity_field,
                         ], alignment=ft.MainAxisAlignment.CENTER),
-                        ft.ElevatedButton(
-                            "Dodaj Aktywo", 
-                            on_click=on_add_asset_click,
-                            style=ft.ButtonStyle(
-                                bgcolor=ft.Colors.BLUE_600,
-                                color=ft.Colors.WHITE
-                            )
-                        ),
+                        ft.Row([
+                            ft.ElevatedButton(
+                                "Dodaj Aktywo", 
+                                on_click=on_add_asset_click,
+                                style=ft.ButtonStyle(
+                                    bgcolor=ft.Colors.BLUE_600,
+                                    color=ft.Colors.WHITE
+                                )
+                            ),
+                            ft.ElevatedButton(
+                                "Sprzedaj",
+                                on_click=on_sell_asset_click,
+                                style=ft.ButtonStyle(
+                                    bgcolor=ft.Colors.RED_400,
+                                    color=ft.Colors.WHITE
+                                )
+                            ),
+                        ], alignment=ft.MainAxisAlignment.CENTER),
                     ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                     bgcolor=ft.Colors.BLUE_50,
                     border_radius=10,
@@ -508,7 +529,11 @@ def main(page: ft.Page):
                     margin=ft.margin.only(bottom=20)
                 ),
                 
-                total_value_text,
+                ft.Row([
+                    total_value_text,
+                    loading_indicator,
+                    reporting_currency_dropdown,
+                ], alignment=ft.MainAxisAlignment.CENTER),
                 ft.Container(height=20),
                 
                 ft.Row([
@@ -525,13 +550,25 @@ def main(page: ft.Page):
                         content=ft.Column([
                             ft.Text("📋 Szczegóły Portfolio", size=16, weight=ft.FontWeight.BOLD),
                             ft.Column([
-                                portfolio_details_container
-                            ], scroll=ft.ScrollMode.AUTO, height=300)
+                                details_renderer.container
+                            ], scroll=ft.ScrollMode.AUTO, height=300),
+                            details_renderer.pager,
                         ]),
                         expand=2,
                         padding=20
                     ),
                 ], alignment=ft.MainAxisAlignment.START),
+
+                ft.Container(
+                    content=ft.Column([
+                        ft.Row([
+                            ft.Text("📈 Wartość portfolio w czasie", size=16, weight=ft.FontWeight.BOLD),
+                            history_range_dropdown,
+                        ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                        history_chart_container,
+                    ]),
+                    padding=20
+                ),
                 
             ],
             horizontal_alignment=ft.CrossAxisAlignment.CENTER,
@@ -542,4 +579,17 @@ def main(page: ft.Page):
     page.add(login_view())
 
 if __name__ == "__main__":
-    ft.app(target=main)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="INVESTMENT - aplikacja do zarządzania portfolio.")
+    parser.add_argument("--server", action="store_true",
+                        help="Tryb serwerowy: aplikacja web dla wielu użytkowników zamiast okna desktopowego.")
+    parser.add_argument("--host", default=None, help="Adres nasłuchu w trybie serwerowym (domyślnie localhost).")
+    parser.add_argument("--port", type=int, default=8550, help="Port w trybie serwerowym.")
+    args = parser.parse_args()
+
+    logging_setup.configure()
+    metrics.start_server_from_env()
+    db.init_schema(DATABASE_PATH)
+    if args.server:
+        ft.app(target=main, host=args.host, port=args.port, view=ft.AppView.WEB_BROWSER)
+    else:
+        ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,292 @@
+"""Metryki etapów pracy (histogramy czasów, liczniki, wskaźniki), opcjonalne profilowanie i lokalny endpoint.
+
+    with metrics.stage("nbp.fetch"):           # histogram stage_seconds{stage="nbp.fetch"} + licznik błędów
+        ...
+    metrics.inc("rows_fetched_total", len(rows), source="nbp")
+
+Profilowanie (opt-in): zmienna PROFILE_DIR=<katalog> albo enable_profiling(katalog) - etap zapisuje wtedy plik
+<etap>-<czas>.prof (cProfile, do otwarcia w pstats/snakeviz). Naraz profilowany jest najwyżej jeden etap
+w procesie; etapy trwające w tym czasie w innych wątkach działają normalnie, tylko bez profilu.
+Endpoint: zmienna METRICS_PORT albo start_server(port) - GET /metrics (format tekstowy Prometheusa)
+i /metrics.json, tylko na 127.0.0.1.
+"""
+import bisect
+import cProfile
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Górne granice kubełków histogramu czasu (sekundy)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROFILE_DIR_ENV = "PROFILE_DIR"
+METRICS_PORT_ENV = "METRICS_PORT"
+METRICS_HOST = "127.0.0.1"
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Ostatni kubełek: powyżej największej granicy
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Przybliżony kwantyl - górna granica kubełka, w którym wypada (dla ostatniego: maksimum)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counter_value(self, name, **labels):
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self):
+        """Stan wszystkich metryk jako słownik gotowy do json.dumps."""
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._gauges.items())],
+                "histograms": [
+                    {"name": n, "labels": dict(l), **h.snapshot()} for (n, l), h in sorted(self._histograms.items())
+                ],
+            }
+
+    def render_text(self):
+        """Format tekstowy Prometheusa."""
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({n for n, _ in metrics}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines.extend(
+                        f"{name}{_format_labels(labels)} {value}"
+                        for (n, labels), value in sorted(metrics.items()) if n == name
+                    )
+            for name in sorted({n for n, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), histogram in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+registry = Registry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+
+_profile_dir = os.environ.get(PROFILE_DIR_ENV) or None
+# Od Pythona 3.12 cProfile działa na cały proces (sys.monitoring) - drugi włączony naraz profiler zgłasza
+# ValueError. Profilowany jest więc najwyżej jeden etap w procesie; etapy równoległe i zagnieżdżone
+# są pomijane (zagnieżdżone i tak zawierają się w profilu zewnętrznego).
+_profiler_lock = threading.Lock()
+
+def enable_profiling(directory):
+    """Włącza zapis profili cProfile dla etapów; None wyłącza."""
+    global _profile_dir
+    _profile_dir = directory
+
+def _start_profiler(name):
+    """Profiler dla etapu albo None; błąd profilowania nigdy nie przerywa samego etapu."""
+    if _profile_dir is None or not _profiler_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    except Exception as e:
+        _profiler_lock.release()
+        logger.warning("Nie udało się włączyć profilera dla etapu %s: %s", name, e, extra={"stage": name})
+        return None
+
+def _dump_profile(profiler, name):
+    try:
+        profiler.disable()
+        directory = _profile_dir
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(directory, f"{name}-{timestamp}.prof")
+        profiler.dump_stats(path)
+        logger.info("Zapisano profil etapu %s do %s", name, path, extra={"stage": name, "path": path})
+    except Exception as e:
+        logger.warning("Nie udało się zapisać profilu etapu %s: %s", name, e, extra={"stage": name})
+    finally:
+        _profiler_lock.release()
+
+@contextmanager
+def profile(name):
+    """Sam profil bloku (bez metryk) - gdy profilowanie jest włączone i żaden inny etap nie jest profilowany."""
+    profiler = _start_profiler(name)
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            _dump_profile(profiler, name)
+
+@contextmanager
+def stage(name, **labels):
+    """Mierzy czas bloku w histogramie stage_seconds; wyjątek zwiększa stage_errors_total i leci dalej."""
+    with profile(name):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            registry.inc("stage_errors_total", stage=name, **labels)
+            raise
+        finally:
+            registry.observe("stage_seconds", time.perf_counter() - started, stage=name, **labels)
+
+class StageClock:
+    """Czasy etapów jednego przebiegu zbierane kawałkami (np. paczka po paczce) i zapisywane raz, w close().
+
+    Zagnieżdżony etap wstrzymuje zewnętrzny: pobieranie wykonywane leniwie w trakcie parsowania liczy się
+    tylko jako pobieranie. Zegar należy do jednego wątku i sam niczego nie profiluje.
+    """
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self.seconds = {}
+        self._stack = []
+        self._since = None
+
+    def _charge(self, now):
+        name = self._stack[-1]
+        self.seconds[name] = self.seconds.get(name, 0.0) + now - self._since
+        self._since = now
+
+    @contextmanager
+    def stage(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            self._charge(now)
+        self._stack.append(name)
+        self.seconds.setdefault(name, 0.0)
+        self._since = now
+        try:
+            yield
+        except Exception:
+            registry.inc("stage_errors_total", stage=name, **self.labels)
+            raise
+        finally:
+            self._charge(time.perf_counter())
+            self._stack.pop()
+
+    def close(self):
+        for name, seconds in self.seconds.items():
+            registry.observe("stage_seconds", seconds, stage=name, **self.labels)
+        self.seconds = {}
+
+def timed(name):
+    """Dekorator: całe wywołanie funkcji jako etap `name`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = registry.render_text().encode("utf-8"), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(port, host=METRICS_HOST):
+    """Uruchamia endpoint metryk w wątku w tle; zwraca serwer (server.shutdown() go zatrzymuje)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Metryki dostępne pod http://%s:%s/metrics", host, server.server_address[1])
+    return server
+
+def start_server_from_env():
+    port = os.environ.get(METRICS_PORT_ENV)
+    return start_server(int(port)) if port else None
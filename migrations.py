@@ -0,0 +1,376 @@
+"""Wersjonowane migracje schematu maindb.db.
+
+Każda migracja to (wersja, nazwa, kroki); krok to zapytanie SQL albo funkcja przyjmująca połączenie.
+Numer ostatniej zastosowanej migracji trzymany jest w tabeli schema_version.
+
+Uruchomienie:  python migrations.py [--db ŚCIEŻKA] [--check]
+"""
+import argparse
+import datetime
+import sys
+
+import valuation
+
+TABLE_NAME_NBP = "kursy_walut_nbp"
+TABLE_NAME_APART = "ceny_skupu_apart"
+TABLE_NAME_YFINANCE = "yfinance_stock_data"
+
+# asset_type -> (tabela historii, kolumna klucza, kolumna ceny, kolumna daty)
+PRICE_HISTORY_SOURCES = {
+    "currency": (TABLE_NAME_NBP, "kod_waluty", "kurs_sredni", "data_notowania"),
+    "gold": (TABLE_NAME_APART, "nazwa_produktu", "cena_skupu", "timestamp_pobrania"),
+    "stock": (TABLE_NAME_YFINANCE, "ticker", "close_price", "data_notowania"),
+}
+
+def rebuild_latest_prices(conn):
+    """Wylicza latest_prices od zera z tabel historii."""
+    for asset_type, (table_name, key_column, price_column, date_column) in PRICE_HISTORY_SOURCES.items():
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO latest_prices (asset_type, asset_key, price, as_of)
+            SELECT ?, {key_column}, {price_column}, MAX({date_column}) FROM {table_name}
+            WHERE {price_column} IS NOT NULL
+            GROUP BY {key_column}
+            """,
+            (asset_type,)
+        )
+
+# asset_type -> kolumna z nazwą wyświetlaną w tabeli historii (None, gdy źródło jej nie ma)
+CATALOG_NAME_COLUMNS = {
+    "currency": "nazwa_waluty",
+    "gold": None,
+    "stock": None,
+}
+
+def rebuild_asset_catalog(conn):
+    """Wypełnia asset_catalog wszystkimi kluczami występującymi w tabelach historii."""
+    for asset_type, (table_name, key_column, _, _) in PRICE_HISTORY_SOURCES.items():
+        name_column = CATALOG_NAME_COLUMNS[asset_type]
+        name_expression = f"MAX({name_column})" if name_column else "NULL"
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO asset_catalog (asset_type, asset_key, display_name)
+            SELECT ?, {key_column}, {name_expression} FROM {table_name}
+            GROUP BY {key_column}
+            """,
+            (asset_type,)
+        )
+    conn.execute(
+        "INSERT INTO data_versions (name, version) VALUES ('asset_catalog', 1) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1"
+    )
+
+def backfill_apart_content_hash(conn):
+    """Uzupełnia content_hash dla cen Apart zapisanych przed migracją 8."""
+    import db
+
+    rows = conn.execute(
+        f"SELECT id, kategoria_produktu, nazwa_produktu, cena_skupu FROM {TABLE_NAME_APART} WHERE content_hash IS NULL"
+    ).fetchall()
+    conn.executemany(
+        f"UPDATE {TABLE_NAME_APART} SET content_hash = ? WHERE id = ?",
+        [(db.row_hash(category, name, price), row_id) for row_id, category, name, price in rows]
+    )
+
+MIGRATIONS = [
+    (1, "tabele bazowe", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS portfolios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            asset_name TEXT NOT NULL,
+            asset_type TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        f'''
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME_NBP} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_notowania DATE NOT NULL,
+            nazwa_waluty TEXT NOT NULL,
+            kod_waluty TEXT NOT NULL,
+            kurs_sredni REAL NOT NULL,
+            UNIQUE(data_notowania, kod_waluty) -- Zapobiega duplikatom dla tej samej waluty i dnia
+        )
+        ''',
+        f'''
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME_APART} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kategoria_produktu TEXT,
+            nazwa_produktu TEXT NOT NULL,
+            cena_skupu REAL NOT NULL,
+            timestamp_pobrania TEXT NOT NULL
+        )
+        ''',
+        f'''
+        CREATE TABLE IF NOT EXISTS {TABLE_NAME_YFINANCE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker TEXT NOT NULL,
+            data_notowania DATE NOT NULL,
+            open_price REAL,
+            high_price REAL,
+            low_price REAL,
+            close_price REAL,
+            adj_close_price REAL,
+            volume INTEGER,
+            UNIQUE(ticker, data_notowania) -- Zapobiega duplikatom dla tego samego tickera i dnia
+        )
+        ''',
+    ]),
+    (2, "cache najnowszych cen", [
+        '''
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            asset_type TEXT NOT NULL,
+            asset_key TEXT NOT NULL,
+            price REAL NOT NULL,
+            as_of TEXT NOT NULL,
+            PRIMARY KEY (asset_type, asset_key)
+        ) WITHOUT ROWID
+        ''',
+        rebuild_latest_prices,
+    ]),
+    (3, "watermarki scraperów i metadane tickerów", [
+        '''
+        CREATE TABLE IF NOT EXISTS scrape_watermarks (
+            source TEXT NOT NULL,
+            asset_key TEXT NOT NULL,
+            last_date TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (source, asset_key)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS ticker_metadata (
+            ticker TEXT PRIMARY KEY,
+            currency TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (4, "indeksy dla gorących zapytań", [
+        "CREATE INDEX IF NOT EXISTS idx_portfolios_user ON portfolios (user_id)",
+        f"CREATE INDEX IF NOT EXISTS idx_apart_produkt_czas ON {TABLE_NAME_APART} (nazwa_produktu, timestamp_pobrania)",
+        f"CREATE INDEX IF NOT EXISTS idx_nbp_kod_data ON {TABLE_NAME_NBP} (kod_waluty, data_notowania)",
+        "ANALYZE",
+    ]),
+    (5, "katalog aktywów i wersje danych", [
+        '''
+        CREATE TABLE IF NOT EXISTS asset_catalog (
+            asset_type TEXT NOT NULL,
+            asset_key TEXT NOT NULL,
+            display_name TEXT,
+            PRIMARY KEY (asset_type, asset_key)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        ''',
+        rebuild_asset_catalog,
+    ]),
+    # Tabela portfolios (jeden wiersz na każde dodanie) nie jest już zapisywana; jej wiersze
+    # przenoszone są do historii transakcji i sumowane w pozycjach. Koszt przeniesionych zakupów jest nieznany,
+    # a wiersze bez użytkownika (user_id NULL) zostają tylko w portfolios.
+    (6, "pozycje i historia transakcji", [
+        '''
+        CREATE TABLE IF NOT EXISTS portfolio_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            asset_type TEXT NOT NULL,
+            asset_name TEXT NOT NULL,
+            quantity REAL NOT NULL, -- ujemna dla sprzedaży
+            price REAL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user ON portfolio_transactions (user_id, id)",
+        '''
+        CREATE TABLE IF NOT EXISTS positions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            asset_type TEXT NOT NULL,
+            asset_name TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            cost_basis REAL,
+            updated_at TEXT NOT NULL,
+            UNIQUE(user_id, asset_type, asset_name),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        INSERT INTO portfolio_transactions (user_id, asset_type, asset_name, quantity, price, created_at)
+        SELECT user_id, asset_type, asset_name, quantity, NULL, datetime('now') FROM portfolios
+        WHERE user_id IS NOT NULL
+        ORDER BY id
+        ''',
+        '''
+        INSERT OR IGNORE INTO positions (user_id, asset_type, asset_name, quantity, cost_basis, updated_at)
+        SELECT user_id, asset_type, asset_name, SUM(quantity), NULL, datetime('now') FROM portfolios
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id, asset_type, asset_name
+        ORDER BY MIN(id)
+        ''',
+    ]),
+    (7, "walidatory zapytań warunkowych HTTP", [
+        '''
+        CREATE TABLE IF NOT EXISTS http_validators (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            updated_at TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (8, "skrót treści cen Apart", [
+        f"ALTER TABLE {TABLE_NAME_APART} ADD COLUMN content_hash TEXT",
+        backfill_apart_content_hash,
+    ]),
+    (9, "manifest archiwum kolumnowego", [
+        '''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            dataset TEXT NOT NULL,
+            asset_key TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            max_date TEXT NOT NULL,
+            exported_at TEXT NOT NULL,
+            PRIMARY KEY (dataset, asset_key, year)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+]
+
+def ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def current_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Stosuje brakujące migracje po kolei, każdą w osobnej transakcji. Zwraca listę zastosowanych wersji."""
+    ensure_version_table(conn)
+    applied = []
+    for version, name, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= current_version(conn):
+            continue
+        # BEGIN IMMEDIATE blokuje zapis, więc dwa procesy startujące naraz nie zastosują migracji dwukrotnie.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.datetime.now().isoformat())
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+# Gorące zapytania aplikacji; każde musi w planie wykonania szukać po indeksie (SEARCH), poza
+# INDEX_SCAN_QUERIES, które z założenia czytają cały indeks pokrywający.
+HOT_QUERIES = [
+    ("wycena portfela", valuation.PORTFOLIO_POSITIONS_SQL, (1,)),
+    ("pozycje użytkownika", "SELECT asset_name, asset_type, quantity, cost_basis FROM positions WHERE user_id = ? ORDER BY id", (1,)),
+    ("historia transakcji", "SELECT asset_type, asset_name, quantity, price, created_at FROM portfolio_transactions WHERE user_id = ? ORDER BY id", (1,)),
+    ("logowanie", "SELECT * FROM users WHERE username = ? AND password = ?", ("u", "p")),
+    ("kursy NBP z cache", "SELECT asset_key, price FROM latest_prices WHERE asset_type = 'currency'", ()),
+    ("najnowsza tabela NBP", f"SELECT MAX(data_notowania) FROM {TABLE_NAME_NBP}", ()),
+    ("waluty tickerów", "SELECT ticker, currency FROM ticker_metadata WHERE ticker IN (?, ?)", ("AAPL", "MSFT")),
+    ("watermarki", "SELECT asset_key, last_date FROM scrape_watermarks WHERE source = ?", ("nbp",)),
+    ("wersja katalogu", "SELECT version FROM data_versions WHERE name = ?", ("asset_catalog",)),
+    ("ceny z cache", "SELECT asset_type, asset_key, price FROM latest_prices WHERE asset_type IN ('gold', 'stock')", ()),
+    ("walidatory HTTP", "SELECT etag, last_modified, content_hash FROM http_validators WHERE url = ?", ("http://x",)),
+    ("partycje archiwum", "SELECT asset_key, year, max_date FROM archive_partitions WHERE dataset = ? AND asset_key IN (?, ?)", ("stock", "AAPL", "MSFT")),
+    ("ostatnie skróty cen Apart", f"""
+        SELECT kategoria_produktu, nazwa_produktu, content_hash, MAX(timestamp_pobrania) FROM {TABLE_NAME_APART}
+        WHERE nazwa_produktu IN (?, ?) GROUP BY kategoria_produktu, nazwa_produktu
+    """, ("1oz", "1g")),
+    ("lista walut", f"SELECT DISTINCT kod_waluty FROM {TABLE_NAME_NBP} ORDER BY kod_waluty", ()),
+    ("lista produktów złota", f"SELECT DISTINCT nazwa_produktu FROM {TABLE_NAME_APART} ORDER BY nazwa_produktu", ()),
+    ("lista tickerów", f"SELECT DISTINCT ticker FROM {TABLE_NAME_YFINANCE} ORDER BY ticker", ()),
+    ("historia tickera", f"""
+        SELECT data_notowania, close_price FROM {TABLE_NAME_YFINANCE}
+        WHERE ticker = ? AND data_notowania BETWEEN ? AND ? ORDER BY data_notowania
+    """, ("AAPL", "2024-01-01", "2024-12-31")),
+    ("historia waluty", f"""
+        SELECT data_notowania, kurs_sredni FROM {TABLE_NAME_NBP}
+        WHERE kod_waluty = ? AND data_notowania BETWEEN ? AND ? ORDER BY data_notowania
+    """, ("USD", "2024-01-01", "2024-12-31")),
+    ("historia cen do price_store", f"""
+        SELECT ticker, substr(data_notowania, 1, 10), close_price FROM {TABLE_NAME_YFINANCE}
+        WHERE ticker IN (?, ?) AND data_notowania >= ? ORDER BY ticker, data_notowania
+    """, ("AAPL", "MSFT", "")),
+    ("historia produktu złota", f"""
+        SELECT timestamp_pobrania, cena_skupu FROM {TABLE_NAME_APART}
+        WHERE nazwa_produktu = ? ORDER BY timestamp_pobrania DESC LIMIT 1
+    """, ("1oz",)),
+]
+
+# Listy wszystkich kluczy (SELECT DISTINCT) - przejście całego indeksu pokrywającego jest tu oczekiwane.
+INDEX_SCAN_QUERIES = {"lista walut", "lista produktów złota", "lista tickerów"}
+
+def is_table_scan(detail):
+    """'SCAN tabela' bez indeksu oznacza przejście całej tabeli; 'SCAN ... USING COVERING INDEX' czyta tylko indeks."""
+    return detail.startswith("SCAN ") and " USING " not in detail
+
+def is_plan_problem(name, detail):
+    """Krok planu niedozwolony w zapytaniu: każdy SCAN, a w INDEX_SCAN_QUERIES tylko skan całej tabeli."""
+    if name in INDEX_SCAN_QUERIES:
+        return is_table_scan(detail)
+    return detail.startswith("SCAN ")
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Zwraca listę (nazwa zapytania, krok planu) dla zapytań, które nie szukają po indeksie."""
+    problems = []
+    for name, sql, params in queries:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall():
+            detail = row[3]
+            if is_plan_problem(name, detail):
+                problems.append((name, detail))
+    return problems
+
+if __name__ == "__main__":
+    import db
+
+    parser = argparse.ArgumentParser(description="Migracje schematu bazy danych.")
+    parser.add_argument("--db", default=db.DATABASE_PATH, help="Ścieżka do pliku bazy.")
+    parser.add_argument("--check", action="store_true", help="Sprawdź plany gorących zapytań (EXPLAIN QUERY PLAN).")
+    args = parser.parse_args()
+
+    with db.connection(args.db) as conn:
+        print(f"Wersja schematu: {current_version(conn)} (najnowsza: {MIGRATIONS[-1][0]})")
+        if args.check:
+            problems = check_query_plans(conn)
+            for name, detail in problems:
+                print(f"Zapytanie '{name}' nie szuka po indeksie: {detail}")
+            if problems:
+                sys.exit(1)
+            print(f"Wszystkie {len(HOT_QUERIES)} gorące zapytania korzystają z indeksów.")
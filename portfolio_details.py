@@ -0,0 +1,137 @@
+import flet as ft
+
+PAGE_SIZE = 50
+CATEGORY_NAMES = {"currency": "💰 Waluty", "gold": "🥇 Złoto", "stock": "📈 Akcje"}
+
+class _AssetRow:
+    """Wiersz jednej pozycji; przy kolejnych wycenach zmieniane są tylko wartości tekstów, nie same kontrolki."""
+
+    def __init__(self, name):
+        self.quantity_text = ft.Text(size=14, expand=1)
+        self.price_text = ft.Text(size=14, expand=1)
+        self.value_text = ft.Text(size=14, weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN_700, expand=1)
+        self.control = ft.Container(
+            content=ft.Row([
+                ft.Text(f"• {name}", size=14, weight=ft.FontWeight.W_500, expand=2),
+                self.quantity_text,
+                self.price_text,
+                self.value_text,
+            ]),
+            bgcolor=ft.Colors.GREY_100,
+            border_radius=5,
+            padding=10,
+            margin=ft.margin.only(bottom=5)
+        )
+        self.values = None
+
+    def set(self, asset, currency):
+        """Zwraca True, jeśli coś się zmieniło od poprzedniej wyceny."""
+        values = (asset['quantity'], asset['price'], asset['value'], currency)
+        if values == self.values:
+            return False
+        self.quantity_text.value = f"{asset['quantity']:.2f} szt."
+        self.price_text.value = f"{asset['price']:.2f} {currency}"
+        self.value_text.value = f"{asset['value']:.2f} {currency}"
+        self.values = values
+        return True
+
+def _category_header(category):
+    return ft.Container(
+        content=ft.Text(
+            CATEGORY_NAMES[category],
+            size=18,
+            weight=ft.FontWeight.BOLD,
+            color=ft.Colors.BLUE_700
+        ),
+        padding=ft.padding.only(top=20, bottom=10)
+    )
+
+def asset_keys(assets_by_category):
+    """Klucze (kategoria, nazwa, n) dla kolejnych pozycji; n rozróżnia powtórzenia tej samej nazwy."""
+    entries = []
+    for category, assets in assets_by_category.items():
+        seen = {}
+        for asset in assets:
+            occurrence = seen.get(asset['name'], 0)
+            seen[asset['name']] = occurrence + 1
+            entries.append(((category, asset['name'], occurrence), category, asset))
+    return entries
+
+class PortfolioDetailsRenderer:
+    """Stronicowana lista szczegółów portfela z kontrolkami wielokrotnego użytku, kluczowanymi po pozycji.
+
+    Na stronie jest co najwyżej `page_size` wierszy. Kontrolki wierszy widocznych na stronie są zachowywane
+    między wycenami, więc page.update() wysyła tylko teksty, które faktycznie się zmieniły.
+    """
+
+    def __init__(self, on_page_change=None, page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.page_index = 0
+        self.on_page_change = on_page_change
+        self.container = ft.Column([], scroll=ft.ScrollMode.ALWAYS)
+        self._entries = []
+        self._currency = None
+        self._rows = {}
+        self._headers = {}
+        self._empty = ft.Container(
+            content=ft.Text("Twoje portfolio jest puste. Dodaj pierwsze aktywa!",
+                            size=16, color=ft.Colors.GREY_600),
+            alignment=ft.alignment.center,
+            padding=20
+        )
+        self.page_text = ft.Text("", size=12, color=ft.Colors.GREY_700)
+        self.prev_button = ft.IconButton(icon=ft.Icons.CHEVRON_LEFT, tooltip="Poprzednia strona",
+                                         on_click=lambda e: self.show_page(self.page_index - 1))
+        self.next_button = ft.IconButton(icon=ft.Icons.CHEVRON_RIGHT, tooltip="Następna strona",
+                                         on_click=lambda e: self.show_page(self.page_index + 1))
+        self.pager = ft.Row([self.prev_button, self.page_text, self.next_button],
+                            alignment=ft.MainAxisAlignment.CENTER, visible=False)
+
+    @property
+    def page_count(self):
+        return max(1, -(-len(self._entries) // self.page_size))
+
+    def render(self, assets_by_category, currency):
+        """Podmienia dane i przerysowuje bieżącą stronę. Zwraca liczbę wierszy, których wartości się zmieniły."""
+        self._entries = asset_keys(assets_by_category)
+        self._currency = currency
+        self.page_index = min(self.page_index, self.page_count - 1)
+        return self._render_page()
+
+    def show_page(self, page_index):
+        if not 0 <= page_index < self.page_count:
+            return
+        self.page_index = page_index
+        self._render_page()
+        if self.on_page_change:
+            self.on_page_change()
+
+    def _render_page(self):
+        start = self.page_index * self.page_size
+        visible = self._entries[start:start + self.page_size]
+
+        controls = []
+        rows = {}
+        changed = 0
+        previous_category = None
+        for key, category, asset in visible:
+            if category != previous_category:
+                if category not in self._headers:
+                    self._headers[category] = _category_header(category)
+                controls.append(self._headers[category])
+                previous_category = category
+            row = self._rows.get(key) or _AssetRow(asset['name'])
+            if row.set(asset, self._currency):
+                changed += 1
+            rows[key] = row
+            controls.append(row.control)
+
+        # Trzymamy tylko kontrolki bieżącej strony, żeby pamięć nie rosła z liczbą pozycji.
+        self._rows = rows
+        self.container.controls = controls or [self._empty]
+
+        self.pager.visible = len(self._entries) > self.page_size
+        self.page_text.value = f"Strona {self.page_index + 1} z {self.page_count} ({len(self._entries)} pozycji)"
+        self.prev_button.disabled = self.page_index == 0
+        self.next_button.disabled = self.page_index >= self.page_count - 1
+        return changed
@@ -0,0 +1,113 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import fx
+import metrics
+import price_store
+import valuation
+
+CATEGORIES = ("currency", "gold", "stock")
+
+def _day_bounds(start, end):
+    """Granice zapytań jako tekst ISO: [start, dzień po end) - działa i dla dat, i dla timestampów."""
+    return start.isoformat(), (end + datetime.timedelta(days=1)).isoformat()
+
+def load_holdings(conn, user_id, start, end):
+    """Ilości posiadane na koniec każdego dnia: DataFrame dzień x (typ, nazwa), policzony sumą narastającą transakcji.
+
+    Transakcje sprzed `start` wliczane są do pierwszego dnia zakresu. Zakupy przeniesione ze starej tabeli
+    portfolios mają datę migracji, więc wcześniej nie są widoczne.
+    """
+    days = pd.date_range(start, end, freq="D")
+    _, end_bound = _day_bounds(start, end)
+    rows = conn.execute(
+        """
+        SELECT asset_type, asset_name, quantity, substr(created_at, 1, 10) FROM portfolio_transactions
+        WHERE user_id = ? AND created_at < ? ORDER BY id
+        """,
+        (user_id, end_bound)
+    ).fetchall()
+    if not rows:
+        return pd.DataFrame(index=days)
+
+    transactions = pd.DataFrame.from_records(rows, columns=["asset_type", "asset_name", "quantity", "day"])
+    transactions["day"] = pd.to_datetime(transactions["day"]).clip(lower=days[0])
+    daily = transactions.pivot_table(
+        index="day", columns=["asset_type", "asset_name"], values="quantity", aggfunc="sum"
+    )
+    holdings = daily.reindex(days).fillna(0.0).cumsum()
+    return holdings.loc[:, (holdings.abs() > 1e-9).any()]
+
+def load_price_history(conn, asset_type, keys, start, end, archive_root=None):
+    """Cena na koniec każdego dnia: DataFrame dzień x klucz.
+
+    Dni bez notowań (weekendy, święta - NBP zwraca wtedy 404) dostają ostatnią znaną cenę, także sprzed
+    zakresu. Serie cen pochodzą z price_store - baza (albo archiwum Parquet z `archive_root`) czytana jest
+    tylko przy pierwszym użyciu aktywa po zmianie cen.
+    """
+    keys = list(keys)
+    days = pd.date_range(start, end, freq="D")
+    matrix = price_store.store.daily_prices(conn, asset_type, keys, start, end, archive_root)
+    return pd.DataFrame(matrix, index=days, columns=keys)
+
+def _fill_missing_prices(prices, default_price):
+    """Przed pierwszym notowaniem bierzemy pierwszą znaną cenę, a bez żadnych notowań - cenę domyślną (jak valuation)."""
+    return prices.bfill().fillna(default_price)
+
+@metrics.timed("valuation.history")
+def portfolio_value_history(conn, user_id, start, end, reporting_currency=fx.BASE_CURRENCY, archive_root=None):
+    """Dzienna wartość portfela w walucie raportowej: DataFrame z kolumnami currency, gold, stock i total.
+
+    Wszystko liczone jest na macierzach dzień x aktywo (jedno zapytanie na typ aktywa i paczkę kluczy),
+    bez pętli po dniach. Przeliczenia walut jak w valuation: nieznany kurs daje mnożnik 1.0, a waluta
+    raportowa bez kursu NBP zamieniana jest na PLN (fx.resolve_reporting_currency).
+    """
+    reporting_currency = fx.resolve_reporting_currency(fx.rate_cache.get_rates(conn), reporting_currency)
+    days = pd.date_range(start, end, freq="D", name="date")
+    result = pd.DataFrame(0.0, index=days, columns=[*CATEGORIES, "total"])
+    holdings = load_holdings(conn, user_id, start, end)
+    if holdings.empty:
+        return result
+
+    names_by_type = {asset_type: [] for asset_type in CATEGORIES}
+    for asset_type, asset_name in holdings.columns:
+        names_by_type[asset_type].append(asset_name)
+
+    stock_currencies = fx.ticker_currency_cache.get_currencies(conn, names_by_type["stock"])
+    quote_currencies = {
+        ticker: fx.SUBUNIT_CURRENCIES.get(currency, (currency, 1.0)) for ticker, currency in stock_currencies.items()
+    }
+    needed_rates = set(names_by_type["currency"]) | {code for code, _ in quote_currencies.values()}
+    needed_rates = sorted((needed_rates | {reporting_currency}) - {fx.BASE_CURRENCY})
+    rates = load_price_history(conn, "currency", needed_rates, start, end, archive_root).ffill().bfill()
+    rates[fx.BASE_CURRENCY] = 1.0
+
+    reporting_rate = rates.get(reporting_currency)
+    if reporting_rate is None or reporting_rate.isna().all():
+        # Bez kursu waluty raportowej raportujemy w PLN (jak fx.Converter).
+        reporting_rate = rates[fx.BASE_CURRENCY]
+
+    prices = {}
+    currency_names = names_by_type["currency"]
+    if currency_names:
+        currency_prices = _fill_missing_prices(rates.reindex(columns=currency_names), valuation.DEFAULT_CURRENCY_PRICE)
+        prices["currency"] = currency_prices.div(reporting_rate, axis=0)
+    gold_names = names_by_type["gold"]
+    if gold_names:
+        gold_prices = _fill_missing_prices(load_price_history(conn, "gold", gold_names, start, end, archive_root), valuation.DEFAULT_GOLD_PRICE)
+        prices["gold"] = gold_prices.div(reporting_rate, axis=0)
+    stock_names = names_by_type["stock"]
+    if stock_names:
+        stock_prices = _fill_missing_prices(load_price_history(conn, "stock", stock_names, start, end, archive_root), valuation.DEFAULT_STOCK_PRICE)
+        quote_rates = rates.reindex(columns=[quote_currencies[t][0] for t in stock_names]).to_numpy()
+        multipliers = np.array([quote_currencies[t][1] for t in stock_names])
+        factors = quote_rates * multipliers / reporting_rate.to_numpy()[:, None]
+        prices["stock"] = stock_prices * np.where(np.isnan(factors), 1.0, factors)
+
+    for asset_type, type_prices in prices.items():
+        quantities = holdings[asset_type].reindex(columns=type_prices.columns).to_numpy()
+        result[asset_type] = (quantities * type_prices.to_numpy()).sum(axis=1)
+    result["total"] = result[list(CATEGORIES)].sum(axis=1)
+    return result
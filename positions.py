@@ -0,0 +1,88 @@
+import datetime
+
+import db
+
+# Pozycja, której ilość spadła poniżej tej wartości, uznawana jest za zamkniętą.
+QUANTITY_EPSILON = 1e-9
+
+class InsufficientQuantityError(ValueError):
+    """Próba sprzedaży większej ilości niż posiadana w pozycji."""
+
+def positions_version(user_id):
+    """Nazwa wersji pozycji użytkownika w data_versions - rośnie przy każdym zakupie i sprzedaży."""
+    return f"positions:{user_id}"
+
+def record_buy(conn, user_id, asset_type, asset_name, quantity, price=None):
+    """Zapisuje zakup w historii transakcji i dolicza go do zagregowanej pozycji (w bieżącej transakcji).
+
+    `price` to cena jednostkowa w walucie notowań aktywa; bez niej koszt pozycji staje się nieznany (NULL).
+    """
+    now = datetime.datetime.now().isoformat()
+    cost = quantity * price if price is not None else None
+    conn.execute(
+        """
+        INSERT INTO portfolio_transactions (user_id, asset_type, asset_name, quantity, price, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, asset_type, asset_name, quantity, price, now)
+    )
+    conn.execute(
+        """
+        INSERT INTO positions (user_id, asset_type, asset_name, quantity, cost_basis, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, asset_type, asset_name) DO UPDATE SET
+            quantity = quantity + excluded.quantity,
+            cost_basis = cost_basis + excluded.cost_basis,
+            updated_at = excluded.updated_at
+        """,
+        (user_id, asset_type, asset_name, quantity, cost, now)
+    )
+    db.bump_data_version(conn, positions_version(user_id))
+
+def record_sell(conn, user_id, asset_type, asset_name, quantity, price=None):
+    """Zmniejsza pozycję o `quantity` (koszt metodą średniej ceny) i zapisuje sprzedaż w historii.
+
+    Rzuca InsufficientQuantityError, gdy pozycja nie istnieje lub jest mniejsza niż sprzedawana ilość.
+    """
+    now = datetime.datetime.now().isoformat()
+    # Warunek na ilość w samym UPDATE - dwie równoległe sprzedaże nie zejdą poniżej zera.
+    cursor = conn.execute(
+        """
+        UPDATE positions SET
+            cost_basis = cost_basis * (quantity - ?) / quantity,
+            quantity = quantity - ?,
+            updated_at = ?
+        WHERE user_id = ? AND asset_type = ? AND asset_name = ? AND quantity >= ? - ?
+        """,
+        (quantity, quantity, now, user_id, asset_type, asset_name, quantity, QUANTITY_EPSILON)
+    )
+    if cursor.rowcount == 0:
+        raise InsufficientQuantityError(f"Brak wystarczającej ilości '{asset_name}' w portfolio.")
+    conn.execute(
+        """
+        INSERT INTO portfolio_transactions (user_id, asset_type, asset_name, quantity, price, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (user_id, asset_type, asset_name, -quantity, price, now)
+    )
+    conn.execute(
+        "DELETE FROM positions WHERE user_id = ? AND asset_type = ? AND asset_name = ? AND quantity <= ?",
+        (user_id, asset_type, asset_name, QUANTITY_EPSILON)
+    )
+    db.bump_data_version(conn, positions_version(user_id))
+
+def get_positions(conn, user_id):
+    return conn.execute(
+        "SELECT asset_name, asset_type, quantity, cost_basis FROM positions WHERE user_id = ? ORDER BY id",
+        (user_id,)
+    ).fetchall()
+
+def get_transactions(conn, user_id):
+    """Historia transakcji użytkownika w kolejności zapisu; sprzedaże mają ujemną ilość."""
+    return conn.execute(
+        """
+        SELECT asset_type, asset_name, quantity, price, created_at FROM portfolio_transactions
+        WHERE user_id = ? ORDER BY id
+        """,
+        (user_id,)
+    ).fetchall()
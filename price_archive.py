@@ -0,0 +1,254 @@
+"""Kolumnowe archiwum historii notowań (Parquet) do długich skanów zakresów dat.
+
+Eksport zapisuje notowania z SQLite w plikach Parquet partycjonowanych po roku, posortowanych po kluczu
+(ticker / kod waluty) i dacie:
+    databases/archive/<zbiór>/year=<rok>/part.parquet
+Manifest (tabela archive_partitions) pamięta liczbę wierszy i najnowszą datę każdej pary (klucz, rok).
+Plik roku jest przepisywany w całości, gdy choć jedna para nie zgadza się z SQLite, więc archiwum jest
+zawsze zwarte - jeden plik na rok, bez dopisywanych kawałków.
+
+Odczyt (iter_batches) strumieniuje paczki kolumn z plików mapowanych w pamięci, bez krotek Pythona
+dla każdego wiersza. pyarrow jest opcjonalny - bez niego historia cen czytana jest tylko z SQLite.
+
+Uruchomienie:  python price_archive.py [--dataset stock currency] [--full]
+"""
+import argparse
+import bisect
+import datetime
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+import db
+import ingest_queue
+import logging_setup
+import metrics
+import migrations
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(db.DATABASE_PATH), 'archive')
+logger = logging.getLogger(__name__)
+
+COMPRESSION = "zstd"
+READ_BATCH_SIZE = 64 * 1024
+ROW_GROUP_SIZE = 8192
+SQL_CHUNK_SIZE = 500
+
+# zbiór (typ aktywa z migrations.PRICE_HISTORY_SOURCES) -> kolumny wartości i ich typy w Arrow
+DATASET_COLUMNS = {
+    "stock": (
+        ("open_price", "float64"), ("high_price", "float64"), ("low_price", "float64"),
+        ("close_price", "float64"), ("adj_close_price", "float64"), ("volume", "int64"),
+    ),
+    "currency": (("kurs_sredni", "float64"),),
+}
+
+def is_available():
+    return pa is not None
+
+def partition_path(dataset, year, root=ARCHIVE_DIR):
+    return os.path.join(root, dataset, f"year={year}", "part.parquet")
+
+def _schema(dataset):
+    return pa.schema(
+        [("key", pa.string()), ("date", pa.date32())]
+        + [(name, pa.type_for_alias(type_name)) for name, type_name in DATASET_COLUMNS[dataset]]
+    )
+
+def years_to_export(conn, dataset, full=False, root=ARCHIVE_DIR):
+    """{rok: klucze notowane w tym roku} dla lat, których plik nie istnieje albo w których choć jeden klucz
+    nie zgadza się z SQLite według manifestu."""
+    table_name, key_column, _, date_column = migrations.PRICE_HISTORY_SOURCES[dataset]
+    rows = conn.execute(
+        f"""
+        SELECT t.asset_key, t.year, t.row_count = a.row_count AND t.max_date = a.max_date FROM (
+            SELECT {key_column} AS asset_key, CAST(substr({date_column}, 1, 4) AS INTEGER) AS year,
+                   COUNT(*) AS row_count, MAX(substr({date_column}, 1, 10)) AS max_date
+            FROM {table_name} GROUP BY asset_key, year
+        ) t
+        LEFT JOIN archive_partitions a ON a.dataset = ? AND a.asset_key = t.asset_key AND a.year = t.year
+        """,
+        (dataset,)
+    ).fetchall()
+    keys_by_year = {}
+    stale_years = set()
+    for key, year, up_to_date in rows:
+        keys_by_year.setdefault(year, []).append(key)
+        if full or not up_to_date:
+            stale_years.add(year)
+    stale_years.update(year for year in keys_by_year if not os.path.exists(partition_path(dataset, year, root)))
+    return {year: sorted(keys_by_year[year]) for year in sorted(stale_years)}
+
+def read_partition(conn, dataset, key, year):
+    """Notowania jednego klucza z jednego roku z SQLite jako tabela Arrow posortowana po dacie."""
+    table_name, key_column, _, date_column = migrations.PRICE_HISTORY_SOURCES[dataset]
+    value_columns = [name for name, _ in DATASET_COLUMNS[dataset]]
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(
+        f"""
+        SELECT substr({date_column}, 1, 10), {", ".join(value_columns)} FROM {table_name}
+        WHERE {key_column} = ? AND {date_column} >= ? AND {date_column} < ?
+        ORDER BY {date_column}
+        """,
+        (key, f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+    ).fetchall()
+    schema = _schema(dataset)
+    columns = list(zip(*rows)) if rows else [[] for _ in range(len(schema) - 1)]
+    arrays = [pa.array([key] * len(rows), pa.string()), pa.array(columns[0], pa.string()).cast(pa.date32())]
+    arrays += [pa.array(values, field.type) for values, field in zip(columns[1:], list(schema)[2:])]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def write_partition(table, path):
+    """Zapis przez plik tymczasowy i os.replace - czytelnik nigdy nie zobaczy połowy pliku."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+def _write_manifest_rows(conn, rows):
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO archive_partitions (dataset, asset_key, year, row_count, max_date, exported_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        rows
+    )
+
+def export(db_path=db.DATABASE_PATH, datasets=None, full=False, root=ARCHIVE_DIR):
+    """Przepisuje pliki lat z nowymi lub zmienionymi notowaniami; zwraca liczbę zapisanych plików."""
+    written = 0
+    for dataset in datasets or DATASET_COLUMNS:
+        with db.connection(db_path) as conn:
+            stale = years_to_export(conn, dataset, full, root)
+        logger.info("Archiwum '%s': %d plików lat do zapisania.", dataset, len(stale),
+                    extra={"dataset": dataset, "years": len(stale)})
+        for year, keys in stale.items():
+            manifest_rows = []
+            now = datetime.datetime.now().isoformat()
+            # Klucze posortowane - grupy wierszy pliku obejmują wąskie zakresy kluczy, więc
+            # statystyki min/max pozwalają przy odczycie pominąć grupy innych tickerów.
+            # Połączenie do odczytu wraca do puli przed zapisem pliku i czekaniem na wątek zapisu.
+            with metrics.stage("archive.read", dataset=dataset), db.connection(db_path) as conn:
+                tables = [read_partition(conn, dataset, key, year) for key in keys]
+            tables = [table for table in tables if table.num_rows]
+            if not tables:
+                continue
+            with metrics.stage("archive.write", dataset=dataset):
+                write_partition(pa.concat_tables(tables), partition_path(dataset, year, root))
+            for table in tables:
+                key = table.column("key")[0].as_py()
+                max_date = table.column("date")[-1].as_py().isoformat()
+                manifest_rows.append((dataset, key, year, table.num_rows, max_date, now))
+            # Manifest dopiero po zapisaniu pliku - przerwany eksport zostanie powtórzony.
+            ingest_queue.get_queue(db_path).write(_write_manifest_rows, manifest_rows)
+            written += 1
+    return written
+
+def archived_until(conn, dataset, keys):
+    """{klucz: najnowsza data w archiwum} - notowania do tej daty można czytać z plików zamiast z SQLite.
+
+    Wiersze dopisane do SQLite z datą wcześniejszą niż zarchiwizowana (np. uzupełnione luki) trafią
+    do archiwum dopiero przy następnym eksporcie.
+    """
+    until = {}
+    keys = list(keys)
+    for i in range(0, len(keys), SQL_CHUNK_SIZE):
+        chunk = keys[i:i + SQL_CHUNK_SIZE]
+        rows = conn.execute(
+            f"""
+            SELECT asset_key, MAX(max_date) FROM archive_partitions
+            WHERE dataset = ? AND asset_key IN ({", ".join("?" * len(chunk))})
+            GROUP BY asset_key
+            """,
+            (dataset, *chunk)
+        ).fetchall()
+        until.update((key, datetime.date.fromisoformat(max_date)) for key, max_date in rows)
+    return until
+
+def first_year(conn, dataset):
+    """Najwcześniejszy rok w manifeście albo None, gdy zbiór nie był eksportowany."""
+    return conn.execute("SELECT MIN(year) FROM archive_partitions WHERE dataset = ?", (dataset,)).fetchone()[0]
+
+def files_present(conn, dataset, first_year, last_year, root=ARCHIVE_DIR):
+    """Czy w `root` są pliki wszystkich lat z zakresu, które manifest uznaje za zarchiwizowane."""
+    years = conn.execute(
+        "SELECT DISTINCT year FROM archive_partitions WHERE dataset = ? AND year BETWEEN ? AND ?",
+        (dataset, first_year, last_year)
+    ).fetchall()
+    return all(os.path.exists(partition_path(dataset, year, root)) for (year,) in years)
+
+def iter_batches(dataset, keys, start, end, columns=None, root=ARCHIVE_DIR, batch_size=READ_BATCH_SIZE):
+    """Strumień paczek (pyarrow.RecordBatch) z kolumnami key, date i `columns` dla dat z [start, end].
+
+    Czytane są tylko pliki lat z zakresu i tylko te grupy wierszy, których zakres kluczy (statystyki min/max)
+    obejmuje któryś z `keys`; pamięć zależy od batch_size, nie od długości zakresu.
+    """
+    value_columns = list(columns) if columns is not None else [name for name, _ in DATASET_COLUMNS[dataset]]
+    read_columns = ["key", "date", *value_columns]
+    sorted_keys = sorted(keys)
+    key_set = pa.array(sorted_keys, pa.string())
+    start_scalar = pa.scalar(start, pa.date32())
+    end_scalar = pa.scalar(end, pa.date32())
+    for year in range(start.year, end.year + 1):
+        path = partition_path(dataset, year, root)
+        if not os.path.exists(path):
+            continue
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        row_groups = _row_groups_with_keys(parquet_file, sorted_keys)
+        if not row_groups:
+            continue
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups, columns=read_columns):
+            mask = pc.is_in(batch.column("key"), value_set=key_set)
+            if year in (start.year, end.year):
+                dates = batch.column("date")
+                mask = pc.and_(mask, pc.and_(pc.greater_equal(dates, start_scalar), pc.less_equal(dates, end_scalar)))
+            batch = batch.filter(mask)
+            if batch.num_rows:
+                yield batch
+
+def _row_groups_with_keys(parquet_file, sorted_keys):
+    metadata = parquet_file.metadata
+    key_index = parquet_file.schema_arrow.get_field_index("key")
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(key_index).statistics
+        if stats is None or not stats.has_min_max:
+            row_groups.append(i)
+            continue
+        first = bisect.bisect_left(sorted_keys, stats.min)
+        if first < len(sorted_keys) and sorted_keys[first] <= stats.max:
+            row_groups.append(i)
+    return row_groups
+
+def read_table(dataset, keys, start, end, columns=None, root=ARCHIVE_DIR):
+    """Jak iter_batches, ale zebrane w jedną tabelę Arrow; None, gdy archiwum nie ma danych z zakresu."""
+    batches = list(iter_batches(dataset, keys, start, end, columns, root))
+    return pa.Table.from_batches(batches) if batches else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Eksport historii notowań do archiwum Parquet.")
+    parser.add_argument("--dataset", nargs="+", choices=sorted(DATASET_COLUMNS), help="Zbiory do eksportu (domyślnie wszystkie).")
+    parser.add_argument("--full", action="store_true", help="Przepisz wszystkie pliki, nie tylko zmienione.")
+    parser.add_argument("--db", default=db.DATABASE_PATH)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+
+    logging_setup.configure()
+    if not is_available():
+        logger.error("Eksport archiwum wymaga pakietu pyarrow (pip install pyarrow).")
+        return
+    try:
+        written = export(args.db, args.dataset, args.full, args.archive_dir)
+        logger.info("Zapisano %d plików w %s.", written, args.archive_dir)
+    finally:
+        ingest_queue.close_all_queues()
+        db.close_all_pools()
+
+if __name__ == "__main__":
+    main()
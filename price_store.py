@@ -0,0 +1,239 @@
+"""Zwarta historia cen w pamięci procesu, wspólna dla wycen historycznych, wykresów i API.
+
+Każde aktywo to para tablic NumPy: dni notowań (int32, dni od 1970-01-01) i ceny (float64), posortowane
+po dniu, z jednym notowaniem na dzień (przy kilku - ostatnim). Seria wczytywana jest w całości przy
+pierwszym użyciu aktywa (z archiwum Parquet, jeśli je obejmuje, i z SQLite) i trzymana w LRU
+z budżetem pamięci PRICE_STORE_MB. Cena na dany dzień to ostatnie notowanie nie późniejsze niż ten
+dzień (searchsorted) - bez zapytań do bazy i bez obiektów Pythona na każde notowanie.
+
+Serie danego typu aktywa unieważniane są przy zmianie wersji jego cen (db.prices_version) - nowe kursy
+NBP nie wyrzucają z pamięci historii akcji.
+"""
+import collections
+import datetime
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import db
+import metrics
+import migrations
+import price_archive
+
+PRICE_STORE_MB_ENV = "PRICE_STORE_MB"
+DEFAULT_BUDGET_MB = 64
+SERIES_OVERHEAD_BYTES = 200 # przybliżony narzut obiektu serii i wpisu w słowniku
+SQL_CHUNK_SIZE = 500
+
+def day_number(value):
+    """Numer dnia (dni od 1970-01-01) dla date, datetime albo pd.Timestamp."""
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+def _budget_bytes():
+    return int(float(os.environ.get(PRICE_STORE_MB_ENV, DEFAULT_BUDGET_MB)) * 2**20)
+
+class PriceSeries:
+    __slots__ = ("days", "prices")
+
+    def __init__(self, days, prices):
+        self.days = days
+        self.prices = prices
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.prices.nbytes + SERIES_OVERHEAD_BYTES
+
+    def __len__(self):
+        return len(self.days)
+
+    def latest(self):
+        return float(self.prices[-1]) if len(self.prices) else None
+
+    def at(self, day_numbers):
+        """Ceny na podane dni (ostatnie notowanie nie późniejsze niż dzień); NaN przed pierwszym notowaniem."""
+        positions = np.searchsorted(self.days, day_numbers, side="right") - 1
+        if not len(self.prices):
+            return np.full(len(positions), np.nan)
+        return np.where(positions >= 0, self.prices[np.maximum(positions, 0)], np.nan)
+
+EMPTY_SERIES = PriceSeries(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+
+def _group_series(keys, days, prices):
+    """Tablice (klucz, dzień, cena) w dowolnej kolejności -> {klucz: PriceSeries}, ostatnie notowanie dnia wygrywa."""
+    if not len(keys):
+        return {}
+    valid = ~np.isnan(prices)
+    keys, days, prices = keys[valid], days[valid], prices[valid]
+    key_codes, unique_keys = pd.factorize(keys) # haszowanie zamiast sortowania napisów
+    order = np.lexsort((days, key_codes)) # stabilne - z kilku notowań dnia ostatnie zostaje ostatnie
+    key_codes, days, prices = key_codes[order], days[order], prices[order]
+    last_of_day = np.ones(len(days), dtype=bool)
+    last_of_day[:-1] = (key_codes[1:] != key_codes[:-1]) | (days[1:] != days[:-1])
+    key_codes, days, prices = key_codes[last_of_day], days[last_of_day], prices[last_of_day]
+    bounds = np.searchsorted(key_codes, np.arange(len(unique_keys) + 1))
+    return {
+        sys.intern(str(key)): PriceSeries(days[bounds[i]:bounds[i + 1]].copy(), prices[bounds[i]:bounds[i + 1]].copy())
+        for i, key in enumerate(unique_keys)
+    }
+
+def _archive_end(conn, asset_type, keys, archive_root):
+    """(pierwszy rok, ostatni dzień) części historii czytanej z archiwum Parquet albo None.
+
+    Archiwum używane jest tylko wtedy, gdy obejmuje wszystkie klucze - resztę historii czyta SQLite.
+    """
+    if archive_root is None or not price_archive.is_available() or asset_type not in price_archive.DATASET_COLUMNS:
+        return None
+    until = price_archive.archived_until(conn, asset_type, keys)
+    first_year = price_archive.first_year(conn, asset_type)
+    if len(until) < len(keys) or first_year is None:
+        return None
+    archive_end = min(until.values())
+    if not price_archive.files_present(conn, asset_type, first_year, archive_end.year, archive_root):
+        return None
+    return first_year, archive_end
+
+def load_series(conn, asset_type, keys, archive_root=None):
+    """Pełna historia cen podanych kluczy: {klucz: PriceSeries}; klucze bez notowań nie występują w wyniku."""
+    table_name, key_column, price_column, date_column = migrations.PRICE_HISTORY_SOURCES[asset_type]
+    parts = []
+    since = None
+    archived = _archive_end(conn, asset_type, keys, archive_root)
+    if archived is not None:
+        first_year, archive_end = archived
+        table = price_archive.read_table(
+            asset_type, keys, datetime.date(first_year, 1, 1), archive_end, [price_column], root=archive_root
+        )
+        if table is not None:
+            parts.append((
+                table.column("key").to_numpy().astype(object),
+                table.column("date").to_numpy().astype("datetime64[D]").astype(np.int32),
+                table.column(price_column).to_numpy().astype(np.float64),
+            ))
+        since = (archive_end + datetime.timedelta(days=1)).isoformat()
+
+    # Zwykłe krotki zamiast sqlite3.Row - kolumny trafiają od razu do tablic NumPy.
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    for i in range(0, len(keys), SQL_CHUNK_SIZE):
+        chunk = keys[i:i + SQL_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = cursor.execute(
+            f"""
+            SELECT {key_column}, substr({date_column}, 1, 10), {price_column} FROM {table_name}
+            WHERE {key_column} IN ({placeholders}) AND {date_column} >= ?
+            ORDER BY {key_column}, {date_column}
+            """,
+            (*chunk, since or "")
+        ).fetchall()
+        if rows:
+            row_keys, row_days, row_prices = zip(*rows)
+            parts.append((
+                np.array(row_keys, dtype=object),
+                np.array(row_days, dtype="datetime64[D]").astype(np.int32),
+                np.array(row_prices, dtype=np.float64),
+            ))
+    if not parts:
+        return {}
+    return _group_series(*(np.concatenate(column) for column in zip(*parts)))
+
+class PriceStore:
+    """LRU serii cen {(typ aktywa, klucz): PriceSeries} z budżetem pamięci w bajtach.
+
+    Klucze bez notowań też są zapamiętywane (pusta seria), żeby nie pytać o nie bazy przy każdym wykresie.
+    Seria większa niż cały budżet jest zwracana, ale nie zostaje w pamięci. Zwracane tablice są wspólne
+    dla wszystkich wątków - nie wolno ich modyfikować.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else _budget_bytes()
+        self._lock = threading.Lock()
+        self._series = collections.OrderedDict()
+        self._nbytes = 0
+        self._versions = {}
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._series)
+
+    def _check_version(self, conn, asset_type):
+        version = db.get_data_version(conn, db.prices_version(asset_type))
+        with self._lock:
+            if version != self._versions.get(asset_type):
+                self._clear(asset_type)
+                self._versions[asset_type] = version
+        return version
+
+    def _clear(self, asset_type=None):
+        if asset_type is None:
+            self._series.clear()
+            self._nbytes = 0
+        else:
+            for cache_key in [k for k in self._series if k[0] == asset_type]:
+                self._nbytes -= self._series.pop(cache_key).nbytes
+        metrics.set_gauge("price_store_bytes", self._nbytes)
+
+    def _put(self, cache_key, series):
+        previous = self._series.pop(cache_key, None)
+        if previous is not None:
+            self._nbytes -= previous.nbytes
+        self._series[cache_key] = series
+        self._nbytes += series.nbytes
+        while self._nbytes > self.budget_bytes and self._series:
+            _, evicted = self._series.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+            metrics.inc("price_store_evictions_total")
+
+    def get_series(self, conn, asset_type, keys, archive_root=None):
+        """{klucz: PriceSeries} dla podanych kluczy; brakujące w pamięci wczytywane jednym przebiegiem."""
+        version = self._check_version(conn, asset_type)
+        result = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                series = self._series.get((asset_type, key))
+                if series is None:
+                    missing.append(key)
+                else:
+                    self._series.move_to_end((asset_type, key))
+                    result[key] = series
+        metrics.inc("cache_hits_total", len(result), cache="price_store")
+        if not missing:
+            return result
+
+        metrics.inc("cache_misses_total", len(missing), cache="price_store")
+        with metrics.stage("price_store.load"):
+            loaded = load_series(conn, asset_type, missing, archive_root)
+        with self._lock:
+            # Wynik wczytany przy starej wersji cen oddajemy wywołującemu, ale nie zapamiętujemy.
+            keep = version == self._versions.get(asset_type)
+            for key in missing:
+                series = loaded.get(key, EMPTY_SERIES)
+                result[key] = series
+                if keep:
+                    self._put((asset_type, sys.intern(key)), series)
+            metrics.set_gauge("price_store_bytes", self._nbytes)
+        return result
+
+    def daily_prices(self, conn, asset_type, keys, start, end, archive_root=None):
+        """Macierz dzień x klucz (NumPy) z cenami na koniec każdego dnia z [start, end]; NaN przed pierwszym notowaniem."""
+        keys = list(keys)
+        day_numbers = np.arange(day_number(start), day_number(end) + 1, dtype=np.int32)
+        series = self.get_series(conn, asset_type, keys, archive_root)
+        matrix = np.empty((len(day_numbers), len(keys)))
+        for j, key in enumerate(keys):
+            matrix[:, j] = series[key].at(day_numbers)
+        return matrix
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self._versions.clear()
+
+store = PriceStore()
@@ -1,56 +1,53 @@
 import sqlite3
 import requests
 import datetime
-import time
+import argparse
 import os
+import sys
 import json
+import logging
+import operator
+from concurrent.futures import ThreadPoolExecutor
+
+# Go up two directories to the project root, so the shared 'db' module can be imported
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import fx
+import logging_setup
+import metrics
+from scraping import http_client, sources
+
+logger = logging.getLogger(__name__)
 
 DB_NAME = "maindb.db"
 TABLE_NAME_NBP = "kursy_walut_nbp"
+NBP_API_URL = "http://api.nbp.pl/api/exchangerates"
+NBP_MAX_RANGE_DAYS = 93 # Maksymalna długość zakresu dat obsługiwana przez /tables/A/{start}/{end}/
+BACKFILL_WORKERS = 4
+WATERMARK_SOURCE = "nbp"
+DEFAULT_LOOKBACK_DAYS = 7
+# Waluta bez notowań tyle dni przed najnowszym zapisem uznawana jest za wycofaną z tabeli A.
+WITHDRAWN_AFTER_DAYS = 14
+FAILED_WINDOW = object() # odpowiedź okna, którego nie udało się pobrać
 
-def get_db_path():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Go up two directories to the project root, then into 'databases'
-    project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
-    return os.path.join(project_root, 'databases', DB_NAME)
-
-def create_nbp_currency_table(db_path):
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME_NBP} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data_notowania DATE NOT NULL,
-                nazwa_waluty TEXT NOT NULL,
-                kod_waluty TEXT NOT NULL,
-                kurs_sredni REAL NOT NULL,
-                UNIQUE(data_notowania, kod_waluty) -- Zapobiega duplikatom dla tej samej waluty i dnia
-            )
-        """)
-        conn.commit()
-        print(f"Tabela '{TABLE_NAME_NBP}' sprawdzona/utworzona.")
-    except sqlite3.Error as e:
-        print(f"Błąd SQLite podczas tworzenia tabeli '{TABLE_NAME_NBP}': {e}")
-    finally:
-        if conn:
-            conn.close()
-
-def fetch_nbp_rates_for_date(date_obj):
+def fetch_nbp_rates_for_date(date_obj, base_url=NBP_API_URL, client=None):
     date_str = date_obj.strftime("%Y-%m-%d")
-    url = f"http://api.nbp.pl/api/exchangerates/tables/A/{date_str}/?format=json"
-    print(f"Pobieranie kursów walut NBP dla {date_str} z {url}...")
+    url = f"{base_url}/tables/A/{date_str}/?format=json"
+    logger.info(f"Pobieranie kursów walut NBP dla {date_str} z {url}...")
+    client = client or http_client.get_client()
 
     try:
-        response = requests.get(url, timeout=10)
+        response = client.get(url, timeout=10)
         response.raise_for_status()
         
         data = response.json()
         if not data or not isinstance(data, list) or not data[0].get('rates'):
-            print(f"Otrzymano nieoczekiwany format danych dla {date_str}.")
+            logger.warning(f"Otrzymano nieoczekiwany format danych dla {date_str}.")
             return []
-            
+
         rates_data = []
         for rate_info in data[0]['rates']:
             rates_data.append((
@@ -59,57 +56,213 @@ def fetch_nbp_rates_for_date(date_obj):
                 rate_info['code'],          
                 float(rate_info['mid'])   
             ))
+        metrics.inc("rows_fetched_total", len(rates_data), source="nbp")
         return rates_data
-        
+
     except requests.exceptions.HTTPError as http_err:
         if response.status_code == 404:
-            print(f"Brak danych (404) dla {date_str} w NBP API (prawdopodobnie weekend lub święto).")
+            logger.info(f"Brak danych (404) dla {date_str} w NBP API (prawdopodobnie weekend lub święto).")
         else:
-            print(f"Błąd HTTP podczas pobierania danych NBP dla {date_str}: {http_err}")
+            logger.error(f"Błąd HTTP podczas pobierania danych NBP dla {date_str}: {http_err}")
         return []
     except requests.exceptions.RequestException as e:
-        print(f"Błąd połączenia podczas pobierania danych NBP dla {date_str}: {e}")
+        logger.error(f"Błąd połączenia podczas pobierania danych NBP dla {date_str}: {e}")
         return []
     except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
-        print(f"Błąd przetwarzania danych JSON z NBP API dla {date_str}: {e}")
+        logger.error(f"Błąd przetwarzania danych JSON z NBP API dla {date_str}: {e}")
         return []
 
 
-def insert_nbp_currency_data(db_path, currency_data_list):
-    if not currency_data_list:
-        return
+def split_date_range(start_date, end_date, max_days=NBP_MAX_RANGE_DAYS):
+    """Dzieli zakres dat (włącznie) na okna nie dłuższe niż max_days dni."""
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + datetime.timedelta(days=max_days - 1), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + datetime.timedelta(days=1)
+    return windows
+
+def fetch_nbp_window(start_date, end_date, client=None, base_url=NBP_API_URL):
+    """Pobiera wszystkie tabele A z zakresu dat jednym zapytaniem warunkowym (maks. NBP_MAX_RANGE_DAYS dni).
+
+    Zwraca (url, odpowiedź). Odpowiedź jest None, gdy nie ma czego zapisywać (brak danych albo tabele
+    niezmienione od ostatniego pobrania), a FAILED_WINDOW przy błędzie; w przeciwnym razie po zapisie
+    należy przekazać ją do client.remember(url, odpowiedź).
+    """
+    start_str = start_date.strftime("%Y-%m-%d")
+    end_str = end_date.strftime("%Y-%m-%d")
+    url = f"{base_url}/tables/A/{start_str}/{end_str}/?format=json"
+    client = client or http_client.get_client()
 
-    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        sql = f"""
-            INSERT OR IGNORE INTO {TABLE_NAME_NBP} (
-                data_notowania, nazwa_waluty, kod_waluty, kurs_sredni
-            ) VALUES (?, ?, ?, ?)
+        response = client.get_if_changed(url, timeout=30)
+        if response is None:
+            logger.info(f"Tabele NBP dla zakresu {start_str} - {end_str} nie zmieniły się od ostatniego pobrania.")
+            return url, None
+        if response.status_code == 404:
+            logger.info(f"Brak danych (404) w NBP API dla zakresu {start_str} - {end_str}.")
+            return url, None
+        response.raise_for_status()
+        return url, response
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Błąd podczas pobierania danych NBP dla zakresu {start_str} - {end_str}: {e}")
+        return url, FAILED_WINDOW
+
+def parse_nbp_tables(response):
+    """Krotki (data, nazwa waluty, kod, kurs średni) ze wszystkich tabel A w odpowiedzi."""
+    rates_data = []
+    for table in response.json():
+        table_date = table['effectiveDate']
+        for rate_info in table['rates']:
+            rates_data.append((
+                table_date,
+                rate_info['currency'],
+                rate_info['code'],
+                float(rate_info['mid'])
+            ))
+    return rates_data
+
+def fetch_nbp_windows(start_date, end_date, client, max_workers=BACKFILL_WORKERS, base_url=NBP_API_URL):
+    """Pobiera tabele z dowolnego zakresu dat równolegle (okna po NBP_MAX_RANGE_DAYS dni); lista (url, odpowiedź)."""
+    windows = split_date_range(start_date, end_date)
+    logger.info(f"Pobieranie kursów NBP od {start_date} do {end_date} w {len(windows)} oknach ({max_workers} wątków)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda window: fetch_nbp_window(window[0], window[1], client, base_url),
+            windows
+        ))
+
+@sources.register
+class NbpSource(sources.Source):
+    """Tabela A kursów średnich NBP: dni od ostatniego zapisu (albo podany zakres), okna pobierane równolegle."""
+
+    name = "nbp"
+    interval = 60 * 60
+    timeout = 5 * 60
+    # Tabela z jednego dnia nie jest dzielona między paczki - watermark oznacza dzień pobrany dla wszystkich walut.
+    chunk_key = staticmethod(operator.itemgetter(0))
+
+    def __init__(self, start_date=None, end_date=None, max_workers=BACKFILL_WORKERS, base_url=NBP_API_URL):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.max_workers = max_workers
+        self.base_url = base_url
+
+    def fetch(self, db_path, client):
+        end_date = self.end_date or datetime.date.today()
+        if self.start_date:
+            date_range = (self.start_date, end_date)
+        else:
+            date_range = missing_date_range(load_watermarks(db_path), end_date)
+            if date_range is None:
+                logger.info("Brak nowych danych kursów walut NBP do pobrania.")
+                return None
+        return fetch_nbp_windows(*date_range, client, self.max_workers, self.base_url)
+
+    def parse(self, windows):
+        """Wiersze kolejnych okien (od najstarszego) do pierwszego okna, którego nie udało się pobrać.
+
+        Watermarki przesuwają się z zapisanymi wierszami, więc późniejsze okna zapisane za luką
+        ukryłyby ją przed następnym uruchomieniem - zostaną pobrane ponownie razem z nią.
         """
-        cursor.executemany(sql, currency_data_list)
-        conn.commit()
-        print(f"Dodano/zignorowano {cursor.rowcount} wierszy do tabeli '{TABLE_NAME_NBP}'.")
-    except sqlite3.Error as e:
-        print(f"Błąd SQLite podczas wstawiania danych do '{TABLE_NAME_NBP}': {e}")
-    finally:
-        if conn:
-            conn.close()
-
-def main():
-    db_path = get_db_path()
-    create_nbp_currency_table(db_path)
-
-    today = datetime.date.today()
-    print(f"\nRozpoczynam pobieranie danych kursów walut NBP za ostatnie 7 dni (do {today.strftime('%Y-%m-%d')}).")
-    for i in range(7):
-        target_date = today - datetime.timedelta(days=i)
-        
-        nbp_rates = fetch_nbp_rates_for_date(target_date)
-        if nbp_rates:
-            insert_nbp_currency_data(db_path, nbp_rates)
-        time.sleep(0.2)
+        for i, (url, response) in enumerate(windows):
+            if response is None:
+                continue
+            rows = None
+            if response is not FAILED_WINDOW:
+                try:
+                    # Okno parsowane w całości przed oddaniem wierszy - błąd w środku nie zapisze połowy okna.
+                    rows = parse_nbp_tables(response)
+                except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+                    logger.error(f"Błąd przetwarzania danych JSON z NBP API ({url}): {e}")
+            if rows is None:
+                skipped = len(windows) - i - 1
+                if skipped:
+                    logger.warning(f"Pominięto {skipped} późniejszych okien NBP - zostaną pobrane przy następnym uruchomieniu.")
+                # Okna niezapisane nie mogą zostać zapamiętane jako "bez zmian".
+                windows[i:] = [(window_url, None) for window_url, _ in windows[i:]]
+                return
+            yield from rows
+
+    def write(self, conn, rows):
+        return write_nbp_rows(conn, rows)
+
+    def after_write(self, db_path, client, windows):
+        fx.rate_cache.invalidate()
+        for url, response in windows or ():
+            if response is not None:
+                client.remember(url, response)
+
+def backfill_nbp_rates(db_path, start_date, end_date, max_workers=BACKFILL_WORKERS, base_url=NBP_API_URL):
+    """Pobiera kursy z dowolnego zakresu dat równolegle i zapisuje je paczkami pełnych dni."""
+    return NbpSource(start_date, end_date, max_workers, base_url).run(db_path)
+
+
+def write_nbp_rows(conn, currency_data_list):
+    """Zapis kursów w bieżącej transakcji (wątek kolejki zapisu); zwraca liczbę wstawionych wierszy."""
+    sql = f"""
+        INSERT OR IGNORE INTO {TABLE_NAME_NBP} (
+            data_notowania, nazwa_waluty, kod_waluty, kurs_sredni
+        ) VALUES (?, ?, ?, ?)
+    """
+    cursor = conn.executemany(sql, currency_data_list)
+    db.update_watermarks(conn, WATERMARK_SOURCE, currency_data_list, key_index=2, date_index=0)
+    db.update_latest_prices(conn, "currency", currency_data_list, key_index=2, price_index=3, date_index=0)
+    db.update_asset_catalog(conn, "currency", currency_data_list, key_index=2, name_index=1)
+    return cursor.rowcount
+
+def insert_nbp_currency_data(db_path, currency_data_list):
+    """Zapisuje gotowe kursy przez kolejkę zapisu (bez pobierania); zwraca True, gdy zapis się udał."""
+    if not currency_data_list:
+        return False
+    try:
+        NbpSource().store(db_path, (None, currency_data_list))
+        return True
+    except sqlite3.Error:
+        return False
+
+def load_watermarks(db_path):
+    with db.transaction(db_path) as conn:
+        db.seed_watermarks(conn, WATERMARK_SOURCE, TABLE_NAME_NBP, "kod_waluty", "data_notowania")
+        return db.get_watermarks(conn, WATERMARK_SOURCE)
+
+def missing_date_range(watermarks, today, lookback_days=DEFAULT_LOOKBACK_DAYS, withdrawn_after_days=WITHDRAWN_AFTER_DAYS):
+    """Zwraca (start, end) dni brakujących od ostatniego zapisu lub None, gdy nie ma czego pobierać.
+
+    Start liczony jest dla każdej waluty osobno: pierwszy dzień po jej watermarku, najwcześniejszy
+    z walut notowanych w ostatnich withdrawn_after_days dniach przed najnowszym zapisem. Waluta
+    wycofana z tabeli A dawniej nie cofa startu przy każdym uruchomieniu.
+    """
+    if watermarks:
+        newest = max(watermarks.values())
+        active_since = newest - datetime.timedelta(days=withdrawn_after_days)
+        start_date = min(day for day in watermarks.values() if day > active_since) + datetime.timedelta(days=1)
+    else:
+        start_date = today - datetime.timedelta(days=lookback_days - 1)
+    if start_date > today:
+        return None
+    # NBP nie publikuje tabel w weekendy - luka złożona z samych sobót i niedziel nic nie wniesie.
+    if all((start_date + datetime.timedelta(days=i)).weekday() >= 5 for i in range((today - start_date).days + 1)):
+        return None
+    return start_date, today
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pobieranie kursów walut NBP (tabela A).")
+    parser.add_argument("--start", type=parse_date,
+                        help="Początek zakresu RRRR-MM-DD (domyślnie: od ostatniego zapisanego dnia).")
+    parser.add_argument("--end", type=parse_date, help="Koniec zakresu RRRR-MM-DD (domyślnie dziś).")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Liczba równoległych zapytań.")
+    args = parser.parse_args(argv)
+
+    db_path = db.DATABASE_PATH
+    db.init_schema(db_path)
+    logger.info("Rozpoczynam pobieranie danych kursów walut NBP.")
+    NbpSource(args.start, args.end, max_workers=args.workers).run(db_path)
 
 if __name__ == "__main__":
+    logging_setup.configure()
     main()
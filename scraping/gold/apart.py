@@ -1,41 +1,34 @@
 import sqlite3
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
 import datetime
-import time
+import logging
 import os
+import sys
 import re
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Go up two directories to the project root, so the shared 'db' module can be imported
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import logging_setup
+import metrics
+from scraping import http_client, sources
+
+logger = logging.getLogger(__name__)
+
 DB_NAME = "maindb.db"
 TABLE_NAME_APART = "ceny_skupu_apart"
 URL_APART_SKUP = "https://mennica.apart.pl/skup"
-
-def get_db_path():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Go up two directories to the project root, then into 'databases'
-    project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
-    return os.path.join(project_root, 'databases', DB_NAME)
-
-def create_apart_purchase_prices_table(db_path):
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME_APART} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                kategoria_produktu TEXT,
-                nazwa_produktu TEXT NOT NULL,
-                cena_skupu REAL NOT NULL,
-                timestamp_pobrania TEXT NOT NULL
-            )
-        """)
-        conn.commit()
-        print(f"Tabela '{TABLE_NAME_APART}' sprawdzona/utworzona.")
-    except sqlite3.Error as e:
-        print(f"Błąd SQLite podczas tworzenia tabeli '{TABLE_NAME_APART}': {e}")
-    finally:
-        if conn:
-            conn.close()
+TABLE_CLASS = re.compile(r'table\s')
+LOOKUP_CHUNK_SIZE = 500
 
 def clean_price(price_str):
     """Czyści string z ceną i konwertuje na float."""
@@ -45,39 +38,114 @@ def clean_price(price_str):
     try:
         return float(cleaned)
     except ValueError:
-        print(f"Nie udało się przekonwertować ceny: '{price_str}' na liczbę.")
+        logger.warning(f"Nie udało się przekonwertować ceny: '{price_str}' na liczbę.")
         return None
 
-def scrape_apart_purchase_prices():
-    """Scrapuje ceny skupu ze strony Mennicy Apart."""
-    print(f"Pobieranie danych ze strony: {URL_APART_SKUP}")
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+def fetch_apart_page(client=None, url=URL_APART_SKUP):
+    """Pobiera stronę skupu zapytaniem warunkowym. Zwraca odpowiedź albo None, gdy strona się nie zmieniła.
+
+    Błąd pobierania (requests.RequestException) leci dalej - Source.with_retries ponawia pobranie
+    i liczy błąd w metrykach, zamiast brać go za "bez zmian".
+    """
+    logger.info(f"Pobieranie danych ze strony: {url}")
+    client = client or http_client.get_client()
+
+    response = client.get_if_changed(url, timeout=15)
+    if response is None:
+        logger.info("Strona skupu nie zmieniła się od ostatniego pobrania.")
+        return None
+    response.raise_for_status()
+    return response
 
+def scrape_apart_purchase_prices(client=None):
+    """Scrapuje ceny skupu ze strony Mennicy Apart (pusta lista, gdy strona się nie zmieniła albo nie dała się pobrać)."""
     try:
-        response = requests.get(URL_APART_SKUP, headers=headers, timeout=15)
-        response.raise_for_status()
+        response = fetch_apart_page(client)
     except requests.exceptions.RequestException as e:
-        print(f"Błąd podczas pobierania strony {URL_APART_SKUP}: {e}")
+        logger.error(f"Błąd podczas pobierania strony {URL_APART_SKUP}: {e}")
         return []
+    if response is None:
+        return []
+    return parse_apart_page(response.content)
+
+def _new_parse_stats():
+    return {"accordion": False, "panels": 0, "tables": 0, "rows": 0, "bad_rows": 0, "products": 0}
+
+def _product_row(category_name, product_name, price_str, current_timestamp, stats):
+    price_value = clean_price(price_str)
+    if product_name and price_value is not None:
+        stats["products"] += 1
+        return (category_name, product_name, price_value, current_timestamp)
+    if not product_name:
+        logger.warning(f"Pominięto wiersz z pustą nazwą produktu w kategorii '{category_name}'.")
+    if price_value is None and price_str:
+        logger.warning(f"Pominięto produkt '{product_name}' z powodu niepoprawnej ceny '{price_str}'.")
+    return None
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+def _lxml_text(element):
+    # Odpowiednik get_text(strip=True) z BeautifulSoup.
+    return "".join(text.strip() for text in element.itertext())
+
+def _lxml_has_class(class_name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {class_name} ")'
+
+def parse_with_lxml(content, current_timestamp):
+    """Parser w C (lxml): XPath tylko w obrębie #accordionProductDetails. Zwraca (wiersze, statystyki)."""
+    stats = _new_parse_stats()
     scraped_data = []
-    current_timestamp = datetime.datetime.now().isoformat()
+    if isinstance(content, bytes):
+        # lxml bez deklaracji kodowania w HTML przyjąłby latin-1; dekodujemy tak jak BeautifulSoup.
+        content = UnicodeDammit(content, ["utf-8"]).unicode_markup
+    tree = lxml.html.fromstring(content)
+    containers = tree.xpath('//div[@id="accordionProductDetails"]')
+    if not containers:
+        return scraped_data, stats
+    stats["accordion"] = True
+
+    for panel in containers[0].xpath('.//div[@class="panel panel-default"]'):
+        stats["panels"] += 1
+        category_name = "Nieznana kategoria"
+        links = panel.xpath(f'.//div[{_lxml_has_class("panel-heading")}]//h4[{_lxml_has_class("panel-title")}]//a')
+        if links:
+            category_name = _lxml_text(links[0])
+            icons = links[0].xpath(f'.//i[{_lxml_has_class("indicator")}]')
+            if icons:
+                category_name = category_name.replace(_lxml_text(icons[0]), "").strip()
+
+        tables = [table for table in panel.iter('table') if TABLE_CLASS.search(table.get('class', ''))]
+        if not tables:
+            logger.warning(f"Nie znaleziono tabeli danych dla kategorii: {category_name}")
+            continue
+        stats["tables"] += 1
+        tbodies = tables[0].xpath('.//tbody')
+        if not tbodies:
+            logger.warning(f"Nie znaleziono tbody w tabeli dla kategorii: {category_name}")
+            continue
+
+        for row in tbodies[0].iter('tr'):
+            stats["rows"] += 1
+            cols = row.xpath('.//td')
+            if len(cols) != 2:
+                stats["bad_rows"] += 1
+                continue
+            product = _product_row(category_name, _lxml_text(cols[0]), _lxml_text(cols[1]), current_timestamp, stats)
+            if product:
+                scraped_data.append(product)
+    return scraped_data, stats
 
+def parse_with_bs4(content, current_timestamp):
+    """Parser zapasowy (czysty Python, html.parser), gdy lxml nie jest zainstalowany. Zwraca (wiersze, statystyki)."""
+    stats = _new_parse_stats()
+    scraped_data = []
+    # SoupStrainer buduje drzewo tylko dla kontenera z cenami, a nie dla całej strony.
+    soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer('div', id='accordionProductDetails'))
     accordion_container = soup.find('div', id='accordionProductDetails')
     if not accordion_container:
-        print("Nie znaleziono głównego kontenera 'accordionProductDetails'. Strona mogła zmienić strukturę.")
-        return []
-
-    panels = accordion_container.find_all('div', class_='panel panel-default')
-    if not panels:
-        print("Nie znaleziono paneli z kategoriami produktów.")
-        return []
+        return scraped_data, stats
+    stats["accordion"] = True
 
-    for panel in panels:
+    for panel in accordion_container.find_all('div', class_='panel panel-default'):
+        stats["panels"] += 1
         category_name = "Nieznana kategoria"
         panel_heading = panel.find('div', class_='panel-heading')
         if panel_heading:
@@ -88,74 +156,142 @@ def scrape_apart_purchase_prices():
                 if indicator_icon:
                     category_name = category_name.replace(indicator_icon.get_text(strip=True), "").strip()
 
-        data_table = panel.find('table', class_=re.compile(r'table\s'))
+        data_table = panel.find('table', class_=TABLE_CLASS)
         if not data_table:
-            print(f"Nie znaleziono tabeli danych dla kategorii: {category_name}")
+            logger.warning(f"Nie znaleziono tabeli danych dla kategorii: {category_name}")
             continue
-
+        stats["tables"] += 1
         tbody = data_table.find('tbody')
         if not tbody:
-            print(f"Nie znaleziono tbody w tabeli dla kategorii: {category_name}")
+            logger.warning(f"Nie znaleziono tbody w tabeli dla kategorii: {category_name}")
             continue
-        
-        rows = tbody.find_all('tr')
-        for row in rows:
+
+        for row in tbody.find_all('tr'):
+            stats["rows"] += 1
             cols = row.find_all('td')
-            if len(cols) == 2:
-                product_name = cols[0].get_text(strip=True)
-                price_str = cols[1].get_text(strip=True)
-                
-                price_value = clean_price(price_str)
-
-                if product_name and price_value is not None:
-                    scraped_data.append((
-                        category_name,
-                        product_name,
-                        price_value,
-                        current_timestamp
-                    ))
-                else:
-                    if not product_name:
-                        print(f"Pominięto wiersz z pustą nazwą produktu w kategorii '{category_name}'.")
-                    if price_value is None and price_str:
-                         print(f"Pominięto produkt '{product_name}' z powodu niepoprawnej ceny '{price_str}'.")
+            if len(cols) != 2:
+                stats["bad_rows"] += 1
+                continue
+            product = _product_row(category_name, cols[0].get_text(strip=True), cols[1].get_text(strip=True),
+                                   current_timestamp, stats)
+            if product:
+                scraped_data.append(product)
+    return scraped_data, stats
 
+def check_page_structure(stats):
+    """Lista problemów wskazujących, że strona zmieniła układ (wtedy lepiej nic nie zapisać niż zapisać śmieci)."""
+    if not stats["accordion"]:
+        return ["nie znaleziono głównego kontenera 'accordionProductDetails'"]
+    problems = []
+    if not stats["panels"]:
+        problems.append("brak paneli z kategoriami produktów")
+    elif not stats["tables"]:
+        problems.append("żaden panel nie zawiera tabeli z cenami")
+    if stats["rows"] and stats["bad_rows"] * 2 > stats["rows"]:
+        problems.append(f"{stats['bad_rows']} z {stats['rows']} wierszy nie ma dwóch kolumn (nazwa, cena)")
+    elif stats["tables"] and not stats["products"]:
+        problems.append("nie odczytano żadnej ceny")
+    return problems
+
+def parse_apart_page(content, current_timestamp=None):
+    """Wyciąga (kategoria, produkt, cena, timestamp) z HTML strony skupu; pusta lista, gdy układ strony się zmienił."""
+    current_timestamp = current_timestamp or datetime.datetime.now().isoformat()
+    parser = parse_with_lxml if lxml is not None else parse_with_bs4
+    scraped_data, stats = parser(content, current_timestamp)
+
+    problems = check_page_structure(stats)
+    if problems:
+        for problem in problems:
+            logger.error(f"Strona mogła zmienić strukturę: {problem}.", extra={"source": "apart", "stats": stats})
+        metrics.inc("page_structure_errors_total", source="apart")
+        return []
     return scraped_data
 
+def latest_content_hashes(conn, product_names):
+    """{(kategoria, produkt): skrót treści najnowszego zapisanego wiersza} dla podanych produktów."""
+    names = list(set(product_names))
+    latest = {}
+    for i in range(0, len(names), LOOKUP_CHUNK_SIZE):
+        chunk = names[i:i + LOOKUP_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(
+            f"""
+            SELECT kategoria_produktu, nazwa_produktu, content_hash, MAX(timestamp_pobrania) FROM {TABLE_NAME_APART}
+            WHERE nazwa_produktu IN ({placeholders}) GROUP BY kategoria_produktu, nazwa_produktu
+            """,
+            chunk
+        ).fetchall()
+        latest.update({(row[0], row[1]): row[2] for row in rows})
+    return latest
+
+def filter_changed_prices(conn, data_list):
+    """Zostawia tylko produkty, których (kategoria, nazwa, cena) różni się od ostatniego zapisu; dokleja skrót treści."""
+    latest = latest_content_hashes(conn, [row[1] for row in data_list])
+    changed_rows = []
+    for category, name, price, timestamp in data_list:
+        row_hash = db.row_hash(category, name, price)
+        if latest.get((category, name)) != row_hash:
+            changed_rows.append((category, name, price, timestamp, row_hash))
+            latest[(category, name)] = row_hash
+    return changed_rows
+
+def write_apart_rows(conn, data_list):
+    """Zapis zmienionych cen w bieżącej transakcji (wątek kolejki zapisu); zwraca zapisane wiersze."""
+    # Porównanie ze skrótami w tej samej transakcji - dwie paczki w jednym commicie widzą nawzajem swoje zapisy.
+    changed_rows = filter_changed_prices(conn, data_list)
+    sql = f"""
+        INSERT INTO {TABLE_NAME_APART} (
+            kategoria_produktu, nazwa_produktu, cena_skupu, timestamp_pobrania, content_hash
+        ) VALUES (?, ?, ?, ?, ?)
+    """
+    conn.executemany(sql, changed_rows)
+    db.update_latest_prices(conn, "gold", changed_rows, key_index=1, price_index=2, date_index=3)
+    db.update_asset_catalog(conn, "gold", changed_rows, key_index=1)
+    return changed_rows
+
+@sources.register
+class ApartSource(sources.Source):
+    """Ceny skupu Mennicy Apart: jedna strona HTML pobierana warunkowo, zapisywane tylko zmienione ceny."""
+
+    name = "apart"
+    interval = 15 * 60
+    timeout = 2 * 60
+    fetch_attempts = 3
+
+    def fetch(self, db_path, client):
+        return fetch_apart_page(client)
+
+    def parse(self, response):
+        rows = parse_apart_page(response.content)
+        if not rows:
+            logger.warning("Nie udało się pobrać żadnych danych z Mennicy Apart.")
+        return rows
+
+    def write(self, conn, rows):
+        return len(write_apart_rows(conn, rows))
+
+    def after_write(self, db_path, client, response):
+        # Walidatory strony zapamiętujemy dopiero po udanym zapisie.
+        if response is not None:
+            client.remember(URL_APART_SKUP, response)
+
 def insert_apart_data_to_db(db_path, data_list):
+    """Zapisuje gotowe ceny przez kolejkę zapisu (bez pobierania); zwraca True, gdy zapis się udał."""
     if not data_list:
-        print("Brak danych do wstawienia.")
-        return
-
-    conn = None
+        logger.info("Brak danych do wstawienia.")
+        return False
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        sql = f"""
-            INSERT INTO {TABLE_NAME_APART} (
-                kategoria_produktu, nazwa_produktu, cena_skupu, timestamp_pobrania
-            ) VALUES (?, ?, ?, ?)
-        """
-        cursor.executemany(sql, data_list)
-        conn.commit()
-        print(f"Dodano {cursor.rowcount} wierszy do tabeli '{TABLE_NAME_APART}'.")
-    except sqlite3.Error as e:
-        print(f"Błąd SQLite podczas wstawiania danych do '{TABLE_NAME_APART}': {e}")
-    finally:
-        if conn:
-            conn.close()
+        ApartSource().store(db_path, (None, data_list))
+        return True
+    except sqlite3.Error:
+        return False
 
 def main():
-    db_path = get_db_path()
-    create_apart_purchase_prices_table(db_path)
-
-    print(f"\nRozpoczynam scrapowanie cen skupu z Mennicy Apart...")
-    apart_prices_data = scrape_apart_purchase_prices()
-
-    if apart_prices_data:
-        insert_apart_data_to_db(db_path, apart_prices_data)
-    else:
-        print("Nie udało się pobrać żadnych danych z Mennicy Apart.")
+    db_path = db.DATABASE_PATH
+    db.init_schema(db_path)
+    logger.info("Rozpoczynam scrapowanie cen skupu z Mennicy Apart...")
+    ApartSource().run(db_path)
 
 if __name__ == "__main__":
+    logging_setup.configure()
     main()
@@ -0,0 +1,220 @@
+"""Wspólny klient HTTP dla scraperów.
+
+- jedna requests.Session z pulą połączeń keep-alive (bez nowego TCP/TLS na każde zapytanie),
+- ponawianie błędów przejściowych (429, 5xx, zerwane połączenie) z wykładniczym opóźnieniem i losowym jitterem,
+- limit zapytań na host (token bucket) zamiast stałego time.sleep,
+- zapytania warunkowe (ETag / If-Modified-Since) oraz skrót treści, żeby niezmienionych stron nie parsować ponownie.
+"""
+import datetime
+import hashlib
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import db
+import ingest_queue
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 15
+POOL_MAXSIZE = 8
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# host -> (zapytań na sekundę, pojemność kubełka)
+HOST_RATE_LIMITS = {
+    "api.nbp.pl": (10.0, 10),
+    "mennica.apart.pl": (1.0, 2),
+}
+DEFAULT_RATE_LIMIT = (5.0, 5)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+class TokenBucket:
+    """Limit zapytań: `rate` tokenów na sekundę, najwyżej `capacity` naraz. acquire() czeka na wolny token."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Opóźnienie przed ponowieniem nr `attempt` (od 0): losowe z [0, base * 2^attempt] ("full jitter")."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if value and value.isdigit():
+        return min(float(value), BACKOFF_MAX)
+    return None
+
+class MemoryValidatorStore:
+    """Walidatory (ETag, Last-Modified, skrót treści) trzymane w pamięci procesu."""
+
+    def __init__(self):
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            return self._validators.get(url)
+
+    def put(self, url, etag, last_modified, content_hash):
+        with self._lock:
+            self._validators[url] = (etag, last_modified, content_hash)
+
+class DbValidatorStore:
+    """Walidatory zapisywane w tabeli http_validators, więc przetrwają między uruchomieniami scraperów."""
+
+    def __init__(self, db_path=db.DATABASE_PATH):
+        self.db_path = db_path
+
+    def get(self, url):
+        with db.connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, content_hash FROM http_validators WHERE url = ?", (url,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, url, etag, last_modified, content_hash):
+        ingest_queue.get_queue(self.db_path).write(
+            _write_validator_rows, [(url, etag, last_modified, content_hash, datetime.datetime.now().isoformat())]
+        )
+
+def _write_validator_rows(conn, rows):
+    conn.executemany(
+        "INSERT OR REPLACE INTO http_validators (url, etag, last_modified, content_hash, updated_at) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+class HttpClient:
+    def __init__(self, validator_store=None, rate_limits=None, max_retries=MAX_RETRIES,
+                 timeout=DEFAULT_TIMEOUT, pool_maxsize=POOL_MAXSIZE, backoff_base=BACKOFF_BASE):
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.validators = validator_store or MemoryValidatorStore()
+        self.rate_limits = dict(HOST_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlsplit(url).hostname or ""
+        with self._buckets_lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, capacity = self.rate_limits.get(host, DEFAULT_RATE_LIMIT)
+                bucket = self._buckets[host] = TokenBucket(rate, capacity)
+            return bucket
+
+    def get(self, url, headers=None, timeout=None):
+        """GET z limitem na host i ponawianiem błędów przejściowych.
+
+        Po wyczerpaniu prób zwraca ostatnią odpowiedź (np. 503) albo rzuca wyjątek requests, jak requests.get.
+        """
+        host = urlsplit(url).hostname or ""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                metrics.inc("http_retries_total", host=host)
+            self._bucket(url).acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.inc("http_errors_total", host=host)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Błąd połączenia z {host} ({e}), ponawiam (próba {attempt + 1}).")
+                time.sleep(backoff_delay(attempt, self.backoff_base))
+                continue
+            finally:
+                metrics.observe("http_request_seconds", time.perf_counter() - started, host=host)
+            metrics.inc("http_responses_total", host=host, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            delay = _retry_after(response)
+            logger.warning(f"{host} odpowiedział {response.status_code}, ponawiam (próba {attempt + 1}).")
+            time.sleep(delay if delay is not None else backoff_delay(attempt, self.backoff_base))
+        return response
+
+    def get_if_changed(self, url, headers=None, timeout=None):
+        """Zapytanie warunkowe: zwraca odpowiedź albo None, gdy treść nie zmieniła się od ostatniego remember().
+
+        None oznacza 304 Not Modified albo 200 z treścią o identycznym skrócie (serwer bez ETag) -
+        w obu przypadkach nie ma czego parsować.
+        """
+        request_headers = dict(headers or {})
+        stored = self.validators.get(url)
+        if stored:
+            etag, last_modified, _ = stored
+            if etag:
+                request_headers["If-None-Match"] = etag
+            if last_modified:
+                request_headers["If-Modified-Since"] = last_modified
+        response = self.get(url, headers=request_headers, timeout=timeout)
+        host = urlsplit(url).hostname or ""
+        if response.status_code == 304:
+            metrics.inc("http_not_modified_total", host=host)
+            return None
+        if response.ok and stored and stored[2] == content_hash(response.content):
+            metrics.inc("http_unchanged_content_total", host=host)
+            return None
+        return response
+
+    def remember(self, url, response):
+        """Zapisuje walidatory odpowiedzi - wołać dopiero po udanym przetworzeniu i zapisie danych."""
+        self.validators.put(
+            url,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            content_hash(response.content)
+        )
+
+    def close(self):
+        self.session.close()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(db_path=db.DATABASE_PATH):
+    """Wspólny klient procesu; walidatory zapytań warunkowych trzymane są w bazie `db_path`."""
+    with _clients_lock:
+        client = _clients.get(db_path)
+        if client is None:
+            client = _clients[db_path] = HttpClient(DbValidatorStore(db_path))
+        return client
@@ -0,0 +1,271 @@
+"""Rejestr źródeł danych: wspólny przebieg fetch -> parse -> normalise -> write dla wszystkich scraperów.
+
+Nowe źródło to podklasa Source z nazwą, harmonogramem i trzema metodami (fetch, parse, write), oznaczona
+@sources.register, w module dopisanym do SOURCE_MODULES albo zmiennej SCRAPING_SOURCES (moduły
+oddzielone przecinkami). Reszta jest wspólna:
+    - fetch dostaje współdzielonego klienta HTTP (ponawianie, limity zapytań, zapytania warunkowe),
+      a wyjątek z fetch jest ponawiany fetch_attempts razy z rosnącą przerwą;
+    - parse może być generatorem - wiersze są zbierane w paczki po write_batch_rows i każda paczka jest
+      od razu zatwierdzana osobną transakcją (ChunkSink), więc pamięć nie rośnie z długością zakresu,
+      a przerwany przebieg zostawia w bazie zapisane paczki i przesunięte watermarki;
+    - etapy fetch, parse i write mają metrykę stage_seconds{stage="<źródło>.<etap>"} - jedną obserwację
+      na przebieg, z czasem zsumowanym ze wszystkich paczek (pobieranie leniwe przez lazy_fetch liczy się
+      jako fetch, czekanie na zapis paczek jako write) - a wiersze liczniki
+      rows_fetched_total / rows_inserted_total / rows_ignored_total; profil (PROFILE_DIR) obejmuje cały przebieg;
+    - ingest_service uruchamia wszystkie zarejestrowane źródła równolegle, każde według swojego harmonogramu.
+"""
+import collections
+import functools
+import importlib
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Moduł bywa ładowany ze skryptów scraperów - katalog główny projektu musi być w sys.path.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import ingest_queue
+import metrics
+from scraping import http_client
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MODULES = (
+    "scraping.currency.nbp",
+    "scraping.gold.apart",
+    "scraping.stock.yfinance_scraper",
+)
+SOURCE_MODULES_ENV = "SCRAPING_SOURCES"
+WRITE_BATCH_ROWS = 5000
+MAX_PENDING_CHUNKS = 2 # paczki czekające w kolejce zapisu, zanim parsowanie poczeka na commit
+
+_registry = {}
+_local = threading.local() # zegar etapów trwającego przebiegu w tym wątku
+
+class Source:
+    """Bazowa klasa źródła danych.
+
+    fetch(db_path, client) zwraca surowe dane (odpowiedź, ramki, leniwy generator...) albo None, gdy nie ma nic
+    nowego; parse(dane) zamienia je na krotki wierszy (lista albo generator), a normalise może je jeszcze
+    poprawić lub odfiltrować. write(conn, paczka) działa w transakcji wątku kolejki zapisu i zwraca liczbę
+    zapisanych wierszy. chunk_key(wiersz), jeśli podany, wyznacza grupy wierszy, których nie wolno rozdzielić
+    między paczki (np. cała tabela kursów z jednego dnia).
+    after_write(db_path, client, dane) wywoływane jest po zapisaniu wszystkich paczek (np. zapamiętanie
+    walidatorów HTTP, unieważnienie cache) - nieudany zapis nie może zostać uznany za "bez zmian".
+    """
+
+    name = None
+    interval = 60 * 60 # sekundy między uruchomieniami w ingest_service
+    timeout = 5 * 60 # limit czasu pobierania w ingest_service
+    write_batch_rows = WRITE_BATCH_ROWS # None - wszystkie wiersze w jednej transakcji
+    chunk_key = None
+    fetch_attempts = 1
+    retry_delay = 2.0
+
+    def fetch(self, db_path, client):
+        raise NotImplementedError
+
+    def parse(self, payload):
+        raise NotImplementedError
+
+    def normalise(self, rows):
+        return rows
+
+    def write(self, conn, rows):
+        raise NotImplementedError
+
+    def after_write(self, db_path, client, payload):
+        pass
+
+    def with_retries(self, func, *args, **kwargs):
+        """func(*args, **kwargs) ponawiane fetch_attempts razy z przerwą retry_delay, 2*retry_delay, ..."""
+        for attempt in range(1, self.fetch_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.fetch_attempts:
+                    raise
+                metrics.inc("source_retries_total", source=self.name)
+                logger.warning("[%s] Błąd pobierania (próba %d z %d): %s", self.name, attempt, self.fetch_attempts, e,
+                               extra={"source": self.name})
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+    @contextmanager
+    def stages(self):
+        """Zegar etapów przebiegu (metrics.StageClock); zagnieżdżone wywołanie używa zegara zewnętrznego.
+
+        Czasy trafiają do stage_seconds po zakończeniu przebiegu, a profil obejmuje go w całości.
+        """
+        clock = getattr(_local, "clock", None)
+        if clock is not None:
+            yield clock
+            return
+        with metrics.profile(f"{self.name}.run"):
+            _local.clock = clock = metrics.StageClock()
+            try:
+                yield clock
+            finally:
+                _local.clock = None
+                clock.close()
+
+    def stage(self, step):
+        """Etap `<źródło>.<step>` w zegarze trwającego przebiegu (poza przebiegiem - zwykły metrics.stage)."""
+        clock = getattr(_local, "clock", None)
+        name = f"{self.name}.{step}"
+        return clock.stage(name) if clock is not None else metrics.stage(name)
+
+    def lazy_fetch(self, func):
+        """func pobierające dane w trakcie zapisu (z generatora fetch): z ponawianiem i liczone jako etap fetch."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage("fetch"):
+                return self.with_retries(func, *args, **kwargs)
+        return wrapper
+
+    def collect(self, db_path):
+        """Pobranie bez zapisu: (dane, wiersze) albo None, gdy nie ma nic nowego.
+
+        Wiersze mogą być generatorem - właściwe parsowanie (i pobieranie leniwych danych) odbywa się
+        dopiero w store, paczka po paczce.
+        """
+        client = http_client.get_client(db_path)
+        with self.stages():
+            with self.stage("fetch"):
+                payload = self.with_retries(self.fetch, db_path, client)
+        if payload is None:
+            return None
+        return payload, self.normalise(self.parse(payload))
+
+    def store(self, db_path, collected):
+        """Zapisuje wiersze z collect paczkami przez kolejkę zapisu; zwraca liczbę zapisanych wierszy.
+
+        after_write wywoływane jest dopiero, gdy wszystkie paczki zostały zatwierdzone.
+        """
+        payload, rows = collected
+        sink = ChunkSink(db_path, self.write, self.name)
+        chunks = chunked(rows, self.write_batch_rows, self.chunk_key)
+        try:
+            with self.stages():
+                while True:
+                    with self.stage("parse"):
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    # write czeka na commit starszych paczek, gdy kolejka zapisu jest pełna.
+                    with self.stage("write"):
+                        sink.write(chunk)
+                with self.stage("write"):
+                    written = sink.close()
+        except BaseException as e:
+            # Paczki przekazane już do kolejki i tak zostaną zapisane - czekamy na nie, żeby wynik był znany.
+            sink.abort()
+            logger.error("[%s] Przerwano zapis (zatwierdzone paczki: %d, wiersze: %d): %s",
+                         self.name, sink.committed_chunks, sink.written, e, extra={"source": self.name})
+            raise
+        if not sink.rows:
+            logger.info("[%s] Brak danych do zapisania.", self.name, extra={"source": self.name})
+            return 0
+        ignored = sink.rows - written
+        metrics.inc("rows_inserted_total", written, source=self.name)
+        metrics.inc("rows_ignored_total", ignored, source=self.name)
+        logger.info("[%s] Zapisano %d wierszy w %d paczkach (pominięto %d już zapisanych lub bez zmian).",
+                    self.name, written, sink.committed_chunks, ignored,
+                    extra={"source": self.name, "rows_inserted": written, "rows_ignored": ignored})
+        self.after_write(db_path, http_client.get_client(db_path), payload)
+        return written
+
+    def run(self, db_path):
+        """Jedno pełne uruchomienie źródła; zwraca liczbę zapisanych wierszy."""
+        with self.stages():
+            collected = self.collect(db_path)
+            return self.store(db_path, collected) if collected is not None else 0
+
+def chunked(rows, size, key=None):
+    """Dzieli iterowalne wiersze na listy po ok. size wierszy (None - jedna lista), bez materializowania całości.
+
+    Z key paczka może przekroczyć size, ale nie rozdziela kolejnych wierszy o tej samej wartości key(wiersz).
+    """
+    rows = iter(rows)
+    if size is None:
+        chunk = list(rows)
+        if chunk:
+            yield chunk
+        return
+    if key is None:
+        while True:
+            chunk = list(itertools.islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+    chunk = []
+    for row in rows:
+        if len(chunk) >= size and key(row) != key(chunk[-1]):
+            yield chunk
+            chunk = []
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+class ChunkSink:
+    """Przyjmuje kolejne paczki wierszy i zatwierdza każdą osobną transakcją w kolejce zapisu.
+
+    Najwyżej max_pending paczek czeka na zapis - przy wolniejszym zapisie producent (parsowanie) czeka,
+    zamiast odkładać wiersze w pamięci. Błąd zapisu paczki jest zgłaszany przy następnym write albo w close;
+    paczki zatwierdzone wcześniej zostają w bazie.
+    """
+
+    def __init__(self, db_path, write, source_name, max_pending=MAX_PENDING_CHUNKS):
+        self.queue = ingest_queue.get_queue(db_path)
+        self.write_func = write
+        self.source_name = source_name
+        self.max_pending = max_pending
+        self._pending = collections.deque()
+        self.rows = 0
+        self.written = 0
+        self.committed_chunks = 0
+
+    def write(self, chunk):
+        while len(self._pending) >= self.max_pending:
+            self._wait(self._pending.popleft())
+        self._pending.append(self.queue.submit(self.write_func, chunk))
+        self.rows += len(chunk)
+        metrics.inc("rows_fetched_total", len(chunk), source=self.source_name)
+
+    def _wait(self, future):
+        self.written += future.result()
+        self.committed_chunks += 1
+
+    def close(self):
+        """Czeka na zapis wszystkich paczek; zwraca liczbę zapisanych wierszy."""
+        while self._pending:
+            self._wait(self._pending.popleft())
+        return self.written
+
+    def abort(self):
+        """Czeka na paczki już przekazane do kolejki, ignorując ich błędy (pierwszy błąd jest już zgłaszany)."""
+        while self._pending:
+            try:
+                self._wait(self._pending.popleft())
+            except Exception:
+                pass
+
+def register(source_class):
+    """Dekorator klasy źródła: instancja z domyślnymi ustawieniami trafia do rejestru pod source_class.name."""
+    _registry[source_class.name] = source_class()
+    return source_class
+
+def load_sources():
+    """Importuje moduły źródeł (wbudowane i z SCRAPING_SOURCES); zwraca {nazwa: źródło}."""
+    extra = [name.strip() for name in os.environ.get(SOURCE_MODULES_ENV, "").split(",") if name.strip()]
+    for module_name in (*SOURCE_MODULES, *extra):
+        importlib.import_module(module_name)
+    return dict(_registry)
+
+def get_source(name):
+    return load_sources()[name]
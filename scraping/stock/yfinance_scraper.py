@@ -1,8 +1,28 @@
 import yfinance as yf
+import numpy as np
+import pandas as pd
 import sqlite3
 import datetime
+import argparse
+import itertools
+import logging
 import time
 import os
+import sys
+
+# Go up two directories to the project root, so the shared 'db' module can be imported
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import fx
+import ingest_queue
+import logging_setup
+import metrics
+from scraping import sources
+
+logger = logging.getLogger(__name__)
 
 DB_NAME = "maindb.db"
 TABLE_NAME_YFINANCE = "yfinance_stock_data"
@@ -14,122 +34,282 @@ POPULAR_TICKERS = [
     "CSCO", "PEP", "COST", "AVGO", "ABBV", "TMO", "ACN", "LLY", "MRK", "ORCL",
 ] # Added trailing comma and ensured correct closing bracket
 DEMO_TICKERS = POPULAR_TICKERS[:15]
+WATERMARK_SOURCE = "yfinance"
+DOWNLOAD_CHUNK_SIZE = 100 # Liczba tickerów pobieranych jednym zapytaniem yf.download
+TICKERS_FILE_ENV = "YFINANCE_TICKERS_FILE"
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Adj Close')
 
-def get_db_path():
-    """Zwraca pełną ścieżkę do pliku bazy danych."""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    # Go up two directories to the project root, then into 'databases'
-    project_root = os.path.abspath(os.path.join(script_dir, '..', '..'))
-    return os.path.join(project_root, 'databases', DB_NAME)
+def gap_start_date(ticker_symbol, start_date_str, watermarks):
+    """Początek brakującego zakresu: dzień po watermarku lub start_date_str dla nowego tickera."""
+    watermark = watermarks.get(ticker_symbol) if watermarks else None
+    if watermark is None:
+        return start_date_str
+    return (watermark + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
 
-def create_yfinance_table(db_path):
-    """Tworzy tabelę dla danych z yfinance, jeśli jeszcze nie istnieje."""
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME_YFINANCE} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticker TEXT NOT NULL,
-                data_notowania DATE NOT NULL,
-                open_price REAL,
-                high_price REAL,
-                low_price REAL,
-                close_price REAL,
-                adj_close_price REAL,
-                volume INTEGER,
-                UNIQUE(ticker, data_notowania) -- Zapobiega duplikatom dla tego samego tickera i dnia
-            )
-        """)
-        conn.commit()
-        print(f"Tabela '{TABLE_NAME_YFINANCE}' sprawdzona/utworzona.")
-    except sqlite3.Error as e:
-        print(f"Błąd SQLite podczas tworzenia tabeli '{TABLE_NAME_YFINANCE}': {e}")
-    finally:
-        if conn:
-            conn.close()
+def load_tickers(path=None):
+    """Wczytuje listę tickerów z pliku (jeden na linię, '#' to komentarz); bez pliku zwraca DEMO_TICKERS."""
+    path = path or os.environ.get(TICKERS_FILE_ENV)
+    if not path:
+        return list(DEMO_TICKERS)
+    with open(path, encoding="utf-8") as f:
+        tickers = [line.split('#', 1)[0].strip().upper() for line in f]
+    return list(dict.fromkeys(t for t in tickers if t))
+
+def _column_values(hist, column, as_int=False):
+    if column not in hist.columns:
+        return [None] * len(hist)
+    values = hist[column].to_numpy(dtype='float64')
+    missing = np.isnan(values)
+    if as_int:
+        result = np.where(missing, 0, values).astype(np.int64).astype(object)
+    else:
+        result = values.astype(object)
+    result[missing] = None
+    return result.tolist()
+
+def format_dates(index):
+    return np.asarray(index.strftime('%Y-%m-%d'), dtype=object)
+
+def frame_to_rows(ticker_symbol, hist, dates=None):
+    """Zamienia DataFrame z notowaniami jednego tickera na krotki do INSERT (kolumnowo, bez iterrows)."""
+    if dates is None:
+        dates = format_dates(hist.index)
+    has_data = hist.notna().any(axis=1).to_numpy()
+    if not has_data.any():
+        return []
+    if not has_data.all():
+        hist = hist[has_data]
+        dates = dates[has_data]
+    columns = [_column_values(hist, column) for column in PRICE_COLUMNS]
+    volumes = _column_values(hist, 'Volume', as_int=True)
+    return list(zip(itertools.repeat(ticker_symbol, len(dates)), dates.tolist(), *columns, volumes))
 
-def fetch_stock_data_for_tickers(tickers_list, start_date_str, end_date_str):
-    """Pobiera dane historyczne dla listy tickerów z yfinance."""
-    all_stock_data = []
-    print(f"Pobieranie danych dla {len(tickers_list)} tickerów od {start_date_str} do {end_date_str}...")
+def fetch_stock_data_for_tickers(tickers_list, start_date_str, end_date_str, watermarks=None):
+    """Generator notowań tickerów z yfinance (tylko dni po watermarku, jeśli podano), ticker po tickerze."""
+    logger.info(f"Pobieranie danych dla {len(tickers_list)} tickerów od {start_date_str} do {end_date_str}...")
 
     for i, ticker_symbol in enumerate(tickers_list):
-        print(f"  Pobieranie {ticker_symbol} ({i+1}/{len(tickers_list)})...")
+        ticker_start_str = gap_start_date(ticker_symbol, start_date_str, watermarks)
+        if ticker_start_str >= end_date_str:
+            logger.debug(f"{ticker_symbol} jest aktualny ({i+1}/{len(tickers_list)}), pomijam.")
+            continue
+
+        logger.info(f"Pobieranie {ticker_symbol} od {ticker_start_str} ({i+1}/{len(tickers_list)})...")
         try:
-            ticker_data = yf.Ticker(ticker_symbol)
-            hist = ticker_data.history(start=start_date_str, end=end_date_str)
+            with metrics.stage("yfinance.fetch"):
+                ticker_data = yf.Ticker(ticker_symbol)
+                hist = ticker_data.history(start=ticker_start_str, end=end_date_str)
 
             if hist.empty:
-                print(f"    Brak danych dla {ticker_symbol} w podanym okresie.")
+                logger.warning(f"Brak danych dla {ticker_symbol} w podanym okresie.")
                 continue
 
-            for date_index, row in hist.iterrows():
-                trade_date = date_index.strftime('%Y-%m-%d')
-                
-                all_stock_data.append((
-                    ticker_symbol,
-                    trade_date,
-                    row.get('Open'),
-                    row.get('High'),
-                    row.get('Low'),
-                    row.get('Close'),
-                    row.get('Adj Close'),
-                    row.get('Volume')
-                ))
-            
+            yield from frame_to_rows(ticker_symbol, hist)
+
             time.sleep(0.5)
 
         except Exception as e:
-            print(f"    Wystąpił błąd podczas pobierania danych dla {ticker_symbol}: {e}")
+            logger.error(f"Wystąpił błąd podczas pobierania danych dla {ticker_symbol}: {e}")
+
+def download_chunks(tickers_list, start_date_str, end_date_str, watermarks=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Dzieli tickery z brakującymi notowaniami na paczki o wspólnym początku zakresu: (początek, paczka)."""
+    by_start = {}
+    for ticker_symbol in tickers_list:
+        ticker_start_str = gap_start_date(ticker_symbol, start_date_str, watermarks)
+        if ticker_start_str < end_date_str:
+            by_start.setdefault(ticker_start_str, []).append(ticker_symbol)
 
-    return all_stock_data
+    skipped = len(tickers_list) - sum(len(group) for group in by_start.values())
+    logger.info(f"Pobieranie danych dla {len(tickers_list) - skipped} tickerów do {end_date_str} "
+                f"w paczkach po {chunk_size} ({skipped} aktualnych pominięto)...")
+
+    for ticker_start_str, group in sorted(by_start.items()):
+        for offset in range(0, len(group), chunk_size):
+            yield ticker_start_str, group[offset:offset + chunk_size]
+
+def download_chunk(chunk, start_date_str, end_date_str):
+    logger.info(f"Pobieranie {len(chunk)} tickerów od {start_date_str}...")
+    return yf.download(chunk, start=start_date_str, end=end_date_str, group_by='ticker',
+                       auto_adjust=False, actions=False, threads=True, progress=False)
+
+def download_stock_data_batched(tickers_list, start_date_str, end_date_str, watermarks=None,
+                                chunk_size=DOWNLOAD_CHUNK_SIZE, download=download_chunk):
+    """Generator notowań wielu tickerów (yf.download w paczkach po chunk_size) bez pauz między tickerami.
+
+    Kolejna paczka jest pobierana dopiero, gdy odbiorca przeczyta wiersze poprzedniej - w pamięci jest
+    najwyżej jedna ramka. Paczka, której nie udało się pobrać, jest pomijana.
+    """
+    for ticker_start_str, chunk in download_chunks(tickers_list, start_date_str, end_date_str, watermarks, chunk_size):
+        try:
+            frame = download(chunk, ticker_start_str, end_date_str)
+        except Exception as e:
+            logger.error(f"Wystąpił błąd podczas pobierania paczki {chunk[0]}..{chunk[-1]}: {e}")
+            continue
+        rows = frame_to_batch_rows(chunk, frame)
+        del frame
+        yield from rows
+
+def frame_to_batch_rows(tickers, frame):
+    """Rozbija wynik yf.download(group_by='ticker') na wiersze do INSERT."""
+    if frame is None or frame.empty:
+        return []
+    if not isinstance(frame.columns, pd.MultiIndex):
+        return frame_to_rows(tickers[0], frame) if len(tickers) == 1 else []
+
+    rows = []
+    dates = format_dates(frame.index) # Wspólny indeks dat - formatowany raz dla całej paczki
+    present = set(frame.columns.get_level_values(0))
+    for ticker_symbol in tickers:
+        if ticker_symbol not in present:
+            logger.warning(f"Brak danych dla {ticker_symbol} w podanym okresie.")
+            continue
+        rows.extend(frame_to_rows(ticker_symbol, frame[ticker_symbol], dates))
+    return rows
+
+def write_yfinance_rows(conn, stock_data_list):
+    """Zapis notowań w bieżącej transakcji (wątek kolejki zapisu); zwraca liczbę wstawionych wierszy."""
+    sql = f"""
+        INSERT OR IGNORE INTO {TABLE_NAME_YFINANCE} (
+            ticker, data_notowania, open_price, high_price, low_price,
+            close_price, adj_close_price, volume
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    cursor = conn.executemany(sql, stock_data_list)
+    db.update_watermarks(conn, WATERMARK_SOURCE, stock_data_list, key_index=0, date_index=1)
+    db.update_latest_prices(conn, "stock", stock_data_list, key_index=0, price_index=5, date_index=1)
+    db.update_asset_catalog(conn, "stock", stock_data_list, key_index=0)
+    return cursor.rowcount
 
 def insert_yfinance_data(db_path, stock_data_list):
-    if not stock_data_list:
-        print("Brak danych do wstawienia do bazy.")
-        return
+    """Zapisuje notowania (lista albo generator) paczkami przez kolejkę zapisu."""
+    try:
+        YFinanceSource().store(db_path, (None, stock_data_list))
+    except sqlite3.Error:
+        pass
 
-    conn = None
+def fetch_ticker_currencies(tickers_list):
+    """Pobiera walutę notowań tickerów z yfinance (jedno zapytanie na ticker, tylko dla nowych tickerów)."""
+    currencies = {}
+    for ticker_symbol in tickers_list:
+        try:
+            currency = yf.Ticker(ticker_symbol).fast_info['currency']
+        except Exception as e:
+            logger.warning(f"Nie udało się pobrać waluty notowań dla {ticker_symbol}: {e}")
+            continue
+        if currency:
+            currencies[ticker_symbol] = currency
+    return currencies
+
+def tickers_missing_metadata(db_path, tickers_list):
+    """Tickery, dla których ticker_metadata nie zna jeszcze waluty notowań."""
+    with db.connection(db_path) as conn:
+        known = {row[0] for row in conn.execute("SELECT ticker FROM ticker_metadata").fetchall()}
+    return [t for t in tickers_list if t not in known]
+
+def write_ticker_metadata_rows(conn, metadata_rows):
+    conn.executemany(
+        "INSERT OR REPLACE INTO ticker_metadata (ticker, currency, updated_at) VALUES (?, ?, ?)", metadata_rows
+    )
+    # Wyceny policzone z walutą zgadniętą po sufiksie przestają być aktualne.
+    db.bump_data_version(conn, db.TICKER_METADATA_VERSION)
+
+def save_ticker_currencies(db_path, currencies):
+    if not currencies:
+        return
+    now = datetime.datetime.now().isoformat()
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        sql = f"""
-            INSERT OR IGNORE INTO {TABLE_NAME_YFINANCE} (
-                ticker, data_notowania, open_price, high_price, low_price,
-                close_price, adj_close_price, volume
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """
-        cursor.executemany(sql, stock_data_list)
-        conn.commit()
-        print(f"Dodano/zignorowano {cursor.rowcount} wierszy do tabeli '{TABLE_NAME_YFINANCE}'.")
+        ingest_queue.get_queue(db_path).write(
+            write_ticker_metadata_rows, [(ticker, currency, now) for ticker, currency in currencies.items()]
+        )
+        fx.ticker_currency_cache.invalidate()
     except sqlite3.Error as e:
-        print(f"Błąd SQLite podczas wstawiania danych do '{TABLE_NAME_YFINANCE}': {e}")
-    finally:
-        if conn:
-            conn.close()
-
-def main():
-    db_path = get_db_path()
-    create_yfinance_table(db_path)
-    end_date = datetime.date.today()
-    start_date = end_date - datetime.timedelta(days=7)
+        logger.error(f"Błąd SQLite podczas zapisu metadanych tickerów: {e}")
 
-    end_date_str = end_date.strftime('%Y-%m-%d')
-    start_date_str = start_date.strftime('%Y-%m-%d')
-    
-    tickers_to_fetch = DEMO_TICKERS
-    print(f"Docelowa liczba tickerów: {len(tickers_to_fetch)} (lista może być skrócona do celów demo).")
+def update_ticker_metadata(db_path, tickers_list):
+    """Uzupełnia ticker_metadata o waluty tickerów, których jeszcze nie ma w bazie."""
+    missing = tickers_missing_metadata(db_path, tickers_list)
+    if not missing:
+        return
 
+    logger.info(f"Pobieranie waluty notowań dla {len(missing)} nowych tickerów...")
+    save_ticker_currencies(db_path, fetch_ticker_currencies(missing))
 
-    print(f"\nRozpoczynam pobieranie danych giełdowych z yfinance...")
-    historical_data = fetch_stock_data_for_tickers(tickers_to_fetch, start_date_str, end_date_str)
+def load_watermarks(db_path):
+    with db.transaction(db_path) as conn:
+        db.seed_watermarks(conn, WATERMARK_SOURCE, TABLE_NAME_YFINANCE, "ticker", "data_notowania")
+        return db.get_watermarks(conn, WATERMARK_SOURCE)
 
-    if historical_data:
-        insert_yfinance_data(db_path, historical_data)
-    else:
-        print("Nie udało się pobrać żadnych danych giełdowych.")
+@sources.register
+class YFinanceSource(sources.Source):
+    """Notowania z yfinance: brakujące dni od watermarków, paczkami przez yf.download.
+
+    fetch zwraca leniwy generator - paczki tickerów są pobierane w trakcie zapisu, więc każda paczka
+    wierszy jest zatwierdzana, zanim pobierze się następną. Paczka, której nie udało się pobrać mimo
+    ponowień, jest pomijana - jej tickery zostaną pobrane w następnym uruchomieniu, bo ich watermarki
+    się nie przesunęły.
+    """
+
+    name = "yfinance"
+    interval = 6 * 60 * 60
+    timeout = 30 * 60
+    fetch_attempts = 3
+
+    def __init__(self, tickers=None, lookback_days=7, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.tickers = tickers
+        self.lookback_days = lookback_days
+        self.chunk_size = chunk_size
+
+    def target_tickers(self):
+        return self.tickers or load_tickers()
+
+    def fetch(self, db_path, client):
+        # yfinance ma własny stos HTTP - wspólny klient nie jest tu używany.
+        tickers = self.target_tickers()
+        end_date = datetime.date.today()
+        start_date_str = (end_date - datetime.timedelta(days=self.lookback_days)).strftime('%Y-%m-%d')
+        logger.info(f"Docelowa liczba tickerów: {len(tickers)}.")
+        return download_stock_data_batched(
+            tickers, start_date_str, end_date.strftime('%Y-%m-%d'), load_watermarks(db_path), self.chunk_size,
+            download=self.lazy_fetch(download_chunk)
+        )
+
+    def parse(self, rows):
+        return rows
+
+    def write(self, conn, rows):
+        return write_yfinance_rows(conn, rows)
+
+    def run(self, db_path):
+        with self.stages():
+            written = super().run(db_path)
+            # Waluty nowych tickerów uzupełniamy także wtedy, gdy nie przybyło żadnych notowań.
+            update_ticker_metadata(db_path, self.target_tickers())
+        return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pobieranie notowań giełdowych z yfinance.")
+    parser.add_argument("--tickers-file", help=f"Plik z listą tickerów (domyślnie zmienna {TICKERS_FILE_ENV} lub DEMO_TICKERS).")
+    parser.add_argument("--all-popular", action="store_true", help="Użyj pełnej listy POPULAR_TICKERS.")
+    parser.add_argument("--chunk-size", type=int, default=DOWNLOAD_CHUNK_SIZE)
+    parser.add_argument("--per-ticker", action="store_true", help="Stary tryb: osobne zapytanie dla każdego tickera.")
+    args = parser.parse_args(argv)
+
+    db_path = db.DATABASE_PATH
+    db.init_schema(db_path)
+    tickers_to_fetch = list(POPULAR_TICKERS) if args.all_popular else load_tickers(args.tickers_file)
+
+    logger.info("Rozpoczynam pobieranie danych giełdowych z yfinance...")
+    if not args.per_ticker:
+        YFinanceSource(tickers_to_fetch, chunk_size=args.chunk_size).run(db_path)
+        return
+
+    end_date = datetime.date.today()
+    start_date_str = (end_date - datetime.timedelta(days=7)).strftime('%Y-%m-%d')
+    historical_data = fetch_stock_data_for_tickers(tickers_to_fetch, start_date_str, end_date.strftime('%Y-%m-%d'),
+                                                   load_watermarks(db_path))
+    insert_yfinance_data(db_path, historical_data)
+    update_ticker_metadata(db_path, tickers_to_fetch)
 
 if __name__ == "__main__":
+    logging_setup.configure()
     main()
@@ -0,0 +1,172 @@
+"""Tryb serwerowy aplikacji: sesje użytkowników i cache wyników portfela liczonych per użytkownik.
+
+W trybie web (python main.py --server) jeden proces obsługuje wiele kart przeglądarki. Każda karta
+(page.session_id) ma tu swój wpis z zalogowanym użytkownikiem, a wycena i historia portfela liczone są
+raz na użytkownika i wersję cen - kolejne odświeżenia, także z innych kart tego samego użytkownika,
+czytają gotowy wynik. Ceny notowań są wspólne dla wszystkich sesji (valuation.price_cache).
+"""
+import collections
+import datetime
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+import metrics
+import positions
+
+SESSION_IDLE_TIMEOUT = 12 * 60 * 60 # sekundy bez aktywności, po których sesja jest usuwana
+MAX_CACHED_USERS = 1000
+
+class Session:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.user_id = None
+        self.created_at = datetime.datetime.now()
+        self.last_seen = time.monotonic()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+class SessionStore:
+    """Sesje otwartych stron Flet (klucz: page.session_id).
+
+    Sesja jest zamykana przy page.on_close; sesje porzucone bez tego zdarzenia usuwa expire_idle,
+    wywoływane przy otwieraniu kolejnych.
+    """
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def open(self, session_id):
+        self.expire_idle()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            metrics.set_gauge("sessions_active", len(self._sessions))
+        session.touch()
+        return session
+
+    def get(self, session_id):
+        """Sesja o danym identyfikatorze albo None; odczyt liczy się jako aktywność i przedłuża sesję."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.last_seen < now - self.idle_timeout:
+                del self._sessions[session_id]
+                metrics.set_gauge("sessions_active", len(self._sessions))
+                return None
+            session.touch()
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            metrics.set_gauge("sessions_active", len(self._sessions))
+
+    def expire_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for session_id in [s.session_id for s in self._sessions.values() if s.last_seen < deadline]:
+                del self._sessions[session_id]
+            metrics.set_gauge("sessions_active", len(self._sessions))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+class PortfolioCache:
+    """Wyniki liczone dla jednego użytkownika (wycena, historia) pod kluczem wybranym przez wywołującego.
+
+    Wpis jest ważny, dopóki nie zmieni się wersja cen (db.PRICES_VERSION, podbijana przez scrapery), wersja
+    pozycji użytkownika (positions.positions_version) ani dzień - zmiany zapisane przez inny proces też są
+    widoczne. invalidate_user dodatkowo odrzuca wynik obliczenia, które trwało w chwili zmiany pozycji. Gdy kilka sesji naraz nie trafi w cache, liczy tylko pierwsza,
+    a pozostałe czekają na jej wynik. Wyniki są współdzielone między sesjami - nie wolno ich modyfikować.
+    """
+
+    def __init__(self, max_users=MAX_CACHED_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict() # user_id -> {klucz: (znacznik, wynik)}, w kolejności LRU
+        self._generations = {} # user_id -> licznik invalidate_user, tylko dla użytkowników z trwającym obliczeniem
+        self._epoch = 0 # podbijany przez invalidate() - dotyczy wszystkich użytkowników
+        self._in_flight = {} # (user_id, klucz, znacznik, generacja) -> Future trwającego obliczenia
+
+    def _generation(self, user_id):
+        return self._epoch, self._generations.get(user_id, 0)
+
+    def _forget_generation(self, user_id):
+        # Licznik jest potrzebny tylko trwającym obliczeniom - bez nich nowe zaczną od zera.
+        if not any(flight_key[0] == user_id for flight_key in self._in_flight):
+            self._generations.pop(user_id, None)
+
+    def stamp(self, conn, user_id):
+        """Znacznik aktualności wyników użytkownika (do porównania albo jako podstawa ETag)."""
+        return (
+            db.get_data_version(conn, db.PRICES_VERSION),
+            db.get_data_version(conn, db.TICKER_METADATA_VERSION),
+            db.get_data_version(conn, positions.positions_version(user_id)),
+            datetime.date.today(),
+        )
+
+    def get(self, conn, user_id, key, compute):
+        """Zwraca wynik z cache albo compute(conn), zapamiętany dla następnych odświeżeń."""
+        stamp = self.stamp(conn, user_id)
+        with self._lock:
+            generation = self._generation(user_id)
+            entries = self._entries.get(user_id)
+            if entries is not None:
+                self._entries.move_to_end(user_id)
+                cached = entries.get(key)
+                if cached is not None and cached[0] == stamp:
+                    metrics.inc("cache_hits_total", cache="portfolio")
+                    return cached[1]
+            flight_key = (user_id, key, stamp, generation)
+            pending = self._in_flight.get(flight_key)
+            if pending is None:
+                future = self._in_flight[flight_key] = Future()
+        if pending is not None:
+            metrics.inc("cache_hits_total", cache="portfolio_pending")
+            return pending.result()
+
+        metrics.inc("cache_misses_total", cache="portfolio")
+        try:
+            value = compute(conn)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[flight_key]
+                self._forget_generation(user_id)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[flight_key]
+            current = self._generation(user_id)
+            self._forget_generation(user_id)
+            if current == generation:
+                self._entries.setdefault(user_id, {})[key] = (stamp, value)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._forget_generation(user_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            # Nowa epoka i tak unieważnia trwające obliczenia, więc liczniki użytkowników można zacząć od zera.
+            self._generations.clear()
+
+session_store = SessionStore()
+portfolio_cache = PortfolioCache()
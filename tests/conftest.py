@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import db
+import fx
+import ingest_queue
+import price_store
+import sessions
+import valuation
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Pusta baza z aktualnym schematem; cache procesu czyszczone przed i po teście."""
+    def reset_caches():
+        fx.rate_cache.invalidate()
+        fx.ticker_currency_cache.invalidate()
+        valuation.price_cache.invalidate()
+        price_store.store.invalidate()
+        sessions.portfolio_cache.invalidate()
+
+    path = str(tmp_path / "test.db")
+    db.init_schema(path)
+    reset_caches()
+    yield path
+    reset_caches()
+    ingest_queue.close_all_queues()
+    db.close_all_pools()
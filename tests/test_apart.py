@@ -0,0 +1,42 @@
+import pytest
+import requests
+
+import metrics
+from scraping import sources
+from scraping.gold import apart
+
+class FlakyClient:
+    """Klient, którego pierwsze `failures` zapytań kończy się błędem połączenia, a potem strona jest bez zmian."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def get_if_changed(self, url, timeout=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise requests.ConnectionError("connection reset")
+        return None
+
+@pytest.fixture
+def source():
+    source = apart.ApartSource()
+    source.retry_delay = 0
+    return source
+
+def test_network_error_is_retried(db_path, source, monkeypatch):
+    client = FlakyClient(failures=2)
+    monkeypatch.setattr(sources.http_client, "get_client", lambda db_path=None: client)
+    metrics.registry.reset()
+    assert source.run(db_path) == 0
+    assert client.calls == 3
+    assert metrics.registry.counter_value("source_retries_total", source="apart") == 2
+
+def test_network_error_is_not_unchanged_page(db_path, source, monkeypatch):
+    client = FlakyClient(failures=10)
+    monkeypatch.setattr(sources.http_client, "get_client", lambda db_path=None: client)
+    metrics.registry.reset()
+    with pytest.raises(requests.ConnectionError):
+        source.run(db_path)
+    assert metrics.registry.counter_value("stage_errors_total", stage="apart.fetch") == 1
+    assert apart.scrape_apart_purchase_prices(FlakyClient(failures=1)) == []
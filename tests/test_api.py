@@ -0,0 +1,92 @@
+import datetime
+import json
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import pytest
+
+import api
+import db
+import positions
+import users
+
+TODAY = datetime.date.today().isoformat()
+
+@pytest.fixture
+def server(db_path):
+    server = api.ApiServer(db_path, archive_root=None)
+    yield server
+    server.executor.shutdown()
+
+def call(server, method, path, query="", token=None, body=b"", headers=None):
+    request_headers = dict(headers or {})
+    if token is not None:
+        request_headers["authorization"] = f"Bearer {token}"
+    status, response_headers, response_body = server.respond(
+        api.Request(method, path, parse_qs(query), request_headers, body)
+    )
+    return status, response_headers, json.loads(response_body) if response_body else None
+
+@pytest.fixture
+def token(db_path, server):
+    users.register_user(db_path, "anna", "tajne")
+    status, _, data = call(server, "POST", "/api/login", body=json.dumps({"username": "anna", "password": "tajne"}).encode())
+    assert status == HTTPStatus.OK
+    with db.transaction(db_path) as conn:
+        for name in ("AAA", "BBB", "CCC"):
+            positions.record_buy(conn, data["user_id"], "stock", name, 1, price=10.0)
+        db.update_latest_prices(conn, "stock", [(name, 10.0, TODAY) for name in ("AAA", "BBB", "CCC")], 0, 1, 2)
+    return data["token"]
+
+def test_if_none_match_returns_304(server, token):
+    status, headers, data = call(server, "GET", "/api/valuation", token=token)
+    assert status == HTTPStatus.OK and data["total"] > 0
+    etag = headers["ETag"]
+    status, headers, data = call(server, "GET", "/api/valuation", token=token, headers={"if-none-match": etag})
+    assert (status, headers["ETag"], data) == (HTTPStatus.NOT_MODIFIED, etag, None)
+    # Inne parametry - inny ETag.
+    _, other, _ = call(server, "GET", "/api/valuation", query="limit=1", token=token)
+    assert other["ETag"] != etag
+
+def test_etag_changes_when_prices_change(db_path, server, token):
+    _, before, _ = call(server, "GET", "/api/prices/stock/AAA", token=token)
+    _, valuation_before, _ = call(server, "GET", "/api/valuation", token=token)
+    with db.transaction(db_path) as conn:
+        db.update_latest_prices(conn, "stock", [("AAA", 12.0, TODAY)], 0, 1, 2)
+
+    status, after, data = call(server, "GET", "/api/prices/stock/AAA", token=token,
+                               headers={"if-none-match": before["ETag"]})
+    assert status == HTTPStatus.OK and after["ETag"] != before["ETag"]
+    assert data["price"] == 12.0
+    status, valuation_after, _ = call(server, "GET", "/api/valuation", token=token,
+                                      headers={"if-none-match": valuation_before["ETag"]})
+    assert status == HTTPStatus.OK and valuation_after["ETag"] != valuation_before["ETag"]
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"authorization": "Bearer nieznany-token"},
+    {"authorization": "Basic YW5uYTp0YWpuZQ=="},
+    {"authorization": "Bearer"},
+])
+def test_missing_or_bad_token_returns_401(server, token, headers):
+    status, _, data = call(server, "GET", "/api/positions", headers=headers)
+    assert status == HTTPStatus.UNAUTHORIZED and "error" in data
+
+def test_logout_invalidates_token(server, token):
+    assert call(server, "POST", "/api/logout", token=token)[0] == HTTPStatus.OK
+    assert call(server, "GET", "/api/positions", token=token)[0] == HTTPStatus.UNAUTHORIZED
+
+def test_pagination_bounds(server, token):
+    _, _, page = call(server, "GET", "/api/positions", query="limit=2", token=token)
+    assert [item["asset_name"] for item in page["items"]] == ["AAA", "BBB"]
+    assert (page["total"], page["limit"], page["offset"], page["next_offset"]) == (3, 2, 0, 2)
+
+    _, _, page = call(server, "GET", "/api/positions", query="limit=2&offset=2", token=token)
+    assert [item["asset_name"] for item in page["items"]] == ["CCC"] and page["next_offset"] is None
+
+    _, _, page = call(server, "GET", "/api/positions", query="offset=10", token=token)
+    assert page["items"] == [] and page["next_offset"] is None
+
+    for query in ("limit=0", f"limit={api.MAX_PAGE_SIZE + 1}", "offset=-1", "limit=abc"):
+        status, _, data = call(server, "GET", "/api/positions", query=query, token=token)
+        assert status == HTTPStatus.BAD_REQUEST, query
@@ -0,0 +1,38 @@
+import catalog
+import db
+
+CURRENCIES = [("USD", "dolar amerykański"), ("AUD", "dolar australijski"), ("EUR", "euro"), ("CHF", "frank szwajcarski")]
+TICKERS = ["MSFT", "MS", "AMS.MC", "META", "TSM", "MSTR"]
+
+def fill_catalog(db_path):
+    with db.transaction(db_path) as conn:
+        db.update_asset_catalog(conn, "currency", CURRENCIES, key_index=0, name_index=1)
+        db.update_asset_catalog(conn, "stock", [(ticker,) for ticker in TICKERS], key_index=0)
+
+def test_prefix_then_substring_then_fuzzy(db_path):
+    fill_catalog(db_path)
+    assets = catalog.AssetCatalog()
+    with db.connection(db_path) as conn:
+        # Prefiks (posortowany), potem fragment w środku klucza, na końcu podobne klucze.
+        assert assets.search(conn, "stock", "ms") == ["MS", "MSFT", "MSTR", "AMS.MC"]
+        assert assets.search(conn, "stock", "METTA") == ["META"]
+        assert assets.search(conn, "stock", "ms", limit=2) == ["MS", "MSFT"]
+        assert assets.search(conn, "stock", "  ") == sorted(TICKERS)[:catalog.SEARCH_LIMIT]
+        assert assets.search(conn, "gold", "ms") == []
+
+def test_display_name_match(db_path):
+    fill_catalog(db_path)
+    assets = catalog.AssetCatalog()
+    with db.connection(db_path) as conn:
+        assert assets.search(conn, "currency", "dolar") == ["AUD", "USD"]
+        assert assets.search(conn, "currency", "Szwajcar") == ["CHF"]
+        assert assets.search(conn, "currency", "eu") == ["EUR"]
+
+def test_new_asset_reloads_catalog(db_path):
+    fill_catalog(db_path)
+    assets = catalog.AssetCatalog()
+    with db.connection(db_path) as conn:
+        assert "NVDA" not in assets.get_assets(conn, "stock")
+        with db.transaction(db_path) as write_conn:
+            db.update_asset_catalog(write_conn, "stock", [("NVDA",)], key_index=0)
+        assert "NVDA" in assets.get_assets(conn, "stock")
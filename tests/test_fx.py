@@ -0,0 +1,84 @@
+import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+import pytest
+
+import api
+import db
+import fx
+import positions
+import valuation
+from scraping.currency import nbp
+from scraping.stock import yfinance_scraper
+
+TODAY = datetime.date.today().isoformat()
+
+def write_rates(db_path, rates):
+    with db.transaction(db_path) as conn:
+        nbp.write_nbp_rows(conn, [(TODAY, code, code, rate) for code, rate in rates.items()])
+
+def buy(db_path, asset_type, asset_name, quantity, price=None):
+    with db.transaction(db_path) as conn:
+        positions.record_buy(conn, 1, asset_type, asset_name, quantity)
+        if price is not None:
+            db.update_latest_prices(conn, asset_type, [(asset_name, price, TODAY)], 0, 1, 2)
+
+def test_converter_falls_back_to_pln_without_rate():
+    converter = fx.Converter({"PLN": 1.0, "USD": 4.0}, "JPY")
+    assert converter.reporting_currency == "PLN"
+    assert converter.convert(10, "USD") == 40
+
+    converter = fx.Converter({"PLN": 1.0, "USD": 4.0}, "USD")
+    assert converter.reporting_currency == "USD"
+    assert converter.convert(8, "PLN") == 2
+
+def test_available_reporting_currencies():
+    rates = {"PLN": 1.0, "USD": 4.0, "EUR": 4.3}
+    assert fx.available_reporting_currencies(rates, ["PLN", "USD", "GBP", "EUR"]) == ["PLN", "USD", "EUR"]
+    assert fx.available_reporting_currencies({}, ["PLN", "USD"]) == ["PLN"]
+
+def test_valuation_reports_currency_actually_used(db_path):
+    write_rates(db_path, {"USD": 4.0})
+    buy(db_path, "currency", "USD", 10)
+    with db.connection(db_path) as conn:
+        total, categories, _, currency = valuation.value_portfolio(conn, 1, "USD")
+        assert (total, currency) == (pytest.approx(10.0), "USD")
+        total, _, _, currency = valuation.value_portfolio(conn, 1, "GBP")
+        assert (total, currency) == (pytest.approx(40.0), "PLN")
+        assert valuation.value_portfolio(conn, 2, "GBP")[3] == "PLN"
+
+def request(query, user_id=1):
+    req = api.Request("GET", "/api/valuation", parse_qs(query), {}, b"")
+    req.user_id = user_id
+    return req
+
+def test_api_rejects_currency_without_rate(db_path):
+    write_rates(db_path, {"USD": 4.0})
+    buy(db_path, "currency", "USD", 10)
+    server = api.ApiServer(db_path, archive_root=None)
+    try:
+        with db.connection(db_path) as conn:
+            result = server.get_valuation(conn, request("currency=usd"))
+            assert result["currency"] == "USD"
+            assert result["total"] == pytest.approx(10.0)
+            for query in ("currency=GBP", "currency=XYZ"):
+                with pytest.raises(api.ApiError) as error:
+                    server.get_valuation(conn, request(query))
+                assert error.value.status == HTTPStatus.BAD_REQUEST
+            assert server.get_valuation(conn, request(""))["currency"] == "PLN"
+    finally:
+        server.executor.shutdown()
+
+def test_ticker_currency_guess_replaced_by_metadata(db_path):
+    write_rates(db_path, {"USD": 4.0, "EUR": 4.5})
+    buy(db_path, "stock", "ACME", 1, price=10.0)
+    with db.connection(db_path) as conn:
+        assert fx.ticker_currency_cache.get_currencies(conn, ["ACME"]) == {"ACME": "USD"}
+        assert valuation.value_portfolio(conn, 1)[0] == pytest.approx(40.0)
+
+    with db.transaction(db_path) as conn:
+        yfinance_scraper.write_ticker_metadata_rows(conn, [("ACME", "EUR", TODAY)])
+    with db.connection(db_path) as conn:
+        assert fx.ticker_currency_cache.get_currencies(conn, ["ACME"]) == {"ACME": "EUR"}
+        assert valuation.value_portfolio(conn, 1)[0] == pytest.approx(45.0)
@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+
+import metrics
+from benchmarks import nbp_stub_server
+from scraping import http_client
+
+DAY = datetime.date(2024, 3, 15)
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(failures=0):
+        server, base_url = nbp_stub_server.start_stub_server(failures=failures)
+        servers.append(server)
+        return server, f"{base_url}/tables/A/{DAY.isoformat()}/"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_retries_transient_errors_then_succeeds(stub):
+    server, url = stub(failures=2)
+    client = http_client.HttpClient(backoff_base=0.001)
+    metrics.registry.reset()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.json()[0]["effectiveDate"] == DAY.isoformat()
+    assert server.stats["requests"] == 3
+    assert metrics.registry.counter_value("http_retries_total", host="127.0.0.1") == 2
+    assert metrics.registry.counter_value("http_responses_total", host="127.0.0.1", status=503) == 2
+
+def test_gives_up_after_max_retries(stub):
+    server, url = stub(failures=10)
+    client = http_client.HttpClient(max_retries=2, backoff_base=0.001)
+    assert client.get(url).status_code == 503
+    assert server.stats["requests"] == 3
+
+def test_conditional_get_returns_none_on_304(stub):
+    server, url = stub()
+    client = http_client.HttpClient()
+    response = client.get_if_changed(url)
+    assert response is not None and response.headers["ETag"]
+    # Przed remember() (np. nieudany zapis) strona nie może zostać uznana za niezmienioną.
+    assert client.get_if_changed(url) is not None
+    client.remember(url, response)
+    assert client.get_if_changed(url) is None
+    assert server.stats["not_modified"] == 1
+
+def test_token_bucket_waits_for_tokens():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = http_client.TokenBucket(rate=2.0, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+    assert sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
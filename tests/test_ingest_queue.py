@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db
+import ingest_queue
+
+@pytest.fixture
+def writer(db_path):
+    with db.transaction(db_path) as conn:
+        conn.execute("CREATE TABLE notes (text TEXT NOT NULL)")
+    writer = ingest_queue.IngestQueue(db_path)
+    yield writer
+    writer.close()
+
+def insert_notes(conn, rows):
+    conn.executemany("INSERT INTO notes (text) VALUES (?)", [(row,) for row in rows])
+    return len(rows)
+
+def saved_notes(db_path):
+    with db.connection(db_path) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT text FROM notes"))
+
+def test_bad_item_does_not_fail_its_batch(db_path, writer):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def blocking_write(conn, rows):
+        started.set()
+        release.wait(5)
+        return insert_notes(conn, rows)
+
+    def counted_write(conn, rows):
+        calls.append(rows)
+        return insert_notes(conn, rows)
+
+    def failing_write(conn, rows):
+        insert_notes(conn, rows)
+        raise sqlite3.IntegrityError("zła paczka")
+
+    # Wątek zapisu czeka w pierwszej transakcji, więc dwie kolejne paczki trafią razem do następnej.
+    first = writer.submit(blocking_write, ["a"])
+    assert started.wait(5)
+    good = writer.submit(counted_write, ["b", "c"])
+    bad = writer.submit(failing_write, ["x"])
+    release.set()
+
+    assert first.result(5) == 1
+    assert good.result(5) == 2
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.result(5)
+    assert saved_notes(db_path) == ["a", "b", "c"]
+    # Wspólna transakcja została cofnięta i dobra paczka zapisana ponownie, osobno.
+    assert calls == [["b", "c"], ["b", "c"]]
+    stats = writer.stats()
+    assert (stats["transactions"], stats["failed_batches"], stats["rows_written"]) == (2, 1, 3)
+
+def test_items_waiting_together_share_one_transaction(db_path, writer):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_write(conn, rows):
+        started.set()
+        release.wait(5)
+        return insert_notes(conn, rows)
+
+    writer.submit(blocking_write, ["a"])
+    assert started.wait(5)
+    futures = [writer.submit(insert_notes, [str(i)]) for i in range(5)]
+    release.set()
+    assert [f.result(5) for f in futures] == [1] * 5
+    assert writer.stats()["transactions"] == 2
@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+import metrics
+
+class ProcessWideProfile:
+    """Zachowanie cProfile z Pythona 3.12+: drugi włączony naraz profiler zgłasza ValueError."""
+
+    active = 0
+    lock = threading.Lock()
+
+    def enable(self):
+        with self.lock:
+            if ProcessWideProfile.active:
+                raise ValueError("Another profiling tool is already active")
+            ProcessWideProfile.active += 1
+
+    def disable(self):
+        with self.lock:
+            ProcessWideProfile.active -= 1
+
+    def dump_stats(self, path):
+        open(path, "wb").close()
+
+@pytest.fixture
+def profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.cProfile, "Profile", ProcessWideProfile)
+    metrics.enable_profiling(str(tmp_path))
+    metrics.registry.reset()
+    yield tmp_path
+    metrics.enable_profiling(None)
+
+def test_concurrent_stages_with_profiling(profiling):
+    barrier = threading.Barrier(3)
+    errors = []
+
+    def work(i):
+        try:
+            with metrics.stage("test.concurrent"):
+                barrier.wait(timeout=5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert metrics.registry.counter_value("stage_errors_total", stage="test.concurrent") == 0
+    assert len(list(profiling.glob("test.concurrent-*.prof"))) == 1
+    # Po zakończeniu etapów profiler jest znów dostępny.
+    with metrics.stage("test.after"):
+        pass
+    assert len(list(profiling.glob("test.after-*.prof"))) == 1
+
+def test_nested_stage_is_not_profiled_separately(profiling):
+    with metrics.stage("test.outer"):
+        with metrics.stage("test.inner"):
+            pass
+    assert len(list(profiling.glob("test.outer-*.prof"))) == 1
+    assert list(profiling.glob("test.inner-*.prof")) == []
+
+def test_profiler_errors_do_not_escape_stage(profiling, monkeypatch):
+    def broken_dump(self, path):
+        raise OSError("dysk pełny")
+
+    monkeypatch.setattr(ProcessWideProfile, "dump_stats", broken_dump)
+    with metrics.stage("test.dump"):
+        pass
+
+    def broken_enable(self):
+        raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(ProcessWideProfile, "enable", broken_enable)
+    with metrics.stage("test.enable"):
+        pass
+    assert metrics.registry.counter_value("stage_errors_total", stage="test.enable") == 0
+
+def test_stage_error_still_counted(profiling):
+    with pytest.raises(RuntimeError):
+        with metrics.stage("test.error"):
+            raise RuntimeError("błąd etapu")
+    assert metrics.registry.counter_value("stage_errors_total", stage="test.error") == 1
@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+    yield conn
+    conn.close()
+
+def tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def test_empty_database_gets_latest_schema(conn):
+    applied = migrations.migrate(conn)
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(conn) == migrations.MIGRATIONS[-1][0]
+    assert {"positions", "portfolio_transactions", "latest_prices", "data_versions", "archive_partitions"} <= tables(conn)
+    assert migrations.migrate(conn) == []
+
+def test_legacy_portfolios_moved_to_positions(conn):
+    migrations.migrate(conn, migrations.MIGRATIONS[:5])
+    conn.execute("INSERT INTO users (id, username, password) VALUES (1, 'anna', 'x')")
+    conn.executemany(
+        "INSERT INTO portfolios (user_id, asset_name, asset_type, quantity) VALUES (?, ?, ?, ?)",
+        [(1, "USD", "currency", 10), (None, "USD", "currency", 99), (1, "AAPL", "stock", 2), (1, "USD", "currency", 5)]
+    )
+    conn.commit()
+
+    assert migrations.migrate(conn) == [version for version, _, _ in migrations.MIGRATIONS[5:]]
+    positions = conn.execute(
+        "SELECT user_id, asset_type, asset_name, quantity, cost_basis FROM positions ORDER BY id"
+    ).fetchall()
+    assert positions == [(1, "currency", "USD", 15.0, None), (1, "stock", "AAPL", 2.0, None)]
+    transactions = conn.execute(
+        "SELECT user_id, asset_name, quantity, price FROM portfolio_transactions ORDER BY id"
+    ).fetchall()
+    assert transactions == [(1, "USD", 10.0, None), (1, "AAPL", 2.0, None), (1, "USD", 5.0, None)]
+    assert conn.execute("SELECT COUNT(*) FROM portfolios WHERE user_id IS NULL").fetchone()[0] == 1
+
+def test_failed_migration_rolls_back(conn):
+    broken = migrations.MIGRATIONS[:1] + [(2, "zepsuta", ["CREATE TABLE nowa (x)", "SELECT * FROM brak_tabeli"])]
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(conn, broken)
+    assert migrations.current_version(conn) == 1
+    assert "nowa" not in tables(conn)
+
+def test_hot_queries_search_indexes(conn):
+    migrations.migrate(conn)
+    assert migrations.check_query_plans(conn) == []
+
+def test_query_plan_check_flags_scans(conn):
+    migrations.migrate(conn)
+    queries = [
+        ("pełny skan", "SELECT * FROM users WHERE password = ?", ("x",)),
+        ("skan indeksu", "SELECT username FROM users WHERE username LIKE ?", ("x%",)),
+        ("lista walut", f"SELECT DISTINCT kod_waluty FROM {migrations.TABLE_NAME_NBP}", ()),
+    ]
+    assert [name for name, _ in migrations.check_query_plans(conn, queries)] == ["pełny skan", "skan indeksu"]
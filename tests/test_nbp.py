@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+import requests
+
+import db
+from scraping import sources
+from scraping.currency import nbp
+
+START = datetime.date(2024, 1, 1)
+END = START + datetime.timedelta(days=3 * nbp.NBP_MAX_RANGE_DAYS - 1)
+
+def weekdays(start, end):
+    days = (start + datetime.timedelta(days=i) for i in range((end - start).days + 1))
+    return [day.isoformat() for day in days if day.weekday() < 5]
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    content = b""
+
+    def __init__(self, days):
+        self.days = days
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return [
+            {"effectiveDate": day, "rates": [{"currency": "dolar", "code": "USD", "mid": 4.0}]} for day in self.days
+        ]
+
+class FakeClient:
+    """Tabela A z każdego dnia roboczego okna; okna zaczynające się w `failing` kończą się błędem."""
+
+    def __init__(self):
+        self.failing = set()
+        self.remembered = []
+
+    def get_if_changed(self, url, timeout=None):
+        start, end = url.split("/tables/A/")[1].split("/")[:2]
+        if start in self.failing:
+            raise requests.ConnectionError("timeout")
+        return FakeResponse(weekdays(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)))
+
+    def remember(self, url, response):
+        self.remembered.append(response.days[0])
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(sources.http_client, "get_client", lambda db_path=None: fake)
+    return fake
+
+def saved_days(db_path):
+    with db.connection(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT data_notowania FROM kursy_walut_nbp ORDER BY 1")]
+
+def test_failed_window_stops_watermark_before_gap(db_path, client):
+    (first_start, first_end), (second_start, _), _ = nbp.split_date_range(START, END)
+    client.failing = {second_start.isoformat()}
+    nbp.NbpSource(START, END, max_workers=1).run(db_path)
+
+    first_days = weekdays(first_start, first_end)
+    assert saved_days(db_path) == first_days
+    assert client.remembered == [first_days[0]]
+    watermarks = nbp.load_watermarks(db_path)
+    assert watermarks == {"USD": datetime.date.fromisoformat(first_days[-1])}
+
+    # Następne uruchomienie wznawia od luki, nie od końca późniejszego okna.
+    client.failing = set()
+    nbp.NbpSource(end_date=END, max_workers=1).run(db_path)
+    assert saved_days(db_path) == weekdays(START, END)
+    assert nbp.load_watermarks(db_path)["USD"] == datetime.date.fromisoformat(weekdays(START, END)[-1])
+
+def test_missing_date_range_per_currency():
+    today = datetime.date(2024, 3, 15) # piątek
+    watermarks = {"USD": datetime.date(2024, 3, 14), "EUR": datetime.date(2024, 3, 11)}
+    assert nbp.missing_date_range(watermarks, today) == (datetime.date(2024, 3, 12), today)
+
+    # Waluta wycofana dawno temu nie cofa startu.
+    watermarks["XYZ"] = datetime.date(2023, 1, 2)
+    assert nbp.missing_date_range(watermarks, today) == (datetime.date(2024, 3, 12), today)
+
+    assert nbp.missing_date_range({"USD": today}, today) is None
+    assert nbp.missing_date_range({}, today) == (today - datetime.timedelta(days=nbp.DEFAULT_LOOKBACK_DAYS - 1), today)
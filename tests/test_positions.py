@@ -0,0 +1,52 @@
+import pytest
+
+import db
+import positions
+
+USER_ID = 1
+
+def position(conn, asset_name="AAA"):
+    return {row[0]: (row[2], row[3]) for row in positions.get_positions(conn, USER_ID)}.get(asset_name)
+
+def test_two_buys_give_weighted_average_cost(db_path):
+    with db.transaction(db_path) as conn:
+        positions.record_buy(conn, USER_ID, "stock", "AAA", 10, price=100.0)
+        positions.record_buy(conn, USER_ID, "stock", "AAA", 30, price=120.0)
+        quantity, cost_basis = position(conn)
+        assert quantity == 40 and cost_basis == pytest.approx(4600.0)
+        assert cost_basis / quantity == pytest.approx(115.0)
+
+        # Sprzedaż nie zmienia średniej ceny pozostałych sztuk.
+        positions.record_sell(conn, USER_ID, "stock", "AAA", 15, price=200.0)
+        quantity, cost_basis = position(conn)
+        assert quantity == 25 and cost_basis == pytest.approx(25 * 115.0)
+        assert [row[2] for row in positions.get_transactions(conn, USER_ID)] == [10, 30, -15]
+
+def test_buy_without_price_makes_cost_unknown(db_path):
+    with db.transaction(db_path) as conn:
+        positions.record_buy(conn, USER_ID, "gold", "1oz", 1, price=9000.0)
+        positions.record_buy(conn, USER_ID, "gold", "1oz", 1)
+        assert position(conn, "1oz") == (2, None)
+
+def test_overselling_raises_and_changes_nothing(db_path):
+    with db.transaction(db_path) as conn:
+        positions.record_buy(conn, USER_ID, "stock", "AAA", 5, price=10.0)
+    with db.transaction(db_path) as conn:
+        version = db.get_data_version(conn, positions.positions_version(USER_ID))
+        with pytest.raises(positions.InsufficientQuantityError):
+            positions.record_sell(conn, USER_ID, "stock", "AAA", 6)
+        with pytest.raises(positions.InsufficientQuantityError):
+            positions.record_sell(conn, USER_ID, "stock", "BBB", 1)
+        assert position(conn) == (5, pytest.approx(50.0))
+        assert len(positions.get_transactions(conn, USER_ID)) == 1
+        assert db.get_data_version(conn, positions.positions_version(USER_ID)) == version
+
+def test_selling_whole_position_within_epsilon_deletes_it(db_path):
+    with db.transaction(db_path) as conn:
+        positions.record_buy(conn, USER_ID, "currency", "USD", 0.1, price=4.0)
+        positions.record_buy(conn, USER_ID, "currency", "USD", 0.2, price=4.0)
+        # 0.1 + 0.2 != 0.3 w arytmetyce zmiennoprzecinkowej - różnica mieści się w QUANTITY_EPSILON.
+        positions.record_sell(conn, USER_ID, "currency", "USD", 0.3)
+        assert position(conn, "USD") is None
+        positions.record_buy(conn, USER_ID, "currency", "USD", 1, price=4.0)
+        assert position(conn, "USD") == (1, pytest.approx(4.0))
@@ -0,0 +1,37 @@
+import threading
+
+import pytest
+
+import db
+import migrations
+import price_archive
+
+pytestmark = pytest.mark.skipif(not price_archive.is_available(), reason="brak pyarrow")
+
+def test_export_releases_read_connection_before_manifest_write(db_path, tmp_path):
+    # Pula z jednym połączeniem: gdyby eksport trzymał połączenie do odczytu, wątek zapisu manifestu
+    # czekałby na nie w nieskończoność.
+    db.close_all_pools()
+    db._pools[db_path] = db.ConnectionPool(db_path, size=1)
+    with db.transaction(db_path) as conn:
+        conn.executemany(
+            f"INSERT INTO {migrations.TABLE_NAME_NBP} (data_notowania, nazwa_waluty, kod_waluty, kurs_sredni)"
+            " VALUES (?, ?, ?, ?)",
+            [("2023-12-29", "dolar", "USD", 3.93), ("2024-01-02", "dolar", "USD", 3.95),
+             ("2024-01-02", "euro", "EUR", 4.35)]
+        )
+
+    result = []
+    worker = threading.Thread(
+        target=lambda: result.append(price_archive.export(db_path, ["currency"], root=str(tmp_path / "archive"))),
+        daemon=True
+    )
+    worker.start()
+    worker.join(timeout=10)
+
+    assert result == [2]
+    with db.connection(db_path) as conn:
+        manifest = conn.execute(
+            "SELECT asset_key, year, row_count FROM archive_partitions ORDER BY year, asset_key"
+        ).fetchall()
+    assert [tuple(row) for row in manifest] == [("USD", 2023, 1), ("EUR", 2024, 1), ("USD", 2024, 1)]
@@ -0,0 +1,84 @@
+import datetime
+
+import numpy as np
+
+import db
+import metrics
+import price_store
+from scraping.currency import nbp
+from scraping.stock import yfinance_scraper
+
+START = datetime.date(2024, 1, 1)
+
+def day(offset):
+    return (START + datetime.timedelta(days=offset)).isoformat()
+
+def write_stock(db_path, ticker, prices):
+    rows = [(ticker, day(i), p, p, p, p, p, 1000) for i, p in enumerate(prices)]
+    with db.transaction(db_path) as conn:
+        yfinance_scraper.write_yfinance_rows(conn, rows)
+
+def write_rate(db_path, code, offset, rate):
+    with db.transaction(db_path) as conn:
+        nbp.write_nbp_rows(conn, [(day(offset), code, code, rate)])
+
+def hits():
+    return metrics.registry.counter_value("cache_hits_total", cache="price_store")
+
+def test_series_and_price_lookup(db_path):
+    write_stock(db_path, "AAA", [10.0, 11.0, 12.0])
+    store = price_store.PriceStore()
+    with db.connection(db_path) as conn:
+        series = store.get_series(conn, "stock", ["AAA", "NONE"])
+        assert list(series["AAA"].prices) == [10.0, 11.0, 12.0]
+        assert len(series["NONE"]) == 0
+        days = [price_store.day_number(START) - 1, price_store.day_number(START) + 1, price_store.day_number(START) + 9]
+        values = series["AAA"].at(days)
+        assert np.isnan(values[0]) and list(values[1:]) == [11.0, 12.0]
+
+def test_new_prices_invalidate_only_their_asset_type(db_path):
+    write_stock(db_path, "AAA", [10.0, 11.0])
+    write_rate(db_path, "USD", 0, 4.0)
+    store = price_store.PriceStore()
+    metrics.registry.reset()
+    with db.connection(db_path) as conn:
+        store.get_series(conn, "stock", ["AAA"])
+        store.get_series(conn, "currency", ["USD"])
+        assert len(store) == 2
+
+        write_rate(db_path, "USD", 1, 4.2)
+        assert hits() == 0
+        assert store.get_series(conn, "stock", ["AAA"])["AAA"].latest() == 11.0
+        assert hits() == 1
+        assert store.get_series(conn, "currency", ["USD"])["USD"].latest() == 4.2
+        assert hits() == 1
+
+        write_stock(db_path, "AAA", [10.0, 11.0, 13.0])
+        assert store.get_series(conn, "stock", ["AAA"])["AAA"].latest() == 13.0
+        store.get_series(conn, "currency", ["USD"])
+        assert hits() == 2
+
+def test_lru_keeps_within_budget(db_path):
+    tickers = [f"T{i}" for i in range(6)]
+    for ticker in tickers:
+        write_stock(db_path, ticker, [1.0] * 50)
+    with db.connection(db_path) as conn:
+        one_series = price_store.load_series(conn, "stock", ["T0"])["T0"].nbytes
+        store = price_store.PriceStore(budget_bytes=3 * one_series)
+        metrics.registry.reset()
+        for ticker in tickers:
+            store.get_series(conn, "stock", [ticker])
+        assert len(store) == 3
+        assert store.nbytes <= store.budget_bytes
+        assert metrics.registry.counter_value("price_store_evictions_total") == 3
+
+        # Odczyt przesuwa serię na koniec kolejki - usuwana jest najdawniej używana.
+        store.get_series(conn, "stock", ["T3"])
+        store.get_series(conn, "stock", ["T0"])
+        metrics.registry.reset()
+        store.get_series(conn, "stock", ["T3", "T0"])
+        assert hits() == 2
+
+        tiny = price_store.PriceStore(budget_bytes=one_series // 2)
+        assert len(tiny.get_series(conn, "stock", ["T1"])["T1"]) == 50
+        assert len(tiny) == 0 and tiny.nbytes == 0
@@ -0,0 +1,62 @@
+import threading
+
+import db
+import sessions
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_get_extends_session_in_use(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sessions.time, "monotonic", clock)
+    store = sessions.SessionStore(idle_timeout=60)
+    store.open("t")
+
+    for _ in range(5):
+        clock.now += 50
+        assert store.get("t") is not None
+    store.expire_idle()
+    assert len(store) == 1
+
+    clock.now += 61
+    assert store.get("t") is None
+    assert len(store) == 0
+
+def test_generations_dropped_without_computations_in_flight(db_path):
+    cache = sessions.PortfolioCache()
+    with db.connection(db_path) as conn:
+        for user_id in range(100):
+            cache.get(conn, user_id, "valuation", lambda conn: 1)
+            cache.invalidate_user(user_id)
+    assert cache._generations == {}
+
+def test_invalidate_user_discards_result_computed_meanwhile(db_path):
+    cache = sessions.PortfolioCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(conn):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    def run():
+        with db.connection(db_path) as conn:
+            cache.get(conn, 1, "valuation", slow)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    started.wait(5)
+    cache.invalidate_user(1)
+    assert cache._generations == {1: 1}
+    release.set()
+    worker.join(5)
+    assert cache._generations == {}
+
+    with db.connection(db_path) as conn:
+        assert cache.get(conn, 1, "valuation", slow) == 2
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import metrics
+from scraping import sources
+from scraping.stock import yfinance_scraper
+
+CHUNKS = 4
+CHUNK_ROWS = 10
+DOWNLOAD_SECONDS = 0.04
+PARSE_SECONDS = 0.02
+WRITE_SECONDS = 0.03
+
+class ChunkedSource(sources.Source):
+    """Jak YFinanceSource: fetch zwraca generator, który pobiera kolejne paczki dopiero przy odczycie."""
+
+    name = "fake"
+    write_batch_rows = CHUNK_ROWS
+
+    def download(self, index):
+        time.sleep(DOWNLOAD_SECONDS)
+        return [(f"T{index}", f"2024-01-{day + 1:02d}", 1.0, 1.0, 1.0, 1.0, 1.0, 1) for day in range(CHUNK_ROWS)]
+
+    def fetch(self, db_path, client):
+        download = self.lazy_fetch(self.download)
+        return (row for index in range(CHUNKS) for row in download(index))
+
+    def parse(self, rows):
+        for i, row in enumerate(rows):
+            if i % CHUNK_ROWS == 0:
+                time.sleep(PARSE_SECONDS)
+            yield row
+
+    def write(self, conn, rows):
+        time.sleep(WRITE_SECONDS)
+        return yfinance_scraper.write_yfinance_rows(conn, rows)
+
+def stage_histograms():
+    return {
+        h["labels"]["stage"]: h for h in metrics.registry.snapshot()["histograms"]
+        if h["name"] == "stage_seconds" and h["labels"]["stage"].startswith("fake.")
+    }
+
+def test_run_times_each_stage_once(db_path, tmp_path):
+    metrics.registry.reset()
+    metrics.enable_profiling(str(tmp_path / "profiles"))
+    try:
+        assert ChunkedSource().run(db_path) == CHUNKS * CHUNK_ROWS
+    finally:
+        metrics.enable_profiling(None)
+
+    stages = stage_histograms()
+    assert set(stages) == {"fake.fetch", "fake.parse", "fake.write"}
+    assert all(h["count"] == 1 for h in stages.values())
+    # Leniwe pobieranie liczy się jako fetch, nie jako parsowanie, w którego trakcie się odbywa.
+    assert stages["fake.fetch"]["sum"] >= CHUNKS * DOWNLOAD_SECONDS
+    assert CHUNKS * PARSE_SECONDS <= stages["fake.parse"]["sum"] < CHUNKS * DOWNLOAD_SECONDS
+    # Zapis trwa dłużej niż parsowanie - czekanie na commit paczek liczy się jako write.
+    assert stages["fake.write"]["sum"] >= WRITE_SECONDS
+    assert len(list((tmp_path / "profiles").iterdir())) == 1
+
+def test_stage_error_counted_once(db_path):
+    class BrokenSource(ChunkedSource):
+        def download(self, index):
+            if index == 2:
+                raise RuntimeError("zerwane połączenie")
+            return super().download(index)
+
+    metrics.registry.reset()
+    with pytest.raises(RuntimeError):
+        BrokenSource().run(db_path)
+    assert metrics.registry.counter_value("stage_errors_total", stage="fake.fetch") == 1
+    assert all(h["count"] == 1 for h in stage_histograms().values())
@@ -0,0 +1,31 @@
+"""Konta użytkowników - wspólne dla aplikacji Flet (main.py) i API HTTP (api.py)."""
+import hashlib
+import sqlite3
+
+import db
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def register_user(db_path, username, password):
+    with db.connection(db_path) as conn:
+        try:
+            hashed_password = hash_password(password)
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
+            conn.commit()
+            return True, "Użytkownik zarejestrowany pomyślnie."
+        except sqlite3.IntegrityError:
+            return False, "Błąd: Użytkownik już istnieje."
+
+def login_user(db_path, username, password):
+    with db.connection(db_path) as conn:
+        return authenticate(conn, username, password)
+
+def authenticate(conn, username, password):
+    """Jak login_user, ale na podanym połączeniu: (id użytkownika albo None, komunikat)."""
+    hashed_password = hash_password(password)
+    user = conn.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, hashed_password)).fetchone()
+    if user:
+        return user['id'], "Zalogowano pomyślnie."
+    else:
+        return None, "Błąd logowania: Nieprawidłowa nazwa użytkownika lub hasło."
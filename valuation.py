@@ -0,0 +1,117 @@
+import threading
+
+import fx
+import metrics
+
+DEFAULT_CURRENCY_PRICE = 4.0
+DEFAULT_GOLD_PRICE = 200.0
+DEFAULT_STOCK_PRICE = 100.0
+
+DEFAULT_PRICES = {
+    "currency": DEFAULT_CURRENCY_PRICE,
+    "gold": DEFAULT_GOLD_PRICE,
+    "stock": DEFAULT_STOCK_PRICE,
+}
+
+# Jedno zapytanie o pozycje na cały portfel; ceny pochodzą ze wspólnego cache (price_cache),
+# więc koszt nie rośnie wraz z długością historii notowań ani liczbą sesji.
+PORTFOLIO_POSITIONS_SQL = """
+    SELECT asset_name, asset_type, quantity
+    FROM positions
+    WHERE user_id = ?
+    ORDER BY id
+"""
+
+class PriceCache:
+    """Najnowsze ceny złota i akcji z latest_prices trzymane w pamięci procesu, wspólne dla wszystkich sesji.
+
+    Przy każdym odczycie sprawdzana jest tylko wersja cen w data_versions (odczyt po kluczu głównym);
+    wszystkie ceny są wczytywane ponownie dopiero wtedy, gdy scraper - także z innego procesu - zapisze notowania.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._prices = {}
+
+    def _read_version(self, conn):
+        # Wersja db.PRICES_VERSION czytana wprost - valuation nie importuje db (db -> migrations -> valuation).
+        row = conn.execute("SELECT version FROM data_versions WHERE name = 'prices'").fetchone()
+        return row[0] if row else 0
+
+    def _load(self, conn):
+        rows = conn.execute(
+            "SELECT asset_type, asset_key, price FROM latest_prices WHERE asset_type IN ('gold', 'stock')"
+        ).fetchall()
+        return {(row[0], row[1]): row[2] for row in rows}
+
+    def get_prices(self, conn):
+        """Zwraca {(typ_aktywa, klucz): cena} w walucie notowań."""
+        version = self._read_version(conn)
+        with self._lock:
+            if version != self._version:
+                metrics.inc("cache_misses_total", cache="latest_prices")
+                self._prices = self._load(conn)
+                self._version = version
+            else:
+                metrics.inc("cache_hits_total", cache="latest_prices")
+            return self._prices
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._prices = {}
+
+price_cache = PriceCache()
+
+def market_price(conn, asset_type, asset_name):
+    """Najnowsza cena aktywa w walucie jego notowań albo None, gdy w bazie jej nie ma."""
+    if asset_type == "currency":
+        return fx.rate_cache.get_rate(conn, asset_name)
+    return price_cache.get_prices(conn).get((asset_type, asset_name))
+
+@metrics.timed("valuation.value_portfolio")
+def value_portfolio(conn, user_id, reporting_currency=fx.BASE_CURRENCY):
+    """Wycenia cały portfel w jednym przebiegu (stała liczba zapytań niezależnie od liczby pozycji).
+
+    Ceny i wartości zwracane są w walucie raportowej; złoto notowane jest w PLN, akcje w walucie
+    notowań tickera, a waluty po kursie średnim NBP. Zwraca (suma, wartości kategorii, aktywa według
+    kategorii, waluta wyniku) - waluta wyniku to PLN, gdy dla żądanej nie ma kursu NBP.
+    """
+    currency_rates = fx.rate_cache.get_rates(conn)
+    converter = fx.Converter(currency_rates, reporting_currency)
+    assets = conn.execute(PORTFOLIO_POSITIONS_SQL, (user_id,)).fetchall()
+    if not assets:
+        return 0, {"currency": 0, "gold": 0, "stock": 0}, {}, converter.reporting_currency
+
+    # Ceny, kursy NBP i waluty tickerów pobierane są raz na wycenę (z cache procesu), nie dla każdej pozycji.
+    prices = price_cache.get_prices(conn)
+    stock_currencies = fx.ticker_currency_cache.get_currencies(
+        conn, [asset[0] for asset in assets if asset[1] == "stock"]
+    )
+
+    category_values = {"currency": 0, "gold": 0, "stock": 0}
+    assets_by_category = {"currency": [], "gold": [], "stock": []}
+    total_portfolio_value = 0
+
+    for asset_name, asset_type, quantity in assets:
+        if asset_type == "currency":
+            price = currency_rates.get(asset_name)
+        else:
+            price = prices.get((asset_type, asset_name))
+        quote_currency = stock_currencies[asset_name] if asset_type == "stock" else fx.BASE_CURRENCY
+        current_price = price if price is not None else DEFAULT_PRICES.get(asset_type, 0)
+        current_price = converter.convert(current_price, quote_currency)
+        asset_value = quantity * current_price
+
+        category_values[asset_type] += asset_value
+        total_portfolio_value += asset_value
+
+        assets_by_category[asset_type].append({
+            "name": asset_name,
+            "quantity": quantity,
+            "price": current_price,
+            "value": asset_value
+        })
+
+    return total_portfolio_value, category_values, assets_by_category, converter.reporting_currency